@@ -0,0 +1,41 @@
+# gunicorn.conf.py
+# LINE Bot 統合機能の本番起動設定:  gunicorn staff_linebot_wsgi:app
+#
+# LINEBOT_WORKERS   ワーカープロセス数（既定: CPU コア数）
+# LINEBOT_THREADS   ワーカーごとのスレッド数（既定: 8）
+# PORT              待ち受けポート（既定: 5000）
+#
+# 複数ワーカーで欠勤報告・統計・重複排除を共有するには LINEBOT_STORAGE=sqlite:///path/to/linebot.db が必要。
+# LINEBOT_STORAGE=eventlog:///path/to/dir はメモリ保持 + 追記ログによる復元なので、memory と同じく1ワーカー専用。
+# 各ワーカーは fork 後にアプリを読み込む（preload しない）。送信キューやタイマーのスレッド、
+# SQLite の接続をプロセスごとに持たせるため
+#
+# ダッシュボードのライブ配信（/api/line-bot/events）は1接続がスレッドを1本占有する。
+# ワーカーあたりの接続数は LIVE_FEED_MAX_STREAMS（既定: 4）までなので、スレッド数はそれより多くしておく
+
+import multiprocessing
+import os
+
+
+def gunicorn_options(environ=os.environ):
+    workers = int(environ.get('LINEBOT_WORKERS') or multiprocessing.cpu_count())
+    storage = environ.get('LINEBOT_STORAGE', 'memory')
+    if workers > 1 and (storage == 'memory' or storage.startswith('eventlog:///')):
+        print(f'⚠️ LINEBOT_STORAGE={storage} ではワーカー間でデータを共有できないため、1ワーカーで起動します')
+        workers = 1
+    return {
+        'bind': f"0.0.0.0:{environ.get('PORT', '5000')}",
+        'workers': workers,
+        'worker_class': 'gthread',
+        'threads': int(environ.get('LINEBOT_THREADS', '8')),
+        'preload_app': False,
+        # Webhook は即時応答、LINE API の送信はバックグラウンドなので長いタイムアウトは不要
+        'timeout': 30,
+        'graceful_timeout': 20,
+        'keepalive': 5,
+        'accesslog': '-',
+        'errorlog': '-',
+    }
+
+
+globals().update(gunicorn_options())
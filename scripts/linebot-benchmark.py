@@ -0,0 +1,581 @@
+#!/usr/bin/env python3
+# LINE Bot 統合機能（staff_linebot パッケージ）のマイクロベンチマーク
+#
+# 使い方:
+#   python scripts/linebot-benchmark.py            # すべて実行
+#   python scripts/linebot-benchmark.py template   # テンプレート処理のみ
+#   python scripts/linebot-benchmark.py latency fanout webhook --save-baseline baseline.json
+#   python scripts/linebot-benchmark.py latency fanout webhook --baseline baseline.json   # 劣化していたら終了コード 1
+#
+# fanout / webhook は LINE API の代わりにローカルのモックサーバー（--mock-latency / --mock-error-rate）へ送信する。
+# webhook は署名付きの Webhook を /webhook/bot-a に投げ、確認メッセージがモックに届くまでを1件の所要時間とする。
+
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import random
+import re
+import os
+import sys
+import threading
+import time
+import uuid
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS_PATH = os.path.join(ROOT, 'scripts', 'linebot-message-corpus.jsonl')
+CHANNEL_SECRET = 'benchmark-channel-secret'
+ADMIN_TOKEN = os.environ.get('LINEBOT_ADMIN_TOKEN', 'benchmark-admin-token')
+
+
+def log(message):
+    print(f"[{datetime.now().isoformat(timespec='seconds')}] {message}")
+
+
+def load_module(verbose=False):
+    # パッケージを読み込んでアプリを組み立て、計測で使うものを1つの名前空間にまとめて返す
+    warnings.simplefilter('ignore')
+    sys.path.insert(0, ROOT)
+    from staff_linebot import app, eventlog, intents, json_codec, line_api, messaging, routes, state, templating, \
+        tenants, webhook
+    if not verbose:
+        # 処理ごとのログ出力（print）を計測から外す
+        for name, module in list(sys.modules.items()):
+            if name.startswith('staff_linebot.'):
+                module.print = lambda *args, **kwargs: None
+    application = app.create_app()
+    return SimpleNamespace(
+        app=application, repository=state.repository, orjson=json_codec.orjson,
+        message_templates=tenants.message_templates, process_template=templating.process_template,
+        render_template_batch=templating.render_template_batch, analyze_message=intents.analyze_message,
+        analyze_messages=intents.analyze_messages, load_linebot=line_api.load_linebot,
+        warm_line_clients=line_api.warm_line_clients, WebhookVerifier=line_api.WebhookVerifier,
+        parse_webhook_events=webhook.parse_webhook_events, multicast_bot_a_message=messaging.multicast_bot_a_message,
+        list_records_response=routes.list_records_response, EventLogRepository=eventlog.EventLogRepository)
+
+
+def percentiles(samples):
+    # 秒単位のサンプルから p50 / p95 / p99（ミリ秒）を求める
+    samples = sorted(samples)
+    return {f'p{percentile}_ms': round(samples[min(len(samples) - 1, int(len(samples) * percentile / 100))] * 1000, 3)
+            for percentile in (50, 95, 99)}
+
+
+def report(name, samples, elapsed, units=None):
+    result = dict(percentiles(samples), throughput=round((units or len(samples)) / elapsed, 1))
+    log(f"  {name}: p50 {result['p50_ms']}ms / p95 {result['p95_ms']}ms / p99 {result['p99_ms']}ms / "
+        f"{result['throughput']:,} 件/秒")
+    return {name: result}
+
+
+def measure(func, iterations):
+    # ウォームアップ後、最良の1回あたり時間（マイクロ秒）を返す
+    func()
+    best = float('inf')
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        best = min(best, (time.perf_counter() - started) / iterations)
+    return best * 1_000_000
+
+
+# 変更前の process_template（比較用）
+def legacy_process_template(templates, template_key, variables):
+    template = templates.get(template_key, '')
+    for key, value in variables.items():
+        template = template.replace(f'{{{{{key}}}}}', str(value))
+    return template
+
+
+def bench_template(module, iterations):
+    log('🔍 テンプレート処理ベンチマーク')
+    cases = {
+        'absence_notification': {
+            'staff_name': '田中 美咲', 'absence_date': '2024-06-01', 'absence_time': '10:00-18:00',
+            'absence_reason': '体調不良', 'report_time': '2024-06-01 08:12'
+        },
+        'substitute_request': {
+            'absent_staff_name': '田中 美咲', 'absence_date': '2024-06-01',
+            'absence_time': '10:00-18:00', 'absence_reason': '体調不良'
+        },
+        'customer_notification': {
+            'customer_name': '鈴木 一郎', 'appointment_date': '2024-06-01', 'appointment_time': '14:00',
+            'absent_staff_name': '田中 美咲', 'substitute_staff_name': '佐藤 健太', 'salon_phone': '03-1234-5678'
+        }
+    }
+
+    for template_key, variables in cases.items():
+        assert module.process_template(template_key, variables) == \
+            legacy_process_template(module.message_templates, template_key, variables)
+        legacy = measure(lambda: legacy_process_template(module.message_templates, template_key, variables), iterations)
+        compiled = measure(lambda: module.process_template(template_key, variables), iterations)
+        log(f"  {template_key}: 旧 {legacy:.2f}µs / 新 {compiled:.2f}µs (x{legacy / compiled:.1f})")
+
+    variables = cases['substitute_request']
+    batch = [dict(variables, absent_staff_name=f'スタッフ{i}') for i in range(500)]
+    legacy = measure(lambda: [legacy_process_template(module.message_templates, 'substitute_request', v)
+                              for v in batch], max(1, iterations // 500))
+    compiled = measure(lambda: module.render_template_batch('substitute_request', batch), max(1, iterations // 500))
+    log(f"  substitute_request x500 (一括): 旧 {legacy:.0f}µs / 新 {compiled:.0f}µs (x{legacy / compiled:.1f})")
+
+
+# 変更前の analyze_message / extract_absence_data（比較用）
+def legacy_analyze_message(message):
+    text = message.lower()
+    if any(keyword in text for keyword in ['欠勤', '休み', '体調不良', '風邪', '熱']):
+        return {'type': 'absence_report', 'data': legacy_extract_absence_data(message)}
+    if '代わり' in text and any(keyword in text for keyword in ['出勤', '行く', 'します']):
+        return {'type': 'substitute_accept', 'data': None}
+    if '代わり' in text and any(keyword in text for keyword in ['無理', 'できない', 'できません']):
+        return {'type': 'substitute_decline', 'data': None}
+    return {'type': 'unknown', 'data': None}
+
+
+def legacy_extract_absence_data(message):
+    data = {'reason': '体調不良', 'date': datetime.now().strftime('%Y-%m-%d'), 'time': '10:00-18:00'}
+    if '風邪' in message:
+        data['reason'] = '風邪'
+    elif '熱' in message:
+        data['reason'] = '発熱'
+    elif '家族' in message:
+        data['reason'] = '家族の事情'
+    date_match = re.search(r'(\d{1,2})月(\d{1,2})日', message)
+    if date_match:
+        data['date'] = f"2024-{date_match.group(1).zfill(2)}-{date_match.group(2).zfill(2)}"
+    return data
+
+
+def load_corpus():
+    with open(CORPUS_PATH, encoding='utf-8') as corpus_file:
+        return [json.loads(line) for line in corpus_file if line.strip()]
+
+
+def is_correct(expected, result):
+    if result['type'] != expected['type']:
+        return False
+    if expected['type'] != 'absence_report':
+        return True
+    data = result['data']
+    if data['reason'] != expected['reason']:
+        return False
+    return 'date' not in expected or data['date'][5:] == expected['date']
+
+
+def bench_classify(module, iterations):
+    log('🔍 メッセージ解析ベンチマーク')
+    corpus = load_corpus()
+    texts = [sample['text'] for sample in corpus]
+
+    for name, analyze in [('旧 analyze_message', legacy_analyze_message), ('新 analyze_message', module.analyze_message)]:
+        correct = sum(is_correct(sample, analyze(sample['text'])) for sample in corpus)
+        log(f"  {name}: 正解率 {correct}/{len(corpus)} ({correct / len(corpus):.0%})")
+
+    # 挨拶や前置きの付いた長めのメッセージ（ログ再生を想定）
+    preface = 'お疲れ様です。昨日の予約状況ですが、午後は比較的空いていました。来週の研修についても確認させてください。'
+    rounds = max(1, iterations // len(texts))
+    for label, samples in [('短文', texts), ('長文', [preface * 3 + text for text in texts])]:
+        legacy = measure(lambda: [legacy_analyze_message(text) for text in samples], rounds)
+        single = measure(lambda: [module.analyze_message(text) for text in samples], rounds)
+        batch = measure(lambda: module.analyze_messages(samples), rounds)
+        log(f"  {label}: 旧 {len(samples) / legacy * 1_000_000:,.0f} 件/秒 / "
+            f"新 {len(samples) / single * 1_000_000:,.0f} 件/秒 / "
+            f"新（一括） {len(samples) / batch * 1_000_000:,.0f} 件/秒")
+
+
+def timed_calls(func, arguments):
+    samples = []
+    started = time.perf_counter()
+    for argument in arguments:
+        call_started = time.perf_counter()
+        func(argument)
+        samples.append(time.perf_counter() - call_started)
+    return samples, time.perf_counter() - started
+
+
+def bench_latency(module, iterations):
+    log('🔍 1件あたりの処理時間（analyze_message / process_template）')
+    texts = [sample['text'] for sample in load_corpus()]
+    messages = [texts[i % len(texts)] for i in range(iterations)]
+    results = report('analyze_message', *timed_calls(module.analyze_message, messages))
+
+    variables = {
+        'absent_staff_name': '田中 美咲', 'absence_date': '2024-06-01',
+        'absence_time': '10:00-18:00', 'absence_reason': '体調不良'
+    }
+    batch = [dict(variables, absent_staff_name=f'スタッフ{i}') for i in range(iterations)]
+    results.update(report('process_template',
+                          *timed_calls(lambda item: module.process_template('substitute_request', item), batch)))
+    return results
+
+
+# LINE Messaging API のモック。応答遅延とエラー率を設定でき、宛先ごとの受信時刻を通知する
+class MockLineServer:
+    def __init__(self, latency=0.02, error_rate=0.0, port=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self.routes = {'reply': 0, 'push': 0}
+        self._used_reply_tokens = set()
+        self._lock = threading.Lock()
+        self._waiters = {}
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._handler_class())
+        self._server.daemon_threads = True
+        self.endpoint = f'http://127.0.0.1:{self._server.server_port}'
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                time.sleep(mock.latency)
+                failed = random.random() < mock.error_rate
+                reply_token = payload.get('replyToken')
+                with mock._lock:
+                    mock.requests += 1
+                    mock.errors += failed
+                    # reply token は1回限り（2回目以降は LINE と同じく 400）
+                    rejected = not failed and reply_token is not None and reply_token in mock._used_reply_tokens
+                    if reply_token is not None and not failed:
+                        mock._used_reply_tokens.add(reply_token)
+                if failed:
+                    status, body = 500, b'{"message":"mock error"}'
+                elif rejected:
+                    status, body = 400, b'{"message":"Invalid reply token"}'
+                else:
+                    status, body = 200, b'{}'
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                if status == 200 and self.path.endswith(('/push', '/reply')):
+                    route = 'push' if self.path.endswith('/push') else 'reply'
+                    with mock._lock:
+                        mock.routes[route] += 1
+                    # webhook_body() の reply token は「ユーザー ID.乱数」
+                    mock._delivered(payload['to'] if route == 'push' else reply_token.split('.')[0])
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name='mock-line-api', daemon=True).start()
+
+    def expect(self, user_id):
+        event = threading.Event()
+        with self._lock:
+            self._waiters[user_id] = event
+        return event
+
+    def _delivered(self, user_id):
+        with self._lock:
+            event = self._waiters.pop(user_id, None)
+        if event is not None:
+            event.set()
+
+
+def bench_listing(module, iterations):
+    # 一覧 API（500件/ページ）の本文作成: 記録を1件ずつ JSON 化する旧方式と、書き込み時の JSON をつなぐ新方式
+    from flask.json.provider import DefaultJSONProvider
+    log(f"🔍 一覧 API ベンチマーク（JSON: {'orjson' if module.orjson else '標準 json'}）")
+    for index in range(max(1000, iterations // 10)):
+        module.repository.save_absence_report(f'bench-{index:06d}', {
+            'staff_id': f'Ubench{index % 50:026d}', 'staff_name': f'負荷試験 {index % 50}',
+            'absence_data': {'reason': '体調不良', 'date': '2024-06-01', 'time': '10:00-18:00'},
+            'timestamp': f'2024-06-01T08:{index // 60 % 60:02d}:{index % 60:02d}.{index:06d}', 'status': 'reported'
+        })
+    module.repository.flush()
+
+    default_provider = DefaultJSONProvider(module.app)
+    url = '/api/line-bot/absence-reports?limit=500'
+    with module.app.test_request_context(url):
+        legacy = measure(lambda: default_provider.response(
+            {'items': module.repository.query_records('absence_reports', limit=500), 'next_cursor': None}), 20)
+        spliced = measure(lambda: module.list_records_response('absence_reports'), 20)
+    log(f'  500件: 旧 {legacy / 1000:.2f}ms / 新 {spliced / 1000:.2f}ms (x{legacy / spliced:.1f})')
+
+    client = module.app.test_client()
+    return report('list_500', *timed_calls(lambda _: client.get(url), range(max(20, iterations // 1000))))
+
+
+def bench_replay(module, iterations):
+    # イベントログからの再起動: 全件の再生と、スナップショット + 末尾だけの再生を比べる
+    import shutil
+    import tempfile
+    directory = tempfile.mkdtemp(prefix='linebot-eventlog-')
+    events = max(10000, iterations)
+    log(f'🔍 イベントログの再起動（{events:,} 件）')
+    try:
+        repository = module.EventLogRepository(directory, snapshot_every=float('inf'))
+        for index in range(events // 2):
+            report_id = f'bench-{index:06d}'
+            repository.save_absence_report(report_id, {
+                'staff_id': f'Ubench{index % 50:026d}', 'staff_name': f'負荷試験 {index % 50}',
+                'absence_data': {'reason': '体調不良', 'date': '2024-06-01', 'time': '10:00-18:00'},
+                'timestamp': f'2024-06-01T08:00:00.{index:06d}', 'status': 'reported'
+            })
+            repository.update_absence_report(report_id, {'status': 'recruiting'})
+        repository.event_log.close()
+
+        def restart():
+            reopened = module.EventLogRepository(directory, snapshot_every=float('inf'))
+            reopened.event_log.close()
+            return reopened
+        full_samples, full_elapsed = timed_calls(lambda _: restart(), range(3))
+
+        repository = module.EventLogRepository(directory, snapshot_every=float('inf'))
+        repository.event_log.snapshot()
+        for index in range(100):
+            repository.update_absence_report(f'bench-{index:06d}', {'status': 'filled'})
+        repository.event_log.close()
+        snapshot_samples, snapshot_elapsed = timed_calls(lambda _: restart(), range(3))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return dict(report('restart_full_replay', full_samples, full_elapsed, units=len(full_samples)),
+                **report('restart_snapshot', snapshot_samples, snapshot_elapsed, units=len(snapshot_samples)))
+
+
+def bench_fanout(module, iterations):
+    log(f'🔍 一斉送信（モック応答 {MOCK_SERVER.latency * 1000:.0f}ms / エラー率 {MOCK_SERVER.error_rate:.0%}）')
+    recipients = [f'U{i:032x}' for i in range(2000)]
+    rounds = max(5, iterations // 2000)
+    samples, elapsed = timed_calls(lambda _: module.multicast_bot_a_message(recipients, '負荷試験'), range(rounds))
+    return report('fanout_2000', samples, elapsed, units=rounds * len(recipients))
+
+
+def sign(body):
+    return base64.b64encode(hmac.new(CHANNEL_SECRET.encode(), body, hashlib.sha256).digest()).decode()
+
+
+def webhook_body(user_id, text):
+    return json.dumps({
+        'destination': 'Ubenchmark',
+        'events': [{
+            'type': 'message',
+            'mode': 'active',
+            'timestamp': int(time.time() * 1000),
+            'source': {'type': 'user', 'userId': user_id},
+            'replyToken': f'{user_id}.{uuid.uuid4().hex}',
+            'webhookEventId': uuid.uuid4().hex,
+            'deliveryContext': {'isRedelivery': False},
+            'message': {'type': 'text', 'id': uuid.uuid4().hex, 'text': text}
+        }]
+    }, ensure_ascii=False).encode()
+
+
+def large_webhook_body(events=100):
+    # テキストのほか、処理しないスタンプ・友だち追加・ポストバックを混ぜた複数イベントの Webhook
+    kinds = ['text'] * 6 + ['sticker'] * 2 + ['follow', 'postback']
+    payload = {'destination': 'Ubenchmark', 'events': []}
+    for index in range(events):
+        kind = kinds[index % len(kinds)]
+        event = {
+            'type': 'message' if kind in ('text', 'sticker') else kind,
+            'mode': 'active',
+            'timestamp': int(time.time() * 1000),
+            'source': {'type': 'user', 'userId': f'U{index:032x}'},
+            'replyToken': uuid.uuid4().hex,
+            'webhookEventId': uuid.uuid4().hex,
+            'deliveryContext': {'isRedelivery': False}
+        }
+        if kind == 'text':
+            event['message'] = {'type': 'text', 'id': uuid.uuid4().hex, 'text': '明日 体調不良のため休みます。' * 4}
+        elif kind == 'sticker':
+            event['message'] = {'type': 'sticker', 'id': uuid.uuid4().hex, 'packageId': '446', 'stickerId': '1988',
+                                'stickerResourceType': 'STATIC', 'keywords': ['OK', 'thanks'] * 5}
+        elif kind == 'postback':
+            event['postback'] = {'data': 'action=confirm&report=' + uuid.uuid4().hex}
+        payload['events'].append(event)
+    return json.dumps(payload, ensure_ascii=False).encode()
+
+
+def bench_ingress(module, iterations):
+    # 署名検証 + 解析: SDK（str に復号 → 再符号化して HMAC → 全イベントのモデル生成）と、バイト列のまま検証して
+    # テキストメッセージだけを取り出す方式の比較
+    module.load_linebot()
+    from linebot import WebhookParser
+    log('🔍 Webhook 受信（署名検証 + 解析）')
+    results = {}
+    sdk_parser = WebhookParser(CHANNEL_SECRET)
+    verifier = module.WebhookVerifier(CHANNEL_SECRET)
+
+    def ingress(body, signature):
+        if not verifier.verify(body, signature):
+            raise ValueError('invalid signature')
+        return module.parse_webhook_events(body)
+
+    for events in (1, 100, 500):
+        body = large_webhook_body(events)
+        signature = sign(body)
+        assert len(ingress(body, signature)) == len(
+            [event for event in sdk_parser.parse(body.decode('utf-8'), signature) if event.type == 'message'
+             and event.message.type == 'text'])
+        rounds = max(10, iterations // (10 * events))
+        legacy = measure(lambda: sdk_parser.parse(body.decode('utf-8'), signature), rounds)
+        fast = measure(lambda: ingress(body, signature), rounds)
+        log(f'  {events}件 ({len(body) / 1024:.0f}KB): SDK {legacy / 1000:.3f}ms / 新 {fast / 1000:.3f}ms '
+            f'(x{legacy / fast:.1f})')
+        if events == 100:
+            results.update(report('ingress_100_events', *timed_calls(lambda _: ingress(body, signature),
+                                                                     range(rounds))))
+    return results
+
+
+def bench_webhook(module, iterations, concurrency=8, server_url=None):
+    target = server_url or 'Flask test client'
+    log(f'🔍 Webhook → 欠勤報告 → 確認メッセージ送信（{target} / 並列 {concurrency}）')
+    if server_url:
+        import requests
+        session = requests.Session()
+        post = lambda path, body, headers: session.post(f'{server_url}{path}', data=body, headers=headers).status_code
+    else:
+        client = module.app.test_client()
+        post = lambda path, body, headers: client.post(path, data=body, headers=headers).status_code
+
+    # 試験用スタッフを登録（サーバー側の名簿にも載るよう API 経由で）
+    staff_ids = [f'Ubench{i:026d}' for i in range(concurrency * 4)]
+    for index, staff_id in enumerate(staff_ids):
+        staff = {'id': staff_id, 'name': f'負荷試験 {index}', 'position': '美容師', 'phone': ''}
+        post('/api/line-bot/staff', json.dumps(staff, ensure_ascii=False).encode(),
+             {'Content-Type': 'application/json', 'Authorization': f'Bearer {ADMIN_TOKEN}'})
+
+    total = max(concurrency, iterations // 100)
+    webhook_samples, end_to_end_samples, statuses = [], [], {}
+    lock = threading.Lock()
+
+    def worker(index):
+        # ワーカーごとに担当スタッフを分け、確認メッセージの到着を待ってから次を送る
+        own = staff_ids[index::concurrency]
+        for count in range(index, total, concurrency):
+            staff_id = own[count % len(own)]
+            body = webhook_body(staff_id, '今日は風邪で休みます')
+            delivered = MOCK_SERVER.expect(staff_id)
+            started = time.perf_counter()
+            status = post('/webhook/bot-a', body, {'X-Line-Signature': sign(body), 'Content-Type': 'application/json'})
+            accepted = time.perf_counter()
+            arrived = status == 200 and delivered.wait(30)
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+                webhook_samples.append(accepted - started)
+                if arrived:
+                    end_to_end_samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    log(f"  応答ステータス: {statuses} / 確認メッセージ到着 {len(end_to_end_samples)}/{total} / "
+        f"モック LINE API の送信経路 {MOCK_SERVER.routes}")
+    results = report('webhook_ack', webhook_samples, elapsed)
+    if end_to_end_samples:
+        results.update(report('end_to_end', end_to_end_samples, elapsed))
+    return results
+
+
+BENCHMARKS = {
+    'template': bench_template,
+    'classify': bench_classify,
+    'latency': bench_latency,
+    'fanout': bench_fanout,
+    'webhook': bench_webhook,
+    'listing': bench_listing,
+    'replay': bench_replay,
+    'ingress': bench_ingress,
+}
+
+MOCK_SERVER = None
+
+
+def check_regressions(results, baseline, tolerance):
+    # p95 が基準より tolerance 以上遅い、またはスループットが tolerance 以上落ちたものを返す
+    regressions = []
+    for name, expected in baseline.items():
+        actual = results.get(name)
+        if actual is None:
+            continue
+        if actual['p95_ms'] > expected['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {expected['p95_ms']}ms → {actual['p95_ms']}ms")
+        if actual['throughput'] < expected['throughput'] * (1 - tolerance):
+            regressions.append(f"{name}: スループット {expected['throughput']:,} → {actual['throughput']:,} 件/秒")
+    return regressions
+
+
+def main():
+    global MOCK_SERVER
+
+    parser = argparse.ArgumentParser(description='LINE Bot 統合機能ベンチマーク')
+    parser.add_argument('targets', nargs='*', help=f"実行するベンチマーク ({', '.join(BENCHMARKS)})")
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=8, help='webhook の並列数')
+    parser.add_argument('--server', help='起動済みの WSGI サーバーの URL（省略時は Flask のテストクライアント）')
+    parser.add_argument('--mock-latency', type=float, default=0.02, help='モック LINE API の応答遅延（秒）')
+    parser.add_argument('--mock-port', type=int, default=0, help='モック LINE API のポート（--server と併用）')
+    parser.add_argument('--mock-error-rate', type=float, default=0.0, help='モック LINE API が 500 を返す割合')
+    parser.add_argument('--baseline', help='比較する基準値（JSON）。劣化があれば終了コード 1')
+    parser.add_argument('--save-baseline', help='今回の結果を基準値として保存する')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='許容する劣化の割合')
+    parser.add_argument('--verbose', action='store_true', help='アプリのログ出力を表示する')
+    args = parser.parse_args()
+
+    unknown = [name for name in args.targets if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"不明なベンチマーク: {', '.join(unknown)}")
+
+    # モジュール読み込み前に、LINE API の送信先をモックへ向ける
+    MOCK_SERVER = MockLineServer(args.mock_latency, args.mock_error_rate, args.mock_port)
+    MOCK_SERVER.start()
+    os.environ.update({
+        'LINE_API_ENDPOINT': MOCK_SERVER.endpoint,
+        'LINE_BOT_A_ACCESS_TOKEN': 'benchmark-token-a',
+        'LINE_BOT_A_CHANNEL_SECRET': CHANNEL_SECRET,
+        'LINE_BOT_B_ACCESS_TOKEN': 'benchmark-token-b',
+        'LINEBOT_ADMIN_TOKEN': ADMIN_TOKEN,
+        'LINEBOT_STORAGE': os.environ.get('LINEBOT_STORAGE', 'memory')
+    })
+    if args.server:
+        log(f'ℹ️ --server を使う場合は、サーバー側も LINE_API_ENDPOINT={MOCK_SERVER.endpoint} '
+            f'LINE_BOT_A_CHANNEL_SECRET={CHANNEL_SECRET} LINEBOT_ADMIN_TOKEN={ADMIN_TOKEN} で起動してください')
+
+    module = load_module(args.verbose)
+    # 起動直後のバックグラウンド生成を待たず、LINE クライアントを作り終えてから計測する
+    module.warm_line_clients()
+    results = {}
+    for name in args.targets or BENCHMARKS:
+        if name == 'webhook':
+            result = bench_webhook(module, args.iterations, args.concurrency, args.server)
+        else:
+            result = BENCHMARKS[name](module, args.iterations)
+        results.update(result or {})
+    log(f'  モック LINE API: {MOCK_SERVER.requests} リクエスト / エラー {MOCK_SERVER.errors}')
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as baseline_file:
+            json.dump(results, baseline_file, ensure_ascii=False, indent=2)
+        log(f'💾 基準値を保存しました: {args.save_baseline}')
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            regressions = check_regressions(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            log(f'❌ 劣化: {regression}')
+        if regressions:
+            sys.exit(1)
+        log('✅ 基準値からの劣化なし')
+
+
+if __name__ == '__main__':
+    main()
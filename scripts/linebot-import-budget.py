@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# LINE Bot 統合機能の起動時間（import 時間）の予算チェック
+#
+# 使い方:
+#   python scripts/linebot-import-budget.py                  # 既定の予算（LINEBOT_IMPORT_BUDGET_MS または 250ms）で判定
+#   python scripts/linebot-import-budget.py --budget-ms 180 --runs 7
+#
+# 新しいプロセスで `python -X importtime -c "import staff_linebot_wsgi"` を実行し、WSGI エントリポイントの
+# 読み込み（create_app() まで含む）にかかった時間の中央値を予算と比べる。予算超過、または起動時に
+# 読み込まないはずのモジュール（linebot / requests）が読み込まれていたら終了コード 1。
+# LINE のトークンは空にして実行する（起動直後のクライアント生成はバックグラウンドで行われ、計測対象外のため）。
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRY_MODULE = 'staff_linebot_wsgi'
+# 初回の送受信まで読み込みを遅らせているモジュール
+DEFERRED_MODULES = ('linebot', 'requests')
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def log(message):
+    print(f"[{datetime.now().isoformat(timespec='seconds')}] {message}")
+
+
+def measure():
+    # 1回分の import を別プロセスで実行し、(WSGI 全体の ms, 直下の import ごとの ms, 読み込まれたモジュール) を返す
+    env = {key: value for key, value in os.environ.items() if not key.startswith('LINE_BOT_')}
+    env.setdefault('LINEBOT_STORAGE', 'memory')
+    # 本番と同じく .pyc を使った起動を測る（書き込みが無効だと毎回ソースのコンパイルが入る）
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {ENTRY_MODULE}'],
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'{ENTRY_MODULE} の読み込みに失敗しました:\n{result.stderr[-2000:]}')
+
+    entries = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            entries.append((int(match.group(2)) / 1000, len(match.group(3)), match.group(4)))
+
+    total, depth, index = next((cumulative, depth, index) for index, (cumulative, depth, name) in enumerate(entries)
+                               if name == ENTRY_MODULE)
+    # importtime は子を親より先に出力する。エントリポイント直下の import を集計する
+    children = {}
+    for cumulative, child_depth, name in reversed(entries[:index]):
+        if child_depth <= depth:
+            break
+        if child_depth == depth + 2:
+            children[name] = cumulative
+    modules = {name.split('.')[0] for _, _, name in entries}
+    return total, children, modules
+
+
+def check(budget_ms, runs=5, top=8):
+    # 計測して結果を表示し、失敗理由のリストを返す（空なら合格）
+    # 1回目は .pyc の生成を含むため捨てる
+    measure()
+    totals, children, modules = [], {}, set()
+    for _ in range(runs):
+        total, run_children, run_modules = measure()
+        totals.append(total)
+        modules |= run_modules
+        for name, cumulative in run_children.items():
+            children.setdefault(name, []).append(cumulative)
+
+    median = statistics.median(totals)
+    log(f'🔍 import {ENTRY_MODULE}: 中央値 {median:.1f}ms（最小 {min(totals):.1f}ms / 最大 {max(totals):.1f}ms / {runs}回）')
+    heaviest = sorted(((statistics.median(samples), name) for name, samples in children.items()), reverse=True)
+    for cumulative, name in heaviest[:top]:
+        log(f'  {name}: {cumulative:.1f}ms')
+
+    failures = []
+    if median > budget_ms:
+        failures.append(f'import 時間 {median:.1f}ms が予算 {budget_ms:.0f}ms を超えています')
+    loaded = [name for name in DEFERRED_MODULES if name in modules]
+    if loaded:
+        failures.append(f"起動時に読み込まないはずのモジュールが読み込まれています: {', '.join(loaded)}")
+
+    for failure in failures:
+        log(f'❌ {failure}')
+    if not failures:
+        log(f'✅ 予算 {budget_ms:.0f}ms 以内')
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='LINE Bot 統合機能の import 時間チェック')
+    parser.add_argument('--budget-ms', type=float, default=float(os.getenv('LINEBOT_IMPORT_BUDGET_MS', '250')),
+                        help='許容する import 時間（ms、中央値で判定）')
+    parser.add_argument('--runs', type=int, default=5, help='計測回数')
+    parser.add_argument('--top', type=int, default=8, help='表示する重い import の件数')
+    args = parser.parse_args()
+
+    return 1 if check(args.budget_ms, args.runs, args.top) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
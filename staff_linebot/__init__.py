@@ -0,0 +1,19 @@
+# staff_linebot
+# スタッフ管理システム（w5hni7cp60ev.manus.space）用 LINE Bot統合機能
+#
+# アプリは staff_linebot.app.create_app() で組み立てる（本番は staff_linebot_wsgi.py から gunicorn で起動）。
+# 各モジュールは import 時に環境変数から設定を読むため、.env はパッケージの読み込み時に最初に反映する
+
+import os
+
+# 環境変数読み込み（.env があるときだけ dotenv を読み込む）
+def load_environment():
+    for directory in (os.getcwd(), os.path.dirname(os.path.dirname(os.path.abspath(__file__)))):
+        path = os.path.join(directory, '.env')
+        if os.path.exists(path):
+            from dotenv import load_dotenv
+            load_dotenv(path)
+            return path
+    return None
+
+load_environment()
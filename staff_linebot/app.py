@@ -0,0 +1,89 @@
+# staff_linebot/app.py
+# アプリケーションファクトリ
+# 本番は gunicorn で複数ワーカーを起動する（gunicorn.conf.py / staff_linebot_wsgi.py）。
+# ワーカー間で共有されるのは LINEBOT_STORAGE=sqlite:/// のリポジトリ（欠勤報告・回答・統計カウンタ・名簿の版番号・処理済みイベント）
+#
+# import しただけでは何も作らない。create_app() が init_state() で保存レイヤーと名簿・統計などを組み立て、
+# 起動時に行うバックグラウンド処理（送信中のまま残ったお客様への連絡の再開・募集中のまま残った代替スタッフ募集の見張り）を始める
+
+import atexit
+import os
+import threading
+
+from flask import Flask
+
+from . import state
+from .customer_notify import customer_notifier
+from .dashboard import dashboard_asset
+from .event_queue import EventDeduplicator
+from .intents import intent_classifier
+from .json_codec import FastJSONProvider
+from .line_api import warm_line_clients
+from .live_feed import LiveFeed
+from .recruitment import recruitment_scheduler
+from .routes import linebot_bp
+from .staff import StaffDirectory, seed_sample_staff
+from .stats import StatsAggregator
+from .storage import LINEBOT_STORAGE, create_repository
+from .templating import get_compiled_template
+from .tenants import LINEBOT_TENANTS_FILE, message_templates, tenants
+
+# LINEBOT_PREWARM=0 なら起動時には何もせず、初回利用時に作る（コールドスタート重視の環境向け）
+LINEBOT_PREWARM = os.getenv('LINEBOT_PREWARM', '1') == '1'
+
+_state_lock = threading.Lock()
+
+# プロセスの状態はプロセスに1つ。2回目以降の呼び出し（同じプロセスで create_app を複数回呼ぶ場合）は何もしない
+def init_state(app):
+    with _state_lock:
+        if state.repository is not None:
+            return False
+        tenants_file = app.config.get('LINEBOT_TENANTS_FILE', LINEBOT_TENANTS_FILE)
+        if tenants_file:
+            tenants.load(tenants_file)
+
+        repository = create_repository(app.config.get('LINEBOT_STORAGE', LINEBOT_STORAGE))
+        atexit.register(repository.flush)
+        seed_sample_staff(repository)
+        staff_directory = StaffDirectory(repository)
+        staff_directory.load()
+        stats = StatsAggregator(repository.counters)
+        stats.load(repository)
+
+        state.staff_directory = staff_directory
+        state.stats = stats
+        state.live_feed = LiveFeed(repository.changes)
+        state.event_deduplicator = EventDeduplicator(
+            backing=repository if hasattr(repository, 'claim_event') else None)
+        recruitment_scheduler.load_history(repository)
+        # 他の状態が揃ってから公開する（state.repository が None でなければ初期化済み）
+        state.repository = repository
+
+    recruitment_scheduler.resume()
+    threading.Thread(target=customer_notifier.resume, name='customer-notify-resume', daemon=True).start()
+    return True
+
+def warm_caches(app):
+    # 最初のリクエストで起きる描画・圧縮を起動時に済ませる
+    dashboard_asset(app)
+    threading.Thread(target=warm_line_clients, name='line-client-warmup', daemon=True).start()
+    for template_key in message_templates:
+        get_compiled_template(template_key)
+    intent_classifier.classify_batch(['明日は風邪で休みます', '代わりに出勤します', '代わりに出勤できません'])
+    for record in state.staff_directory.all():
+        state.staff_directory.substitute_candidates(record.id)
+
+# config には Flask の設定に加えて LINEBOT_STORAGE / LINEBOT_TENANTS_FILE / LINEBOT_PREWARM / SECRET_KEY を渡せる
+# （省略したものは環境変数の値）
+def create_app(config=None):
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.config.update(config or {})
+    app.secret_key = app.config.get('SECRET_KEY') or os.getenv('SECRET_KEY', 'your-secret-key-here')
+    from flask_cors import CORS
+    CORS(app)
+    app.register_blueprint(linebot_bp)
+    init_state(app)
+    if app.config.get('LINEBOT_PREWARM', LINEBOT_PREWARM):
+        warm_caches(app)
+    return app
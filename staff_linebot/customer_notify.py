@@ -0,0 +1,189 @@
+# staff_linebot/customer_notify.py
+
+import copy
+import threading
+import uuid
+from concurrent.futures import as_completed
+from datetime import datetime
+
+from . import state
+from .line_api import line_channel_configured, text_message
+from .messaging import describe_line_error, submit_line_message
+from .metrics import errors_total
+from .outbound import OutboundQueueFull, line_sender
+from .sample_data import sample_appointments
+from .templating import process_template, render_template_batch
+from .tenants import current_tenant, tenants, use_tenant
+
+# お客様への振替連絡送信
+def customer_notification_variables(customer_info, absence_info, substitute_info):
+    return {
+        'customer_name': customer_info['name'],
+        'appointment_date': customer_info['appointment_date'],
+        'appointment_time': customer_info['appointment_time'],
+        'absent_staff_name': absence_info['staff_name'],
+        'substitute_staff_name': substitute_info['name'],
+        'salon_phone': current_tenant.get().settings['salon_phone']
+    }
+
+def send_customer_notification(customer_info, absence_info, substitute_info):
+    message = process_template('customer_notification',
+                               customer_notification_variables(customer_info, absence_info, substitute_info))
+    
+    if line_channel_configured('bot_b'):
+        return submit_line_message('bot_b', 'push_message', customer_info['line_id'], message,
+                                   'customer_notification', 'customer', 'LINE Bot B メッセージ送信エラー')
+    return None
+
+# 欠勤で影響を受ける予約
+def find_affected_appointments(staff_id, date):
+    return [appointment for appointment in sample_appointments
+            if appointment['staff_id'] == staff_id and appointment['appointment_date'] == date]
+
+# お客様への一括振替連絡
+# 欠勤報告ごとの配信状況（お客様単位）を欠勤報告の customer_notifications に保存する。
+# 送信前に全件を pending で保存し、結果が出るたびに更新するので、途中で落ちても未送信分だけ再開できる。
+# retry_key は欠勤報告と予約から決まるため、送信済みで記録前に落ちた分を再送しても LINE 側で二重配信されない。
+# 送る前に customer_notifications_claim を条件付き更新で取り、保存はその claim を持つ処理だけが行う
+# （同じ配信を別のワーカー・別のリクエストが引き継いだら、元の処理は保存をやめる）
+CUSTOMER_NOTIFY_RETRY_NAMESPACE = uuid.UUID('6f1c2d4e-8a3b-4c5d-9e7f-0a1b2c3d4e5f')
+
+class CustomerNotificationBusy(RuntimeError):
+    pass
+
+class CustomerNotifier:
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def notify(self, report_id, appointments, substitute_info):
+        report = state.repository.get_absence_report(report_id)
+        if report is None:
+            raise KeyError(report_id)
+        
+        delivery = copy.deepcopy(report.get('customer_notifications')) or {
+            'status': 'sending',
+            'substitute_staff_id': substitute_info.id,
+            'substitute_staff_name': substitute_info.name,
+            'started_at': datetime.now().isoformat(),
+            'customers': {}
+        }
+        for appointment in appointments:
+            delivery['customers'].setdefault(appointment['id'], {
+                'appointment': appointment, 'status': 'pending', 'attempts': 0, 'error': None, 'sent_at': None
+            })
+        delivery['status'] = 'sending'
+        claim = self._claim(report_id, report, delivery)
+        if claim is None:
+            # 読んでから取るまでの間に、同じ配信を別の処理が始めた
+            raise CustomerNotificationBusy(report_id)
+        # 管理画面の API から呼ばれた場合も、欠勤報告のテナントの Bot B・テンプレートで送る
+        with use_tenant(tenants.resolve(report.get('tenant'))):
+            return self._deliver(report_id, report, delivery, claim)
+
+    def resume(self):
+        # 送信中のまま残った配信を再開する（起動時）
+        resumed = []
+        for report in state.repository.list_absence_reports():
+            delivery = copy.deepcopy(report.get('customer_notifications'))
+            if not delivery or delivery['status'] != 'sending':
+                continue
+            # 複数のワーカーが同時に起動しても、claim を取れた1つだけが再開する
+            claim = self._claim(report['id'], report, delivery)
+            if claim is None:
+                continue
+            with use_tenant(tenants.resolve(report.get('tenant'))):
+                self._deliver(report['id'], report, delivery, claim)
+            resumed.append(report['id'])
+        return resumed
+
+    def _claim(self, report_id, report, delivery):
+        # 読んだときの配信記録のままなら自分の claim で上書きする。取れたら claim を、取れなければ None を返す。
+        # 保存レイヤーは渡した dict をそのまま持つことがあるので、送信中に書き換える delivery は複製して渡す
+        claim = uuid.uuid4().hex
+        claimed = state.repository.update_absence_report(
+            report_id, {'customer_notifications': copy.deepcopy(delivery), 'customer_notifications_claim': claim},
+            if_match={'customer_notifications_claim': report.get('customer_notifications_claim'),
+                      'customer_notifications': report.get('customer_notifications')})
+        return claim if claimed is not None else None
+
+    def _deliver(self, report_id, report, delivery, claim):
+        pending = [appointment_id for appointment_id, customer in delivery['customers'].items()
+                   if customer['status'] != 'sent']
+        if not line_channel_configured('bot_b'):
+            print(f"LINE Bot B not configured. Customer notifications pending: {len(pending)}件")
+            return self.summary(delivery)
+        
+        substitute_info = {'name': delivery['substitute_staff_name']}
+        customers = [delivery['customers'][appointment_id] for appointment_id in pending]
+        messages = render_template_batch('customer_notification', [
+            customer_notification_variables(customer['appointment'], report, substitute_info) for customer in customers
+        ])
+        
+        futures = {}
+        for appointment_id, customer, message in zip(pending, customers, messages):
+            retry_key = str(uuid.uuid5(CUSTOMER_NOTIFY_RETRY_NAMESPACE, f'{report_id}:{appointment_id}'))
+            try:
+                future = line_sender.submit('bot_b', 'push_message', customer['appointment']['line_id'],
+                                            text_message(message), template_key='customer_notification',
+                                            priority='customer', retry_key=retry_key)
+            except OutboundQueueFull as error:
+                if not self._update(report_id, delivery, claim, appointment_id, error):
+                    return self._handed_over(report_id, delivery)
+                continue
+            futures[future] = appointment_id
+        
+        for future in as_completed(futures):
+            if not self._update(report_id, delivery, claim, futures[future], future.exception()):
+                return self._handed_over(report_id, delivery)
+        
+        with self._lock:
+            if all(customer['status'] == 'sent' for customer in delivery['customers'].values()):
+                delivery['status'] = 'completed'
+            else:
+                delivery['status'] = 'partial'
+            delivery['finished_at'] = datetime.now().isoformat()
+            if not self._save(report_id, delivery, claim):
+                return self._handed_over(report_id, delivery)
+        
+        summary = self.summary(delivery)
+        print(f"📨 お客様への振替連絡: {summary['sent']}件送信 / {summary['failed']}件失敗 (欠勤報告 {report_id})")
+        return summary
+
+    def _handed_over(self, report_id, delivery):
+        # 送信済みの分は retry_key で二重配信されないので、残りは引き継いだ処理に任せる
+        print(f"📨 お客様への振替連絡は別の処理が引き継ぎました (欠勤報告 {report_id})")
+        return self.summary(delivery)
+
+    def _update(self, report_id, delivery, claim, appointment_id, error):
+        with self._lock:
+            customer = delivery['customers'][appointment_id]
+            customer['attempts'] += 1
+            if error is None:
+                customer.update(status='sent', error=None, sent_at=datetime.now().isoformat())
+            else:
+                errors_total.inc('customer_notification')
+                customer.update(status='failed', error=describe_line_error(error))
+            return self._save(report_id, delivery, claim)
+
+    def _save(self, report_id, delivery, claim):
+        # claim を持っている間だけ保存する。保存できたかを返す
+        return state.repository.update_absence_report(
+            report_id, {'customer_notifications': copy.deepcopy(delivery)},
+            if_match={'customer_notifications_claim': claim}) is not None
+
+    def summary(self, delivery):
+        customers = delivery['customers']
+        counts = {status: 0 for status in ('sent', 'failed', 'pending')}
+        for customer in customers.values():
+            counts[customer['status']] += 1
+        return dict(counts, status=delivery['status'], total=len(customers), customers={
+            appointment_id: {
+                'customer_name': customer['appointment']['name'],
+                'status': customer['status'],
+                'attempts': customer['attempts'],
+                'error': customer['error'],
+                'sent_at': customer['sent_at']
+            } for appointment_id, customer in customers.items()
+        })
+
+customer_notifier = CustomerNotifier()
@@ -0,0 +1,721 @@
+# staff_linebot/dashboard.py
+
+import gzip
+import hashlib
+
+from flask import Response
+
+# スタッフ管理システムのメインHTMLテンプレート
+MAIN_TEMPLATE = """
+<!DOCTYPE html>
+<html lang="ja">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>スタッフ管理システム - LINE Bot管理</title>
+    <style>
+        * {
+            margin: 0;
+            padding: 0;
+            box-sizing: border-box;
+        }
+        
+        body {
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            min-height: 100vh;
+            color: #333;
+        }
+        
+        .container {
+            max-width: 1200px;
+            margin: 0 auto;
+            padding: 20px;
+        }
+        
+        .header {
+            background: rgba(255, 255, 255, 0.95);
+            backdrop-filter: blur(10px);
+            border-radius: 16px;
+            padding: 30px;
+            margin-bottom: 30px;
+            box-shadow: 0 8px 32px rgba(0, 0, 0, 0.1);
+            border: 1px solid rgba(255, 255, 255, 0.2);
+        }
+        
+        .header h1 {
+            color: #667eea;
+            font-size: 32px;
+            margin-bottom: 10px;
+            text-align: center;
+        }
+        
+        .header p {
+            color: #666;
+            text-align: center;
+            font-size: 16px;
+        }
+        
+        .tabs {
+            display: flex;
+            background: rgba(255, 255, 255, 0.95);
+            backdrop-filter: blur(10px);
+            border-radius: 16px;
+            padding: 10px;
+            margin-bottom: 30px;
+            box-shadow: 0 8px 32px rgba(0, 0, 0, 0.1);
+            border: 1px solid rgba(255, 255, 255, 0.2);
+        }
+        
+        .tab {
+            flex: 1;
+            padding: 15px 20px;
+            background: transparent;
+            border: none;
+            border-radius: 12px;
+            cursor: pointer;
+            font-size: 14px;
+            font-weight: 500;
+            transition: all 0.3s ease;
+            color: #667eea;
+        }
+        
+        .tab.active {
+            background: #667eea;
+            color: white;
+            box-shadow: 0 4px 15px rgba(102, 126, 234, 0.3);
+        }
+        
+        .tab:hover:not(.active) {
+            background: rgba(102, 126, 234, 0.1);
+        }
+        
+        .content {
+            background: rgba(255, 255, 255, 0.95);
+            backdrop-filter: blur(10px);
+            border-radius: 16px;
+            padding: 30px;
+            box-shadow: 0 8px 32px rgba(0, 0, 0, 0.1);
+            border: 1px solid rgba(255, 255, 255, 0.2);
+            min-height: 500px;
+        }
+        
+        .stats-grid {
+            display: grid;
+            grid-template-columns: repeat(auto-fit, minmax(250px, 1fr));
+            gap: 20px;
+            margin-bottom: 30px;
+        }
+        
+        .stat-card {
+            background: rgba(255, 255, 255, 0.9);
+            border-radius: 12px;
+            padding: 25px;
+            text-align: center;
+            box-shadow: 0 4px 20px rgba(0, 0, 0, 0.1);
+            border: 1px solid rgba(255, 255, 255, 0.3);
+        }
+        
+        .stat-icon {
+            font-size: 48px;
+            margin-bottom: 15px;
+        }
+        
+        .stat-number {
+            font-size: 32px;
+            font-weight: 700;
+            color: #667eea;
+            margin-bottom: 5px;
+        }
+        
+        .stat-label {
+            color: #666;
+            font-size: 14px;
+        }
+        
+        .table {
+            width: 100%;
+            border-collapse: collapse;
+            background: white;
+            border-radius: 12px;
+            overflow: hidden;
+            box-shadow: 0 4px 20px rgba(0, 0, 0, 0.08);
+        }
+        
+        .table th {
+            background: linear-gradient(135deg, #667eea, #764ba2);
+            color: white;
+            padding: 16px 12px;
+            text-align: left;
+            font-weight: 600;
+            font-size: 14px;
+        }
+        
+        .table td {
+            padding: 16px 12px;
+            border-bottom: 1px solid #f1f3f4;
+            font-size: 14px;
+        }
+        
+        .table tr:hover {
+            background: rgba(102, 126, 234, 0.05);
+        }
+        
+        .status-badge {
+            padding: 6px 12px;
+            border-radius: 20px;
+            font-size: 12px;
+            font-weight: 500;
+        }
+        
+        .status-reported {
+            background: rgba(52, 144, 220, 0.1);
+            color: #3490dc;
+        }
+        
+        .status-accepted {
+            background: rgba(40, 167, 69, 0.1);
+            color: #28a745;
+        }
+        
+        .status-declined,
+        .status-unfilled {
+            background: rgba(220, 53, 69, 0.1);
+            color: #dc3545;
+        }
+        
+        .status-filled {
+            background: rgba(40, 167, 69, 0.1);
+            color: #28a745;
+        }
+        
+        .btn {
+            padding: 12px 24px;
+            border: none;
+            border-radius: 8px;
+            cursor: pointer;
+            font-size: 14px;
+            font-weight: 500;
+            transition: all 0.3s ease;
+            background: #667eea;
+            color: white;
+        }
+        
+        .btn:hover {
+            background: #5a6fd8;
+            transform: translateY(-2px);
+            box-shadow: 0 6px 20px rgba(102, 126, 234, 0.4);
+        }
+        
+        .form-group {
+            margin-bottom: 20px;
+        }
+        
+        .form-group label {
+            display: block;
+            margin-bottom: 8px;
+            font-weight: 500;
+            color: #333;
+        }
+        
+        .form-group input,
+        .form-group textarea {
+            width: 100%;
+            padding: 12px 16px;
+            border: 2px solid #e1e5e9;
+            border-radius: 8px;
+            font-size: 14px;
+            transition: all 0.3s ease;
+        }
+        
+        .form-group input:focus,
+        .form-group textarea:focus {
+            outline: none;
+            border-color: #667eea;
+            box-shadow: 0 0 0 3px rgba(102, 126, 234, 0.1);
+        }
+        
+        .error-message {
+            background: rgba(220, 53, 69, 0.1);
+            color: #dc3545;
+            padding: 15px 20px;
+            border-radius: 8px;
+            margin-bottom: 20px;
+            border-left: 4px solid #dc3545;
+        }
+        
+        .success-message {
+            background: rgba(40, 167, 69, 0.1);
+            color: #28a745;
+            padding: 15px 20px;
+            border-radius: 8px;
+            margin-bottom: 20px;
+            border-left: 4px solid #28a745;
+        }
+        
+        .no-data {
+            text-align: center;
+            padding: 60px 20px;
+            color: #6c757d;
+            font-size: 16px;
+        }
+        
+        .activity-item {
+            padding: 10px 15px;
+            border-bottom: 1px solid #e9ecef;
+            font-size: 14px;
+        }
+        
+        @media (max-width: 768px) {
+            .container {
+                padding: 15px;
+            }
+            
+            .tabs {
+                flex-direction: column;
+            }
+            
+            .stats-grid {
+                grid-template-columns: 1fr;
+            }
+        }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>🤖 LINE Bot自動化管理</h1>
+            <p>スタッフの欠勤報告から代替出勤依頼まで、完全自動化</p>
+        </div>
+        
+        <div class="tabs">
+            <button class="tab active" onclick="showTab('dashboard')">📊 ダッシュボード</button>
+            <button class="tab" onclick="showTab('reports')">📋 欠勤報告</button>
+            <button class="tab" onclick="showTab('requests')">🔄 代替出勤</button>
+            <button class="tab" onclick="showTab('settings')">⚙️ 設定</button>
+            <button class="tab" onclick="showTab('test')">🧪 テスト</button>
+        </div>
+        
+        <div class="content">
+            <!-- ダッシュボード -->
+            <div id="dashboard" class="tab-content">
+                <div class="stats-grid">
+                    <div class="stat-card">
+                        <div class="stat-icon">📋</div>
+                        <div class="stat-number" id="total-reports">0</div>
+                        <div class="stat-label">欠勤報告</div>
+                    </div>
+                    <div class="stat-card">
+                        <div class="stat-icon">🔄</div>
+                        <div class="stat-number" id="total-requests">0</div>
+                        <div class="stat-label">代替出勤依頼</div>
+                    </div>
+                    <div class="stat-card">
+                        <div class="stat-icon">✅</div>
+                        <div class="stat-number" id="accepted-requests">0</div>
+                        <div class="stat-label">受諾数</div>
+                    </div>
+                    <div class="stat-card">
+                        <div class="stat-icon">❌</div>
+                        <div class="stat-number" id="declined-requests">0</div>
+                        <div class="stat-label">拒否数</div>
+                    </div>
+                </div>
+                
+                <h3>最近の活動</h3>
+                <div id="recent-activity">
+                    <div class="no-data">データを読み込み中...</div>
+                </div>
+            </div>
+            
+            <!-- 欠勤報告 -->
+            <div id="reports" class="tab-content" style="display: none;">
+                <h3>欠勤報告一覧</h3>
+                <div id="reports-list">
+                    <div class="no-data">データを読み込み中...</div>
+                </div>
+            </div>
+            
+            <!-- 代替出勤依頼 -->
+            <div id="requests" class="tab-content" style="display: none;">
+                <h3>代替出勤依頼一覧</h3>
+                <div id="requests-list">
+                    <div class="no-data">データを読み込み中...</div>
+                </div>
+            </div>
+            
+            <!-- 設定 -->
+            <div id="settings" class="tab-content" style="display: none;">
+                <h3>LINE Bot設定</h3>
+                <div class="form-group">
+                    <label>LINE Bot A Access Token (スタッフ向け)</label>
+                    <input type="text" id="bot-a-token" placeholder="LINE Bot A のアクセストークン">
+                </div>
+                <div class="form-group">
+                    <label>LINE Bot B Access Token (お客様向け)</label>
+                    <input type="text" id="bot-b-token" placeholder="LINE Bot B のアクセストークン">
+                </div>
+                <button class="btn" onclick="saveSettings()">設定保存</button>
+            </div>
+            
+            <!-- テスト -->
+            <div id="test" class="tab-content" style="display: none;">
+                <h3>🧪 LINE Botテスト</h3>
+                <div class="form-group">
+                    <label>スタッフID</label>
+                    <input type="text" id="test-staff-id" value="U1234567890" placeholder="U1234567890">
+                </div>
+                <div class="form-group">
+                    <label>テストメッセージ</label>
+                    <textarea id="test-message" rows="3" placeholder="今日体調不良で欠勤します">今日体調不良で欠勤します</textarea>
+                </div>
+                <button class="btn" onclick="testAbsenceReport()">テスト送信</button>
+                
+                <div style="margin-top: 30px;">
+                    <h4>テストメッセージ例</h4>
+                    <button class="btn" onclick="setTestMessage('今日体調不良で欠勤します')" style="margin: 5px;">体調不良で欠勤</button>
+                    <button class="btn" onclick="setTestMessage('風邪で明日休みます')" style="margin: 5px;">風邪で休み</button>
+                    <button class="btn" onclick="setTestMessage('代わりに出勤します')" style="margin: 5px;">代替出勤受諾</button>
+                    <button class="btn" onclick="setTestMessage('代わりに出勤できません')" style="margin: 5px;">代替出勤拒否</button>
+                </div>
+            </div>
+        </div>
+    </div>
+    
+    <script>
+        // タブ切り替え
+        function showTab(tabName) {
+            // すべてのタブコンテンツを非表示
+            const contents = document.querySelectorAll('.tab-content');
+            contents.forEach(content => content.style.display = 'none');
+            
+            // すべてのタブボタンのアクティブクラスを削除
+            const tabs = document.querySelectorAll('.tab');
+            tabs.forEach(tab => tab.classList.remove('active'));
+            
+            // 選択されたタブを表示
+            document.getElementById(tabName).style.display = 'block';
+            
+            // 選択されたタブボタンにアクティブクラスを追加
+            event.target.classList.add('active');
+            
+            // データを読み込み（ライブ配信の接続中は、読み込み済みの一覧を差分で更新するため再取得しない）
+            if (tabName === 'dashboard') {
+                if (!liveConnected) {
+                    loadDashboard();
+                }
+            } else if (tabName === 'reports') {
+                if (!liveConnected || !listLoaded.reports) {
+                    loadReports();
+                }
+            } else if (tabName === 'requests') {
+                if (!liveConnected || !listLoaded.requests) {
+                    loadRequests();
+                }
+            }
+        }
+        
+        // ダッシュボードデータ読み込み
+        function loadDashboard() {
+            fetch('/api/line-bot/stats')
+                .then(response => response.json())
+                .then(applySummary)
+                .catch(error => {
+                    console.error('統計データ取得エラー:', error);
+                });
+        }
+        
+        function applySummary(data) {
+            document.getElementById('total-reports').textContent = data.total_absence_reports || 0;
+            document.getElementById('total-requests').textContent = data.total_substitute_requests || 0;
+            document.getElementById('accepted-requests').textContent = data.accepted_substitutes || 0;
+            document.getElementById('declined-requests').textContent = data.declined_substitutes || 0;
+        }
+        
+        // 一覧のページング状態（次ページのカーソル）と読み込み済みかどうか
+        const listCursors = { reports: null, requests: null };
+        const listLoaded = { reports: false, requests: false };
+        
+        function fetchPage(url, key, append) {
+            const params = new URLSearchParams({ limit: 50 });
+            if (append && listCursors[key]) {
+                params.set('cursor', listCursors[key]);
+            }
+            return fetch(url + '?' + params.toString())
+                .then(response => response.json())
+                .then(data => {
+                    listCursors[key] = data.next_cursor;
+                    return data.items;
+                });
+        }
+        
+        function renderList(containerId, key, loader, emptyMessage, header, rowHtml, items, append) {
+            listLoaded[key] = true;
+            const container = document.getElementById(containerId);
+            let tbody = container.querySelector('tbody');
+            if (!append || !tbody) {
+                if (items.length === 0) {
+                    container.innerHTML = '<div class="no-data">' + emptyMessage + '</div>';
+                    return;
+                }
+                container.innerHTML = '<table class="table"><thead><tr>' + header + '</tr></thead><tbody></tbody></table>';
+                tbody = container.querySelector('tbody');
+            }
+            tbody.insertAdjacentHTML('beforeend', items.map(rowHtml).join(''));
+            
+            const oldButton = container.querySelector('.load-more');
+            if (oldButton) {
+                oldButton.remove();
+            }
+            if (listCursors[key]) {
+                container.insertAdjacentHTML('beforeend', '<button class="btn load-more" style="margin-top: 15px;">さらに読み込む</button>');
+                container.querySelector('.load-more').onclick = () => loader(true);
+            }
+        }
+        
+        const REPORT_HEADER = '<th>スタッフ名</th><th>欠勤日</th><th>時間</th><th>理由</th><th>報告時刻</th><th>ステータス</th>';
+        const REQUEST_HEADER = '<th>スタッフ名</th><th>ステータス</th><th>回答時刻</th>';
+        
+        // LINE から届いた文字列をそのまま innerHTML に入れないようにエスケープする
+        function escapeHtml(value) {
+            return String(value == null ? '' : value)
+                .replace(/&/g, '&amp;')
+                .replace(/</g, '&lt;')
+                .replace(/>/g, '&gt;')
+                .replace(/"/g, '&quot;')
+                .replace(/'/g, '&#39;');
+        }
+        
+        function reportRow(report) {
+            const absence = report.absence_data || {};
+            return `<tr data-id="${escapeHtml(report.id)}">
+                <td>${escapeHtml(report.staff_name)}</td>
+                <td>${escapeHtml(absence.date)}</td>
+                <td>${escapeHtml(absence.time)}</td>
+                <td>${escapeHtml(absence.reason)}</td>
+                <td>${escapeHtml(new Date(report.timestamp).toLocaleString('ja-JP'))}</td>
+                <td><span class="status-badge status-${escapeHtml(report.status)}">${escapeHtml(report.status)}</span></td>
+            </tr>`;
+        }
+        
+        function requestRow(request) {
+            return `<tr data-id="${escapeHtml(request.id)}">
+                <td>${escapeHtml(request.staff_name)}</td>
+                <td><span class="status-badge status-${escapeHtml(request.status)}">${escapeHtml(request.status)}</span></td>
+                <td>${escapeHtml(new Date(request.timestamp).toLocaleString('ja-JP'))}</td>
+            </tr>`;
+        }
+        
+        // 欠勤報告一覧読み込み
+        function loadReports(append) {
+            fetchPage('/api/line-bot/absence-reports', 'reports', append)
+                .then(items => {
+                    renderList('reports-list', 'reports', loadReports, '欠勤報告はありません', REPORT_HEADER, reportRow, items, append);
+                })
+                .catch(error => {
+                    console.error('欠勤報告取得エラー:', error);
+                });
+        }
+        
+        // 代替出勤依頼一覧読み込み
+        function loadRequests(append) {
+            fetchPage('/api/line-bot/substitute-requests', 'requests', append)
+                .then(items => {
+                    renderList('requests-list', 'requests', loadRequests, '代替出勤依頼はありません', REQUEST_HEADER, requestRow, items, append);
+                })
+                .catch(error => {
+                    console.error('代替出勤依頼取得エラー:', error);
+                });
+        }
+        
+        // テストメッセージ設定
+        function setTestMessage(message) {
+            document.getElementById('test-message').value = message;
+        }
+        
+        // テスト欠勤報告送信
+        function testAbsenceReport() {
+            const staffId = document.getElementById('test-staff-id').value;
+            const message = document.getElementById('test-message').value;
+            
+            fetch('/api/line-bot/test/absence-report', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({
+                    staff_id: staffId,
+                    message: message
+                })
+            })
+            .then(response => response.json())
+            .then(data => {
+                alert('テスト送信完了: ' + data.message);
+                if (!liveConnected) {
+                    loadDashboard();
+                }
+            })
+            .catch(error => {
+                console.error('テスト送信エラー:', error);
+                alert('テスト送信に失敗しました');
+            });
+        }
+        
+        // 設定保存
+        function saveSettings() {
+            const botAToken = document.getElementById('bot-a-token').value;
+            const botBToken = document.getElementById('bot-b-token').value;
+            
+            fetch('/api/line-bot/settings', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({
+                    bot_a_token: botAToken,
+                    bot_b_token: botBToken
+                })
+            })
+            .then(response => response.json())
+            .then(data => {
+                alert('設定を保存しました');
+            })
+            .catch(error => {
+                console.error('設定保存エラー:', error);
+                alert('設定保存に失敗しました');
+            });
+        }
+        
+        // ライブ配信（Server-Sent Events）
+        // 接続中はサーバーから届く差分（記録そのものと最新の集計）を画面に反映し、一覧や統計を取り直さない。
+        // 切断時はブラウザが Last-Event-ID 付きで自動再接続し、取りこぼした差分から再開する
+        let liveConnected = false;
+        
+        function connectLiveFeed() {
+            if (!window.EventSource) {
+                return;
+            }
+            const source = new EventSource('/api/line-bot/events');
+            source.onopen = () => { liveConnected = true; };
+            source.onerror = () => {
+                liveConnected = false;
+                if (source.readyState === EventSource.CLOSED) {
+                    // 接続数の上限などで拒否された場合は、しばらくしてから接続し直す
+                    setTimeout(connectLiveFeed, 30000);
+                }
+            };
+            source.addEventListener('hello', event => {
+                applySummary(JSON.parse(event.data).summary);
+                const placeholder = document.querySelector('#recent-activity .no-data');
+                if (placeholder) {
+                    placeholder.textContent = '新しい活動はまだありません';
+                }
+            });
+            source.addEventListener('reset', event => {
+                // 差分で追いつけないほど離れていたので、読み込み済みのものを取り直す
+                applySummary(JSON.parse(event.data).summary);
+                if (listLoaded.reports) {
+                    loadReports();
+                }
+                if (listLoaded.requests) {
+                    loadRequests();
+                }
+            });
+            source.addEventListener('absence_report', event => {
+                const change = JSON.parse(event.data);
+                applySummary(change.summary);
+                applyRecord('reports-list', 'reports', loadReports, REPORT_HEADER, reportRow, change.record);
+                addActivity(`📋 欠勤報告: ${change.record.staff_name}（${change.record.absence_data.date} / ${change.record.status}）`);
+            });
+            source.addEventListener('substitute_request', event => {
+                const change = JSON.parse(event.data);
+                applySummary(change.summary);
+                applyRecord('requests-list', 'requests', loadRequests, REQUEST_HEADER, requestRow, change.record);
+                addActivity(`🔄 代替出勤の回答: ${change.record.staff_name}（${change.record.status}）`);
+            });
+        }
+        
+        // 読み込み済みの一覧に1件反映する（同じ ID の行は置き換え、新しい記録は先頭に追加）
+        function applyRecord(containerId, key, loader, header, rowHtml, record) {
+            if (!listLoaded[key]) {
+                return;
+            }
+            const tbody = document.getElementById(containerId).querySelector('tbody');
+            if (!tbody) {
+                renderList(containerId, key, loader, '', header, rowHtml, [record], false);
+                return;
+            }
+            const existing = tbody.querySelector(`tr[data-id="${CSS.escape(record.id)}"]`);
+            if (existing) {
+                existing.outerHTML = rowHtml(record);
+            } else {
+                tbody.insertAdjacentHTML('afterbegin', rowHtml(record));
+            }
+        }
+        
+        function addActivity(text) {
+            const container = document.getElementById('recent-activity');
+            const placeholder = container.querySelector('.no-data');
+            if (placeholder) {
+                placeholder.remove();
+            }
+            container.insertAdjacentHTML('afterbegin',
+                `<div class="activity-item">${new Date().toLocaleTimeString('ja-JP')} ${escapeHtml(text)}</div>`);
+            while (container.children.length > 20) {
+                container.lastElementChild.remove();
+            }
+        }
+        
+        // ページ読み込み時にダッシュボードを表示
+        window.onload = function() {
+            loadDashboard();
+            connectLiveFeed();
+        };
+    </script>
+</body>
+</html>
+"""
+
+# 静的なレスポンス（ダッシュボード）
+# 本文は1度だけ作り、gzip（brotli があれば brotli も）で事前に圧縮しておく。ETag は圧縮方式ごとに分けた強い ETag
+class StaticAsset:
+    ENCODINGS = ('br', 'gzip')
+
+    def __init__(self, body, content_type):
+        self.content_type = content_type
+        digest = hashlib.sha256(body).hexdigest()[:20]
+        self.representations = {
+            'identity': (body, digest),
+            'gzip': (gzip.compress(body, 9, mtime=0), f'{digest}-gz')
+        }
+        try:
+            import brotli
+        except ImportError:
+            brotli = None
+        if brotli is not None:
+            self.representations['br'] = (brotli.compress(body, quality=11), f'{digest}-br')
+
+    def response(self, request):
+        encoding = next((encoding for encoding in self.ENCODINGS
+                         if encoding in self.representations and request.accept_encodings[encoding]), 'identity')
+        body, etag = self.representations[encoding]
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(body, content_type=self.content_type)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+# MAIN_TEMPLATE は変数を含まないため、描画結果は常に同じ（create_app() で作り、以降は使い回す）
+dashboard = None
+
+def dashboard_asset(app):
+    global dashboard
+    if dashboard is None:
+        html = app.jinja_env.from_string(MAIN_TEMPLATE).render()
+        dashboard = StaticAsset(html.encode('utf-8'), 'text/html; charset=utf-8')
+    return dashboard
@@ -0,0 +1,191 @@
+# staff_linebot/event_queue.py
+
+import contextvars
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+
+from .metrics import errors_total, event_seconds
+from .profiler import profiler
+
+# Webhook イベント処理キュー
+# LINE のタイムアウト内に 200 を返すため、署名検証後のイベントはワーカーで非同期処理する
+EVENT_QUEUE_SIZE = int(os.getenv('EVENT_QUEUE_SIZE', '1000'))
+EVENT_WORKERS = int(os.getenv('EVENT_WORKERS', '4'))
+
+class EventQueue:
+    def __init__(self, name, handler, maxsize=EVENT_QUEUE_SIZE, workers=EVENT_WORKERS):
+        self.name = name
+        self.handler = handler
+        self.maxsize = maxsize
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._threads = []
+        self._started_at = None
+        self._busy = 0
+        self._busy_seconds = 0.0
+        self._processed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._wait_recent = deque(maxlen=1000)
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._started_at = time.monotonic()
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'{self.name}-worker-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def free_slots(self):
+        return self.maxsize - self._queue.qsize()
+
+    def submit(self, item):
+        self.start()
+        try:
+            # 積んだ時点のテナントなどのコンテキストで処理する
+            self._queue.put_nowait((time.monotonic(), contextvars.copy_context(), item))
+            return True
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            return False
+
+    def _run(self):
+        while True:
+            enqueued_at, context, item = self._queue.get()
+            started = time.monotonic()
+            wait = started - enqueued_at
+            with self._lock:
+                self._busy += 1
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+                self._wait_recent.append(wait)
+            failed = False
+            profiled = profiler.active and profiler.begin(f'event:{self.name}')
+            try:
+                context.run(self.handler, item)
+            except Exception as error:
+                failed = True
+                errors_total.inc('event')
+                print(f"イベント処理エラー ({self.name}): {error}")
+            finally:
+                if profiled:
+                    profiler.end()
+                event_seconds.observe(time.monotonic() - started, self.name)
+                with self._lock:
+                    self._busy -= 1
+                    self._busy_seconds += time.monotonic() - started
+                    self._processed += 1
+                    self._failed += failed
+                self._queue.task_done()
+
+    def stats(self):
+        with self._lock:
+            elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+            recent = sorted(self._wait_recent)
+            processed = self._processed
+            return {
+                'queue_depth': self._queue.qsize(),
+                'queue_capacity': self.maxsize,
+                'workers': self.workers,
+                'busy_workers': self._busy,
+                'worker_utilization': round(self._busy_seconds / (elapsed * self.workers), 4) if elapsed else 0.0,
+                'processed': processed,
+                'failed': self._failed,
+                'rejected': self._rejected,
+                'wait_ms_avg': round(self._wait_total / processed * 1000, 2) if processed else 0.0,
+                'wait_ms_p95': round(recent[int(len(recent) * 0.95)] * 1000, 2) if recent else 0.0,
+                'wait_ms_max': round(self._wait_max * 1000, 2)
+            }
+
+# Webhook イベントの重複排除
+# 応答が遅いと LINE は同じ webhookEventId のイベントを再送する。処理済みの ID を TTL 付き LRU で覚えておき、
+# 再送分はハンドラに渡す前に捨てる。SQLite 使用時は他ワーカーの処理済み ID も参照する
+EVENT_DEDUP_TTL = float(os.getenv('EVENT_DEDUP_TTL', '86400'))
+EVENT_DEDUP_MAX_ENTRIES = int(os.getenv('EVENT_DEDUP_MAX_ENTRIES', '100000'))
+EVENT_DEDUP_PRUNE_EVERY = 1000
+
+class EventDeduplicator:
+    def __init__(self, ttl=EVENT_DEDUP_TTL, max_entries=EVENT_DEDUP_MAX_ENTRIES, backing=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.backing = backing
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.redelivered = 0
+        self.evictions = 0
+
+    def is_duplicate(self, event_id, is_redelivery=False):
+        # 重複なら True。初めての ID は処理済みとして記録して False を返す
+        if not event_id:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            self.redelivered += bool(is_redelivery)
+            expires_at = self._entries.get(event_id)
+            if expires_at is not None and expires_at > now:
+                self._entries.move_to_end(event_id)
+                self.hits += 1
+                return True
+            self._remember(event_id, now)
+        
+        if self.backing is not None:
+            # 初回配信は他ワーカーで処理済みのはずがないため、永続化先の確認は再送時だけ同期で行う
+            if is_redelivery:
+                if not self.backing.claim_event(event_id):
+                    with self._lock:
+                        self.hits += 1
+                    return True
+            else:
+                self.backing.mark_event_processed(event_id)
+        
+        with self._lock:
+            self.misses += 1
+            prune = self.backing is not None and self.misses % EVENT_DEDUP_PRUNE_EVERY == 0
+        if prune:
+            self.backing.prune_processed_events(time.time() - self.ttl)
+        return False
+
+    def _remember(self, event_id, now):
+        entries = self._entries
+        entries[event_id] = now + self.ttl
+        entries.move_to_end(event_id)
+        # TTL は一律なので先頭ほど古い。期限切れと上限超過を先頭から捨てる
+        while entries:
+            if len(entries) <= self.max_entries and next(iter(entries.values())) > now:
+                break
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def forget(self, event_id):
+        # キューに積めなかったイベントは LINE の再送で処理させるため記録を取り消す
+        if not event_id:
+            return
+        with self._lock:
+            self._entries.pop(event_id, None)
+        if self.backing is not None:
+            self.backing.forget_event(event_id)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'capacity': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'redelivered': self.redelivered,
+                'evictions': self.evictions,
+                'persistent': self.backing is not None
+            }
@@ -0,0 +1,271 @@
+# staff_linebot/eventlog.py
+
+import mmap
+import os
+import threading
+import time
+
+from .json_codec import json_dumps, json_loads
+from .metrics import errors_total
+from .storage import RECORD_KINDS, InMemoryRepository
+
+# イベントログ: 状態の変更をドメインイベント（1行1件の JSON）として追記専用のセグメントファイルに書く。
+# fsync は EVENT_LOG_FSYNC_INTERVAL 秒ごとにまとめて行う（0 なら追記のたびに fsync）。
+# EVENT_LOG_SNAPSHOT_EVERY 件ごとに状態全体のスナップショットを書いて新しいセグメントに切り替えるので、
+# 起動時は最新のスナップショットとそれ以降のセグメントだけを読めばよい。古いセグメントは監査ログとして残す
+EVENT_LOG_FSYNC_INTERVAL = float(os.getenv('EVENT_LOG_FSYNC_INTERVAL', '0.05'))
+EVENT_LOG_SNAPSHOT_EVERY = int(os.getenv('EVENT_LOG_SNAPSHOT_EVERY', '10000'))
+EVENT_LOG_KEEP_SNAPSHOTS = 2
+
+class EventLog:
+    SEGMENT_PREFIX, SEGMENT_SUFFIX = 'events-', '.log'
+    SNAPSHOT_PREFIX, SNAPSHOT_SUFFIX = 'snapshot-', '.json'
+
+    def __init__(self, directory, capture, fsync_interval=EVENT_LOG_FSYNC_INTERVAL,
+                 snapshot_every=EVENT_LOG_SNAPSHOT_EVERY):
+        # capture はスナップショットにする状態（JSON にできる dict）を返す関数。lock を持った状態で呼ばれる
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.snapshot_every = snapshot_every
+        self.lock = threading.Lock()
+        self._capture = capture
+        self._sync_lock = threading.Lock()
+        self._seq = 0
+        self._since_snapshot = 0
+        self._file = None
+        self._dirty = False
+        self._closed = False
+        os.makedirs(directory, exist_ok=True)
+        self._hold_directory()
+
+    def _hold_directory(self):
+        # 複数プロセスが同じログに追記すると連番が壊れるため、ディレクトリを排他ロックする
+        self._lock_file = open(os.path.join(self.directory, 'LOCK'), 'a')
+        try:
+            import fcntl
+        except ImportError:
+            return
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            raise RuntimeError(f'イベントログ {self.directory} は他のプロセスが使用中です（1プロセス専用）')
+
+    def _files(self, prefix, suffix):
+        # ファイル名の連番順に [(連番, パス)]
+        found = []
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix) and name.endswith(suffix) and name[len(prefix):-len(suffix)].isdigit():
+                found.append((int(name[len(prefix):-len(suffix)]), os.path.join(self.directory, name)))
+        return sorted(found)
+
+    def _path(self, prefix, suffix, seq):
+        return os.path.join(self.directory, f'{prefix}{seq:016d}{suffix}')
+
+    def load(self):
+        # (最新のスナップショットの状態または None, それ以降のイベントを順に返すイテレータ)。
+        # イテレータを読み終えてから start() で追記を始める
+        for seq, path in reversed(self._files(self.SNAPSHOT_PREFIX, self.SNAPSHOT_SUFFIX)):
+            try:
+                with open(path, 'rb') as snapshot_file:
+                    state = json_loads(snapshot_file.read())
+            except (OSError, ValueError) as error:
+                print(f"⚠️ スナップショットを読めないため1つ前を使います（{path}）: {error}")
+                continue
+            self._seq = seq
+            return state, self._replay()
+        return None, self._replay()
+
+    def _replay(self):
+        for event in self.events(self._seq):
+            self._seq = event['seq']
+            self._since_snapshot += 1
+            yield event
+
+    def events(self, after_seq=0):
+        # after_seq より後のイベントを連番順に読む。after_seq + 1 を含むセグメント（開始番号がそれ以下で最大のもの）から
+        segments = self._files(self.SEGMENT_PREFIX, self.SEGMENT_SUFFIX)
+        first = max((index for index, (start, _) in enumerate(segments) if start <= after_seq + 1), default=0)
+        for _, path in segments[first:]:
+            for event in self._read_segment(path):
+                if event['seq'] > after_seq:
+                    after_seq = event['seq']
+                    yield event
+
+    @staticmethod
+    def _read_segment(path):
+        # mmap して1行ずつ読む（セグメント全体を一度にメモリへ読み込まない）。
+        # 書き込み途中で止まった末尾の行（改行なし・壊れた JSON）があればそこで読み終える
+        with open(path, 'rb') as segment_file:
+            if os.fstat(segment_file.fileno()).st_size == 0:
+                return
+            with mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for line in iter(mapped.readline, b''):
+                    try:
+                        if not line.endswith(b'\n'):
+                            raise ValueError('改行がありません')
+                        event = json_loads(line)
+                    except ValueError as error:
+                        print(f"⚠️ イベントログ {path} の {mapped.tell() - len(line)} バイト目以降を読み飛ばします: {error}")
+                        return
+                    yield event
+
+    def start(self):
+        # 復元した最後の連番の次から新しいセグメントに追記する。同じ名前のファイルが残っていても
+        # 中身は書き込み途中の行だけ（完全な行があれば復元で読んでいる）なので空にする
+        self._file = open(self._path(self.SEGMENT_PREFIX, self.SEGMENT_SUFFIX, self._seq + 1), 'wb')
+        threading.Thread(target=self._flush_loop, name='event-log-flusher', daemon=True).start()
+
+    def append(self, event_type, kind, record_id, **body):
+        # lock を持った状態で、メモリへの反映と同じ順に呼ぶ。body は data（レコード全体）か fields（更新した項目）
+        self._seq += 1
+        self._since_snapshot += 1
+        event = dict(seq=self._seq, at=time.time(), type=event_type, kind=kind, id=record_id, **body)
+        self._file.write(json_dumps(event).encode() + b'\n')
+        self._dirty = True
+        if self.fsync_interval <= 0:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._dirty = False
+
+    def _flush_loop(self):
+        while not self._closed:
+            time.sleep(self.fsync_interval if self.fsync_interval > 0 else 0.05)
+            try:
+                self.sync()
+                if self._since_snapshot >= self.snapshot_every:
+                    self.snapshot()
+            except Exception as error:
+                errors_total.inc('event_log_write')
+                print(f"イベントログ書き込みエラー: {error}")
+
+    def sync(self):
+        # 溜まった追記をまとめて fsync する。fsync の間も追記は止めない
+        with self._sync_lock:
+            with self.lock:
+                if not self._dirty or self._closed:
+                    return
+                self._file.flush()
+                self._dirty = False
+                descriptor = self._file.fileno()
+            os.fsync(descriptor)
+
+    def snapshot(self):
+        # 状態の取得とセグメントの切り替えだけをロック内で行い、書き出しはロックの外で行う
+        with self._sync_lock:
+            with self.lock:
+                state, seq = self._capture(), self._seq
+                self._since_snapshot = 0
+                previous, self._file = self._file, open(self._path(self.SEGMENT_PREFIX, self.SEGMENT_SUFFIX, seq + 1), 'ab')
+                self._dirty = False
+            previous.flush()
+            os.fsync(previous.fileno())
+            previous.close()
+
+        path = self._path(self.SNAPSHOT_PREFIX, self.SNAPSHOT_SUFFIX, seq)
+        with open(path + '.tmp', 'wb') as snapshot_file:
+            snapshot_file.write(json_dumps(state).encode())
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.replace(path + '.tmp', path)
+        self._sync_directory()
+        for _, old_path in self._files(self.SNAPSHOT_PREFIX, self.SNAPSHOT_SUFFIX)[:-EVENT_LOG_KEEP_SNAPSHOTS]:
+            os.remove(old_path)
+        print(f"📸 イベントログのスナップショットを作成しました（#{seq}）")
+
+    def _sync_directory(self):
+        # rename をディスクに反映する（POSIX のみ）
+        try:
+            descriptor = os.open(self.directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+    def close(self):
+        # 追記をやめてディレクトリのロックを外す（同じプロセスで開き直すとき用）
+        self.sync()
+        with self._sync_lock, self.lock:
+            self._closed = True
+            self._file.close()
+        self._lock_file.close()
+
+# 欠勤報告の status の変更をドメインイベント名に対応付ける（status を含まない更新は absence_updated）
+ABSENCE_STATUS_EVENTS = {
+    'recruiting': 'substitute_requested',
+    'filled': 'substitute_filled',
+    'unfilled': 'substitute_unfilled'
+}
+
+class EventLogRepository(InMemoryRepository):
+    # InMemoryRepository の変更をイベントログに記録し、起動時にスナップショット + 以降のイベントから復元する
+    def __init__(self, directory, snapshot_every=EVENT_LOG_SNAPSHOT_EVERY):
+        super().__init__()
+        self.event_log = EventLog(directory, self._capture, snapshot_every=snapshot_every)
+        started = time.perf_counter()
+        state, events = self.event_log.load()
+        replayed = self._restore(state or {}, events)
+        self.event_log.start()
+        if state is not None or replayed:
+            print(f"📜 イベントログから復元しました: スナップショット + {replayed} 件 "
+                  f"（{(time.perf_counter() - started) * 1000:.0f}ms）")
+
+    def _restore(self, state, events):
+        # イベントは最終状態の dict に畳み込み、索引と JSON の作成は最後に1回だけ行う
+        staff = dict(state.get('staff_data', {}))
+        records = {kind: dict(state.get(kind, {})) for kind in RECORD_KINDS}
+        replayed = 0
+        for event in events:
+            replayed += 1
+            if event['kind'] == 'staff':
+                staff[event['id']] = event['data']
+            elif 'fields' in event:
+                current = records[event['kind']].get(event['id'])
+                if current is not None:
+                    records[event['kind']][event['id']] = dict(current, **event['fields'])
+            else:
+                records[event['kind']][event['id']] = event['data']
+
+        self.staff_data = staff
+        for kind, loaded in records.items():
+            getattr(self, kind).update(loaded)
+            self._payloads[kind].update((record_id, json_dumps(record)) for record_id, record in loaded.items())
+            self._indexes[kind].add_all(loaded.values())
+        return replayed
+
+    def _capture(self):
+        # 記録は保存のたびに新しい dict に置き換わるので、外側の dict をコピーすれば一貫した状態になる
+        state = {'staff_data': dict(self.staff_data)}
+        for kind in RECORD_KINDS:
+            state[kind] = dict(getattr(self, kind))
+        return state
+
+    def save_staff(self, staff):
+        with self.event_log.lock:
+            super().save_staff(dict(staff))
+            self.event_log.append('staff_saved', 'staff', staff['id'], data=staff)
+
+    def save_absence_report(self, report_id, report):
+        with self.event_log.lock:
+            super().save_absence_report(report_id, report)
+            self.event_log.append('absence_reported', 'absence_reports', report_id,
+                                  data=self.absence_reports[report_id])
+
+    def update_absence_report(self, report_id, fields, if_status=None, if_match=None):
+        with self.event_log.lock:
+            report = super().update_absence_report(report_id, fields, if_status, if_match)
+            if report is not None:
+                event_type = ABSENCE_STATUS_EVENTS.get(fields.get('status'), 'absence_updated')
+                self.event_log.append(event_type, 'absence_reports', report_id, fields=fields)
+            return report
+
+    def save_substitute_request(self, request_id, substitute_request):
+        # substitute_accepted / substitute_declined
+        with self.event_log.lock:
+            super().save_substitute_request(request_id, substitute_request)
+            self.event_log.append(f"substitute_{substitute_request['status']}", 'substitute_requests', request_id,
+                                  data=self.substitute_requests[request_id])
+
+    def flush(self):
+        self.event_log.sync()
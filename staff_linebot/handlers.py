@@ -0,0 +1,191 @@
+# staff_linebot/handlers.py
+
+import time
+import uuid
+from datetime import datetime
+
+from . import state
+from .customer_notify import CustomerNotificationBusy, customer_notifier, find_affected_appointments
+from .intents import analyze_message
+from .messaging import Responder
+from .metrics import classify_seconds, errors_total, intent_total
+from .recruitment import recruitment_scheduler
+from .staff import tenant_staff
+from .templating import process_template
+from .tenants import current_tenant
+
+# LINE Bot A メッセージ処理
+def handle_bot_a_message(event):
+    user_id = event.user_id
+    message_text = event.text
+    
+    print(f"📱 スタッフメッセージ受信: {message_text}")
+    state.staff_directory.refresh()
+    
+    # メッセージ解析
+    started = time.perf_counter()
+    analysis = analyze_message(message_text)
+    classify_seconds.observe(time.perf_counter() - started)
+    intent_total.inc(analysis['type'])
+    # 返信はこのイベントの reply token を優先して使う
+    responder = Responder(user_id, event.reply_token, event.timestamp)
+    
+    if analysis['type'] == 'absence_report':
+        handle_absence_report(user_id, message_text, analysis['data'], responder)
+    elif analysis['type'] == 'substitute_accept':
+        handle_substitute_accept(user_id, message_text, responder)
+    elif analysis['type'] == 'substitute_decline':
+        handle_substitute_decline(user_id, message_text, responder)
+    else:
+        responder.send('申し訳ございません。メッセージを理解できませんでした。', template_key='unknown_message')
+
+# 欠勤報告処理
+def handle_absence_report(user_id, message, absence_data, responder=None):
+    responder = responder or Responder(user_id)
+    try:
+        # スタッフ情報取得
+        staff_info = tenant_staff(user_id)
+        if not staff_info:
+            responder.send('スタッフ情報が見つかりません。管理者にお問い合わせください。', template_key='staff_not_found')
+            return
+        
+        # 欠勤報告記録
+        report_id = str(uuid.uuid4())
+        report = {
+            'staff_id': user_id,
+            'staff_name': staff_info.name,
+            'absence_data': absence_data,
+            'timestamp': datetime.now().isoformat(),
+            'status': 'reported',
+            'tenant': current_tenant.get().id
+        }
+        state.repository.save_absence_report(report_id, report)
+        state.stats.record_absence_report(report)
+        state.live_feed.publish('absence_report', dict(report, id=report_id))
+        
+        # 管理者に通知
+        notify_manager(report_id, staff_info, absence_data)
+        
+        # スタッフに確認メッセージ送信（reply token が有効なうちに、募集の送信より先に返す）
+        variables = {
+            'staff_name': staff_info.name,
+            'absence_date': absence_data['date'],
+            'absence_time': absence_data['time'],
+            'absence_reason': absence_data['reason'],
+            'report_time': datetime.now().strftime('%Y-%m-%d %H:%M')
+        }
+        
+        confirmation_message = process_template('absence_notification', variables)
+        responder.send(confirmation_message, template_key='absence_notification')
+        
+        # 代替スタッフ募集開始
+        start_substitute_recruitment(report_id, staff_info, absence_data)
+        
+        print(f"✅ 欠勤報告処理完了: {staff_info.name}")
+        
+    except Exception as error:
+        errors_total.inc('absence_report')
+        print(f"欠勤報告処理エラー: {error}")
+        responder.send('エラーが発生しました。管理者にお問い合わせください。', template_key='error')
+
+# 代替スタッフ募集開始
+def start_substitute_recruitment(report_id, absent_staff, absence_data):
+    try:
+        recruitment_scheduler.start(report_id, absent_staff, absence_data)
+    except Exception as error:
+        errors_total.inc('recruitment')
+        print(f"代替スタッフ募集エラー: {error}")
+
+# 代替出勤受諾処理
+def handle_substitute_accept(user_id, message, responder=None):
+    responder = responder or Responder(user_id)
+    try:
+        staff_info = tenant_staff(user_id)
+        if not staff_info:
+            return
+        
+        report_id, outcome = recruitment_scheduler.accept(user_id)
+        if outcome == 'no_request':
+            responder.send('現在募集中の代替出勤はありません。', template_key='substitute_no_request')
+            return
+        if outcome == 'already_filled':
+            responder.send(
+                f"【代替出勤】\n\n{staff_info.name}さん、ありがとうございます。\n\nこの欠勤は既に代わりのスタッフが決まりました。",
+                template_key='substitute_already_filled')
+            return
+        
+        # 受諾を記録（どの欠勤報告への受諾かを紐付ける）
+        record_substitute_response(f'{report_id}:{user_id}', {
+            'report_id': report_id,
+            'staff_id': user_id,
+            'staff_name': staff_info.name,
+            'status': 'accepted',
+            'timestamp': datetime.now().isoformat()
+        })
+        
+        # 管理者に通知
+        notify_substitute_accept(staff_info, report_id)
+        
+        # スタッフに確認メッセージ
+        responder.send(
+            f"【代替出勤受諾完了】\n\n{staff_info.name}さん、代替出勤ありがとうございます！\n\n詳細は後ほどご連絡いたします。",
+            template_key='substitute_accept')
+        
+        print(f"✅ 代替出勤受諾: {staff_info.name}")
+        
+    except Exception as error:
+        errors_total.inc('substitute_accept')
+        print(f"代替出勤受諾処理エラー: {error}")
+
+# 代替出勤拒否処理
+def handle_substitute_decline(user_id, message, responder=None):
+    responder = responder or Responder(user_id)
+    try:
+        staff_info = tenant_staff(user_id)
+        if not staff_info:
+            return
+        
+        # 拒否を記録（募集に紐付かない回答はスタッフ単位で記録）
+        report_id = recruitment_scheduler.decline(user_id)
+        record_substitute_response(f'{report_id}:{user_id}' if report_id else user_id, {
+            'report_id': report_id,
+            'staff_id': user_id,
+            'staff_name': staff_info.name,
+            'status': 'declined',
+            'timestamp': datetime.now().isoformat()
+        })
+        
+        responder.send(
+            f"【代替出勤拒否受付】\n\n{staff_info.name}さん、ご回答ありがとうございます。\n\n他のスタッフに依頼いたします。",
+            template_key='substitute_decline')
+        
+        print(f"❌ 代替出勤拒否: {staff_info.name}")
+        
+    except Exception as error:
+        errors_total.inc('substitute_decline')
+        print(f"代替出勤拒否処理エラー: {error}")
+
+# 代替出勤の回答を記録
+def record_substitute_response(request_id, substitute_request):
+    previous = state.repository.get_substitute_request(request_id)
+    state.repository.save_substitute_request(request_id, substitute_request)
+    state.stats.record_substitute_response(previous, substitute_request)
+    state.live_feed.publish('substitute_request', dict(substitute_request, id=request_id))
+
+# 管理者通知
+def notify_manager(report_id, staff_info, absence_data):
+    print(f"📢 管理者通知: {staff_info.name}が欠勤報告")
+
+def notify_substitute_accept(staff_info, report_id):
+    print(f"📢 管理者通知: {staff_info.name}が代替出勤受諾 (欠勤報告 {report_id})")
+    
+    # 代わりが決まったので、影響を受ける予約のお客様へ一括で連絡する
+    report = state.repository.get_absence_report(report_id)
+    if report is None:
+        return
+    appointments = find_affected_appointments(report['staff_id'], report['absence_data']['date'])
+    if appointments:
+        try:
+            customer_notifier.notify(report_id, appointments, staff_info)
+        except CustomerNotificationBusy:
+            print(f"📨 お客様への振替連絡は別の処理が送信中です (欠勤報告 {report_id})")
@@ -0,0 +1,111 @@
+# staff_linebot/intents.py
+
+import json
+import os
+import re
+from datetime import date, datetime
+
+# メッセージ解析
+# キーワード表は起動時にカテゴリごとのタプルへ変換し、判定は C 実装の部分文字列検索で行う
+# （短いメッセージでは1本の正規表現で走査するより速い。scripts/linebot-benchmark.py classify 参照）
+INTENT_KEYWORDS = {
+    'absence': ['欠勤', '休み', '体調不良', '風邪', '熱'],
+    'substitute': ['代わり'],
+    'accept': ['出勤', '行く', '行きます', '行けます', 'します', '大丈夫'],
+    'decline': ['無理', 'できない', 'できません', '行けません', '難しい']
+}
+
+# 欠勤理由（上にあるものを優先）
+ABSENCE_REASONS = [
+    ('風邪', '風邪'),
+    ('熱', '発熱'),
+    ('家族', '家族の事情')
+]
+
+ABSENCE_DATE_PATTERN = re.compile(r'(\d{1,2})月(\d{1,2})日')
+
+class IntentClassifier:
+    CATEGORIES = ('absence', 'substitute', 'accept', 'decline')
+
+    def __init__(self, keywords, reasons):
+        unknown = set(keywords) - set(self.CATEGORIES)
+        if unknown:
+            raise ValueError(f"Unknown intent category: {', '.join(sorted(unknown))}")
+        words = [word for category in self.CATEGORIES for word in keywords.get(category, [])]
+        words += [keyword for keyword, _ in reasons]
+        self.casefold = any(word.lower() != word.upper() for word in words)
+        
+        def normalize(word):
+            return word.lower() if self.casefold else word
+        
+        self.absence = tuple(normalize(word) for word in keywords.get('absence', []))
+        self.substitute = tuple(normalize(word) for word in keywords.get('substitute', []))
+        self.accept = tuple(normalize(word) for word in keywords.get('accept', []))
+        self.decline = tuple(normalize(word) for word in keywords.get('decline', []))
+        self.reasons = tuple((normalize(keyword), reason) for keyword, reason in reasons)
+
+    def classify(self, message):
+        text = message.lower() if self.casefold else message
+        contains = text.__contains__
+        
+        # 欠勤報告の検出
+        if any(map(contains, self.absence)):
+            today = date.today()
+            data = {'reason': '体調不良', 'date': today.isoformat(), 'time': '10:00-18:00'}
+            spans = {'reason': None, 'date': None}
+            
+            for keyword, reason in self.reasons:
+                position = text.find(keyword)
+                if position >= 0:
+                    data['reason'] = reason
+                    spans['reason'] = (position, position + len(keyword))
+                    break
+            
+            date_match = ABSENCE_DATE_PATTERN.search(message)
+            if date_match:
+                data['date'] = f"{today.year}-{int(date_match.group(1)):02d}-{int(date_match.group(2)):02d}"
+                spans['date'] = date_match.span()
+            
+            return {'type': 'absence_report', 'data': data, 'spans': spans}
+        
+        # 代替出勤への回答（「出勤できません」は拒否として扱う）
+        if any(map(contains, self.substitute)):
+            if any(map(contains, self.decline)):
+                return {'type': 'substitute_decline', 'data': None, 'spans': None}
+            if any(map(contains, self.accept)):
+                return {'type': 'substitute_accept', 'data': None, 'spans': None}
+        
+        return {'type': 'unknown', 'data': None, 'spans': None}
+
+    def classify_batch(self, messages):
+        classify = self.classify
+        return [classify(message) for message in messages]
+
+def load_intent_classifier():
+    # INTENT_KEYWORDS_FILE で {"keywords": {...}, "reasons": [[キーワード, 理由], ...]} を指定すると差し替えられる
+    path = os.getenv('INTENT_KEYWORDS_FILE')
+    if not path:
+        return IntentClassifier(INTENT_KEYWORDS, ABSENCE_REASONS)
+    with open(path, encoding='utf-8') as config_file:
+        config = json.load(config_file)
+    return IntentClassifier(config.get('keywords', INTENT_KEYWORDS), config.get('reasons', ABSENCE_REASONS))
+
+intent_classifier = load_intent_classifier()
+
+# 計測は Webhook のイベント処理側で行う（ここは一括解析やベンチマークからも呼ばれる）
+def analyze_message(message):
+    return intent_classifier.classify(message)
+
+def analyze_messages(messages):
+    return intent_classifier.classify_batch(messages)
+
+# 欠勤データ抽出
+def extract_absence_data(message):
+    analysis = intent_classifier.classify(message)
+    if analysis['data'] is not None:
+        return analysis['data']
+    return {
+        'reason': '体調不良',
+        'date': datetime.now().strftime('%Y-%m-%d'),
+        'time': '10:00-18:00'
+    }
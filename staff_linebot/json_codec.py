@@ -0,0 +1,42 @@
+# staff_linebot/json_codec.py
+
+import json
+import os
+
+from flask.json.provider import DefaultJSONProvider
+
+# JSON のエンコード・デコード
+# orjson があれば使い、なければ標準の json を使う（LINEBOT_JSON_BACKEND=stdlib で標準に固定）。
+# どちらも非 ASCII をエスケープせず最小の区切りで出力し、レスポンス本文や記録の payload にそのまま使える str を返す
+if os.getenv('LINEBOT_JSON_BACKEND', 'auto') == 'stdlib':
+    orjson = None
+else:
+    try:
+        import orjson
+    except ImportError:
+        orjson = None
+
+_stdlib_json_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=DefaultJSONProvider.default)
+
+def json_dumps(value):
+    if orjson is not None:
+        # datetime も Flask の既定と同じ形式（HTTP 日付）にそろえる
+        return orjson.dumps(value, default=DefaultJSONProvider.default,
+                            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME).decode()
+    return _stdlib_json_encoder.encode(value)
+
+def json_loads(text):
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+# Flask の jsonify / request.get_json も json_dumps / json_loads を通す（整形出力を指定されたときだけ標準の処理）
+class FastJSONProvider(DefaultJSONProvider):
+    ensure_ascii = False
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        if kwargs.get('indent') is not None:
+            return super().dumps(obj, **kwargs)
+        return json_dumps(obj)
+
+    def loads(self, s, **kwargs):
+        return super().loads(s, **kwargs) if kwargs else json_loads(s)
@@ -0,0 +1,156 @@
+# staff_linebot/line_api.py
+
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from collections import OrderedDict
+
+from .metrics import line_client_evictions_total
+from .tenants import LINE_CHANNELS, current_tenant, tenants
+
+# LINE API 接続プール
+# Bot A / Bot B で1つの keep-alive セッションを共有し、送信ごとの TLS ハンドシェイクを避ける
+LINE_HTTP_POOL_SIZE = int(os.getenv('LINE_HTTP_POOL_SIZE', '32'))
+LINE_HTTP_TIMEOUT = float(os.getenv('LINE_HTTP_TIMEOUT', '10'))
+# 負荷試験ではローカルのモックサーバーを指す（scripts/linebot-benchmark.py）
+LINE_API_ENDPOINT = os.getenv('LINE_API_ENDPOINT', 'https://api.line.me')
+
+# LINE API クライアント
+# linebot / requests の import とクライアントの生成は最初の送信・受信まで遅らせ、起動を速くする
+# （scripts/linebot-import-budget.py で import 時間を確認）
+# (テナント ID, チャネル) ごとのクライアント・署名検証器を最近使った順に保持する件数
+LINE_CLIENT_CACHE_SIZE = int(os.getenv('LINE_CLIENT_CACHE_SIZE', '256'))
+
+_line_clients = OrderedDict()
+_webhook_verifiers = OrderedDict()
+_line_http = {}
+_line_clients_lock = threading.Lock()
+_linebot_import_lock = threading.Lock()
+
+# linebot パッケージは内部で循環 import しているため、複数スレッドが同時に読み込むと
+# 初期化途中のモジュールを掴んで ImportError になる。読み込みは必ずここを通して1度だけ行う
+def load_linebot():
+    linebot = _line_http.get('linebot')
+    if linebot is None:
+        with _linebot_import_lock:
+            linebot = _line_http.get('linebot')
+            if linebot is None:
+                import linebot
+                import linebot.exceptions
+                import linebot.http_client
+                import linebot.models
+                _line_http['linebot'] = linebot
+    return linebot
+
+# tenant を省略すると処理中のテナント（current_tenant）のチャネル
+def line_channel_config(channel, tenant=None):
+    return (tenant or current_tenant.get()).channels.get(channel) or {}
+
+def line_channel_configured(channel, tenant=None):
+    return bool(line_channel_config(channel, tenant).get('access_token'))
+
+def line_http_session():
+    session = _line_http.get('session')
+    if session is None:
+        load_linebot()
+        import requests
+        from requests.adapters import HTTPAdapter
+        with _line_clients_lock:
+            session = _line_http.get('session')
+            if session is None:
+                session = requests.Session()
+                for prefix in ('https://', 'http://'):
+                    session.mount(prefix, HTTPAdapter(pool_connections=4, pool_maxsize=LINE_HTTP_POOL_SIZE,
+                                                      pool_block=True))
+                _line_http['session'] = session
+    return session
+
+def pooled_http_client_class():
+    client_class = _line_http.get('client_class')
+    if client_class is None:
+        http_client = load_linebot().http_client
+        RequestsHttpClient, RequestsHttpResponse = http_client.RequestsHttpClient, http_client.RequestsHttpResponse
+
+        class PooledHttpClient(RequestsHttpClient):
+            def get(self, url, headers=None, params=None, stream=False, timeout=None):
+                response = line_http_session().get(url, headers=headers, params=params, stream=stream,
+                                                   timeout=timeout or self.timeout)
+                return RequestsHttpResponse(response)
+
+            def post(self, url, headers=None, data=None, timeout=None):
+                response = line_http_session().post(url, headers=headers, data=data, timeout=timeout or self.timeout)
+                return RequestsHttpResponse(response)
+
+            def delete(self, url, headers=None, data=None, timeout=None):
+                response = line_http_session().delete(url, headers=headers, data=data, timeout=timeout or self.timeout)
+                return RequestsHttpResponse(response)
+
+            def put(self, url, headers=None, data=None, timeout=None):
+                response = line_http_session().put(url, headers=headers, data=data, timeout=timeout or self.timeout)
+                return RequestsHttpResponse(response)
+
+        client_class = _line_http['client_class'] = PooledHttpClient
+    return client_class
+
+def create_line_client(access_token):
+    return load_linebot().LineBotApi(access_token, endpoint=LINE_API_ENDPOINT, timeout=LINE_HTTP_TIMEOUT,
+                      http_client=pooled_http_client_class())
+
+# LRU キャッシュ: 使ったものを末尾へ移し、LINE_CLIENT_CACHE_SIZE を超えたら最も長く使われていないものを捨てる。
+# 生成（linebot の import を含む）はロックの外で行い、同時に作られた場合は先に入った方を使う
+def cached_line_object(cache, key, create):
+    with _line_clients_lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+            return value
+    value = create()
+    with _line_clients_lock:
+        value = cache.setdefault(key, value)
+        cache.move_to_end(key)
+        while len(cache) > LINE_CLIENT_CACHE_SIZE:
+            cache.popitem(last=False)
+            line_client_evictions_total.inc()
+    return value
+
+# テナント・チャネルごとに生成してキャッシュする。未設定のチャネルは None
+def line_client(channel, tenant=None):
+    tenant = tenant or current_tenant.get()
+    access_token = line_channel_config(channel, tenant).get('access_token')
+    if not access_token:
+        return None
+    return cached_line_object(_line_clients, (tenant.id, channel), lambda: create_line_client(access_token))
+
+# Webhook の署名（X-Line-Signature）検証。受信した本文のバイト列そのものの HMAC-SHA256 を定数時間で比較する。
+# チャネルシークレットを鍵に設定済みの HMAC を持ち、リクエストごとには copy() するだけにする
+class WebhookVerifier:
+    def __init__(self, channel_secret):
+        self._hmac = hmac.new(channel_secret.encode('utf-8'), digestmod=hashlib.sha256)
+
+    def verify(self, body, signature):
+        mac = self._hmac.copy()
+        mac.update(body)
+        # ヘッダーの値は latin-1 で str になっているため、同じ符号化でバイト列に戻して比べる
+        return hmac.compare_digest(base64.b64encode(mac.digest()), signature.encode('latin-1'))
+
+def webhook_verifier(channel, tenant=None):
+    tenant = tenant or current_tenant.get()
+    channel_secret = line_channel_config(channel, tenant).get('channel_secret')
+    if not channel_secret:
+        return None
+    return cached_line_object(_webhook_verifiers, (tenant.id, channel), lambda: WebhookVerifier(channel_secret))
+
+def line_client_cache_stats():
+    return {'cached': len(_line_clients), 'capacity': LINE_CLIENT_CACHE_SIZE,
+            'evictions': line_client_evictions_total.values().get((), 0)}
+
+# 起動直後にバックグラウンドで生成しておき、最初の送信が import を待たないようにする（既定のテナントのみ）
+def warm_line_clients():
+    for channel in LINE_CHANNELS:
+        webhook_verifier(channel, tenants.default)
+        line_client(channel, tenants.default)
+
+def text_message(text):
+    return load_linebot().models.TextSendMessage(text=text)
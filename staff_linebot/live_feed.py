@@ -0,0 +1,92 @@
+# staff_linebot/live_feed.py
+
+import os
+import threading
+import time
+
+from . import state
+from .json_codec import json_dumps
+from .metrics import errors_total, metrics
+
+# ダッシュボードへのライブ配信（Server-Sent Events: /api/line-bot/events）
+# 欠勤報告・回答を記録するたびに変更履歴へ「記録そのもの + 最新の集計」を追記し、接続中のダッシュボードへ流す。
+# 履歴はリポジトリに置くため、SQLite なら他のワーカーで記録された変更も LIVE_FEED_POLL_INTERVAL 以内に届く。
+# 再接続時は Last-Event-ID 以降の差分から再開し、履歴の保持範囲外なら reset で全件の読み直しを指示する
+LIVE_FEED_POLL_INTERVAL = float(os.getenv('LIVE_FEED_POLL_INTERVAL', '1.0'))
+LIVE_FEED_HEARTBEAT = 15
+# 1接続がワーカーのスレッドを1本占有するため、接続数と接続時間に上限を設ける（時間切れ後はブラウザが自動で再接続）
+LIVE_FEED_MAX_STREAMS = int(os.getenv('LIVE_FEED_MAX_STREAMS', '4'))
+LIVE_FEED_STREAM_SECONDS = int(os.getenv('LIVE_FEED_STREAM_SECONDS', '300'))
+LIVE_FEED_BATCH_SIZE = 100
+
+def format_sse(event, data, event_id=None):
+    prefix = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{prefix}event: {event}\ndata: {data}\n\n'
+
+class LiveFeed:
+    def __init__(self, changes, max_streams=LIVE_FEED_MAX_STREAMS):
+        self.changes = changes
+        self.max_streams = max_streams
+        self.streams = 0
+        self._published = 0
+        self._condition = threading.Condition()
+
+    def publish(self, kind, record):
+        # 配信の失敗で記録処理を止めない
+        try:
+            self.changes.append(kind, json_dumps({'record': record, 'summary': state.stats.summary()}))
+        except Exception as error:
+            errors_total.inc('live_feed')
+            print(f"ライブ配信エラー: {error}")
+            return
+        with self._condition:
+            self._published += 1
+            self._condition.notify_all()
+
+    def open(self):
+        with self._condition:
+            if self.streams >= self.max_streams:
+                return False
+            self.streams += 1
+            return True
+
+    def close(self):
+        with self._condition:
+            self.streams -= 1
+
+    def stream(self, last_event_id=None):
+        yield 'retry: 3000\n\n'
+        oldest, latest = self.changes.bounds()
+        first_retained = oldest if oldest is not None else latest + 1
+        if last_event_id is None:
+            cursor = latest
+            yield format_sse('hello', json_dumps({'summary': state.stats.summary()}), cursor)
+        elif last_event_id > latest or last_event_id + 1 < first_retained:
+            # 保持範囲より前、または再起動前の ID: 差分では追いつけない
+            cursor = latest
+            yield format_sse('reset', json_dumps({'summary': state.stats.summary()}), cursor)
+        else:
+            cursor = last_event_id
+        
+        deadline = time.monotonic() + LIVE_FEED_STREAM_SECONDS
+        last_sent = time.monotonic()
+        while time.monotonic() < deadline:
+            with self._condition:
+                published = self._published
+            changes = self.changes.since(cursor, LIVE_FEED_BATCH_SIZE)
+            for change_id, kind, payload in changes:
+                yield format_sse(kind, payload, change_id)
+                cursor = change_id
+            if len(changes) == LIVE_FEED_BATCH_SIZE:
+                continue
+            if changes:
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= LIVE_FEED_HEARTBEAT:
+                # 切断の検出とプロキシのタイムアウト防止
+                yield ': keepalive\n\n'
+                last_sent = time.monotonic()
+            # 同じプロセスでの記録は即座に、他のワーカーの記録はポーリング間隔で拾う
+            with self._condition:
+                self._condition.wait_for(lambda: self._published != published, LIVE_FEED_POLL_INTERVAL)
+
+metrics.gauge('linebot_live_streams', 'ライブ配信の接続数', lambda: {(): state.live_feed.streams})
@@ -0,0 +1,191 @@
+# staff_linebot/messaging.py
+
+import os
+import threading
+import time
+from concurrent.futures import Future, as_completed
+
+from .line_api import line_channel_configured, load_linebot, text_message
+from .metrics import errors_total, push_quota_saved_total, responses_total
+from .outbound import OutboundQueueFull, line_sender
+
+# 一斉送信（multicast）
+# LINE の multicast は1リクエスト最大500名。バッチを送信レイヤーで並列送信する。
+# 宛先不正（400）で弾かれたバッチは半分ずつに分けて、1名になるまで切り分ける（500名でも最大9段）。
+# 429 / 5xx の再送は送信レイヤーがバックオフ付きで済ませているので、ここでは繰り返さない
+MULTICAST_BATCH_SIZE = 500
+
+def is_bad_recipient_error(error):
+    # 無効なユーザーIDが1件でも混ざると、LINE はバッチ全体を 400 で返す
+    return isinstance(error, load_linebot().exceptions.LineBotApiError) and error.status_code == 400
+
+def multicast_bot_a_message(user_ids, message, template_key='text', priority='emergency'):
+    recipients = {user_id: {'status': 'pending', 'attempts': 0, 'error': None} for user_id in user_ids}
+    batches = [user_ids[i:i + MULTICAST_BATCH_SIZE] for i in range(0, len(user_ids), MULTICAST_BATCH_SIZE)]
+    result = {'sent': 0, 'failed': 0, 'skipped': 0, 'batches': len(batches), 'recipients': recipients}
+    
+    if not line_channel_configured('bot_a'):
+        print(f"LINE Bot A not configured. Multicast to {len(user_ids)} users: {message}")
+        for recipient in recipients.values():
+            recipient['status'] = 'skipped'
+        result['skipped'] = len(user_ids)
+        return result
+    
+    pending = batches
+    while pending:
+        futures = {line_sender.submit('bot_a', 'multicast', batch, text_message(message),
+                                      template_key=template_key, priority=priority): batch
+                   for batch in pending}
+        pending = []
+        for future in as_completed(futures):
+            batch = futures[future]
+            error = future.exception()
+            description = None
+            if error is not None:
+                errors_total.inc('multicast')
+                description = describe_line_error(error)
+                print(f"LINE Bot A 一斉送信エラー ({len(batch)}名): {description}")
+            for user_id in batch:
+                recipients[user_id]['attempts'] += 1
+                recipients[user_id]['status'] = 'sent' if error is None else 'failed'
+                recipients[user_id]['error'] = description
+            if error is not None and len(batch) > 1 and is_bad_recipient_error(error):
+                # 半分に分割して再送し、無効なIDを含むバッチを切り分ける
+                middle = len(batch) // 2
+                pending.extend([batch[:middle], batch[middle:]])
+        result['batches'] += len(pending)
+    
+    result['sent'] = sum(1 for recipient in recipients.values() if recipient['status'] == 'sent')
+    result['failed'] = sum(1 for recipient in recipients.values() if recipient['status'] == 'failed')
+    return result
+
+def describe_line_error(error):
+    if isinstance(error, load_linebot().exceptions.LineBotApiError):
+        return f"{error.status_code}: {error.error.message}"
+    return str(error)
+
+# LINE Bot A メッセージ送信
+# 送信キューに積んで Future を返す（再送は送信レイヤーが行う）。最終的に失敗したらログに残す
+def send_bot_a_message(user_id, message, template_key='text', priority='confirmation'):
+    if not line_channel_configured('bot_a'):
+        print(f"LINE Bot A not configured. Message: {message}")
+        return None
+    
+    return submit_line_message('bot_a', 'push_message', user_id, message, template_key, priority,
+                               'LINE Bot A メッセージ送信エラー')
+
+def send_bot_a_reply(reply_token, message, template_key='text', priority='confirmation'):
+    if not line_channel_configured('bot_a'):
+        print(f"LINE Bot A not configured. Reply: {message}")
+        return None
+    
+    return submit_line_message('bot_a', 'reply_message', reply_token, message, template_key, priority,
+                               'LINE Bot A リプライ送信エラー')
+
+def submit_line_message(channel, method, to, message, template_key, priority, error_label):
+    try:
+        future = line_sender.submit(channel, method, to, text_message(message),
+                                    template_key=template_key, priority=priority)
+    except OutboundQueueFull as error:
+        errors_total.inc('send_rejected')
+        print(f"{error_label}: {error}")
+        return None
+    
+    def log_failure(future):
+        error = future.exception()
+        if error is not None:
+            errors_total.inc('send')
+            print(f"{error_label}: {describe_line_error(error)}")
+    
+    future.add_done_callback(log_failure)
+    return future
+
+# スタッフへの返信の振り分け
+# reply token は無料で送れる（push の通数を消費しない）が、1回限りで受信から約1分で失効する。
+# 1通目は reply で送り、token がない・使用済み・期限切れなら push で送る。reply が token の無効で断られたときも push に切り替える
+LINE_REPLY_TOKEN_TTL = float(os.getenv('LINE_REPLY_TOKEN_TTL', '50'))
+
+def is_invalid_reply_token_error(error):
+    # token の失効・使用済みは 400 "Invalid reply token"。本文の不正など、他の 400 は push でも同じく断られる
+    if not (isinstance(error, load_linebot().exceptions.LineBotApiError) and error.status_code == 400):
+        return False
+    return 'reply token' in (getattr(error.error, 'message', None) or '').lower()
+
+def chain_future(source, target):
+    if source is None:
+        target.set_exception(RuntimeError('送信できませんでした'))
+        return
+    source.add_done_callback(lambda done: target.set_exception(done.exception()) if done.exception() is not None
+                             else target.set_result(done.result()))
+
+class Responder:
+    def __init__(self, user_id, reply_token=None, received_at=None):
+        # received_at は Webhook イベントの timestamp（ミリ秒）。省略時は今
+        self.user_id = user_id
+        self._reply_token = reply_token
+        self._expires_at = (received_at / 1000 if received_at else time.time()) + LINE_REPLY_TOKEN_TTL
+        self._used = False
+        self._lock = threading.Lock()
+
+    def _take_reply_token(self):
+        # (reply token, push にする理由)。token は1度渡したら使用済みにする
+        if self._reply_token is None:
+            return None, 'no_token'
+        with self._lock:
+            if self._used:
+                return None, 'used'
+            self._used = True
+        if time.time() > self._expires_at:
+            return None, 'expired'
+        return self._reply_token, None
+
+    def send(self, message, template_key='text', priority='confirmation'):
+        if not line_channel_configured('bot_a'):
+            print(f"LINE Bot A not configured. Message: {message}")
+            return None
+        
+        reply_token, reason = self._take_reply_token()
+        if reply_token is None:
+            responses_total.inc('push', reason)
+            return send_bot_a_message(self.user_id, message, template_key=template_key, priority=priority)
+        
+        try:
+            reply = line_sender.submit('bot_a', 'reply_message', reply_token, text_message(message),
+                                       template_key=template_key, priority=priority)
+        except OutboundQueueFull as error:
+            errors_total.inc('send_rejected')
+            print(f"LINE Bot A リプライ送信エラー: {error}")
+            return None
+        
+        result = Future()
+        def on_reply(reply):
+            error = reply.exception()
+            if error is None:
+                responses_total.inc('reply', 'reply_token')
+                push_quota_saved_total.inc()
+                result.set_result(reply.result())
+            elif is_invalid_reply_token_error(error):
+                # token の失効・使用済み（再送された Webhook など）。同じ内容を push で送り直す
+                responses_total.inc('push', 'reply_rejected')
+                chain_future(send_bot_a_message(self.user_id, message, template_key=template_key, priority=priority),
+                             result)
+            else:
+                errors_total.inc('send')
+                print(f"LINE Bot A リプライ送信エラー: {describe_line_error(error)}")
+                result.set_exception(error)
+        reply.add_done_callback(on_reply)
+        return result
+
+    @staticmethod
+    def stats():
+        routes = responses_total.values()
+        by_reason = {}
+        for (route, reason), count in routes.items():
+            if route == 'push':
+                by_reason[reason] = count
+        return {
+            'reply': sum(count for (route, _), count in routes.items() if route == 'reply'),
+            'push': sum(by_reason.values()),
+            'push_by_reason': by_reason,
+            'push_quota_saved': push_quota_saved_total.values().get((), 0)
+        }
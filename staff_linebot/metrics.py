@@ -0,0 +1,150 @@
+# staff_linebot/metrics.py
+
+import threading
+from bisect import bisect_left
+
+# 計測（/metrics で Prometheus のテキスト形式として公開）
+# 記録は dict の更新とバケット位置の二分探索だけにとどめ、文字列化は取得時にまとめて行う
+METRICS_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def format_metric_labels(labelnames, labels):
+    if not labelnames:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labelnames, escaped)) + '}'
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f'{self.name}{format_metric_labels(self.labelnames, labels)} {value}'
+
+class HistogramSeries:
+    __slots__ = ('buckets', 'counts', 'total', '_lock')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[position] += 1
+            self.total += value
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.total
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=METRICS_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(labels, HistogramSeries(self.buckets))
+        return series
+
+    def observe(self, value, *labels):
+        series = self._series.get(labels) or self.labels(*labels)
+        series.observe(value)
+
+    def samples(self):
+        with self._lock:
+            series = sorted(self._series.items())
+        labelnames = self.labelnames + ('le',)
+        for labels, child in series:
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                yield f'{self.name}_bucket{format_metric_labels(labelnames, labels + (bound,))} {cumulative}'
+            yield f'{self.name}_sum{format_metric_labels(self.labelnames, labels)} {total}'
+            yield f'{self.name}_count{format_metric_labels(self.labelnames, labels)} {cumulative}'
+
+class Gauge:
+    kind = 'gauge'
+
+    # 値は取得時に collect() から読む（キューの長さなど、既に別の場所で保持している値向け）
+    def __init__(self, name, documentation, collect, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.collect = collect
+
+    def samples(self):
+        for labels, value in sorted(self.collect().items()):
+            yield f'{self.name}{format_metric_labels(self.labelnames, labels)} {value}'
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=METRICS_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, collect, labelnames=()):
+        return self.register(Gauge(name, documentation, collect, labelnames))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+metrics = MetricsRegistry()
+webhook_seconds = metrics.histogram('linebot_webhook_seconds', 'Webhook の受信処理時間（署名検証からキュー投入まで）', ('bot',))
+event_seconds = metrics.histogram('linebot_event_handle_seconds', 'Webhook イベント1件の処理時間', ('queue',))
+classify_seconds = metrics.histogram('linebot_intent_classify_seconds', 'メッセージ解析の時間')
+intent_total = metrics.counter('linebot_intents_total', '解析結果の種類ごとの件数', ('type',))
+template_seconds = metrics.histogram('linebot_template_render_seconds', 'テンプレート一括描画の時間（1件ずつの描画は計測しない）',
+                                     ('template',))
+line_api_seconds = metrics.histogram('linebot_line_api_seconds', 'LINE API 呼び出しの時間', ('channel', 'method'))
+line_api_errors_total = metrics.counter('linebot_line_api_errors_total', 'LINE API 呼び出しのエラー件数',
+                                        ('channel', 'method', 'status'))
+errors_total = metrics.counter('linebot_errors_total', '処理段階ごとのエラー件数', ('stage',))
+responses_total = metrics.counter('linebot_responses_total', 'スタッフへの返信の送信経路（reply / push）と理由',
+                                  ('route', 'reason'))
+push_quota_saved_total = metrics.counter('linebot_push_quota_saved_total', 'reply で送れたため消費しなかった push の通数')
+line_client_evictions_total = metrics.counter('linebot_line_client_evictions_total',
+                                              'キャッシュの上限を超えて破棄した LINE クライアント・署名検証器の数')
+webhook_events_total = metrics.counter('linebot_webhook_events_total',
+                                       'Webhook で受け取ったイベント数（message は message.type まで区別）', ('type',))
@@ -0,0 +1,311 @@
+# staff_linebot/outbound.py
+
+import heapq
+import itertools
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future
+
+from .line_api import line_client, load_linebot
+from .metrics import line_api_errors_total, line_api_seconds, metrics
+from .profiler import profiler
+from .tenants import current_tenant
+
+# LINE 送信レイヤー
+# 送信はチャネルごとの優先度付きキューに積み、チャネルの同時実行数ぶんのワーカーが優先度の高いものから送る。Future を返す。
+# 優先度: emergency（代替募集などスタッフへの緊急連絡） > customer（お客様への連絡） > confirmation（受付確認など）
+LINE_CHANNEL_CONCURRENCY = {
+    'bot_a': int(os.getenv('LINE_BOT_A_CONCURRENCY', '16')),
+    'bot_b': int(os.getenv('LINE_BOT_B_CONCURRENCY', '16'))
+}
+# チャネルごとの送信レート（リクエスト/秒）。トークンバケットで平準化する
+LINE_CHANNEL_RATE = {
+    'bot_a': float(os.getenv('LINE_BOT_A_RATE', '100')),
+    'bot_b': float(os.getenv('LINE_BOT_B_RATE', '100'))
+}
+OUTBOUND_PRIORITIES = ('emergency', 'customer', 'confirmation')
+OUTBOUND_QUEUE_SIZE = int(os.getenv('OUTBOUND_QUEUE_SIZE', '5000'))
+OUTBOUND_MAX_RETRIES = int(os.getenv('OUTBOUND_MAX_RETRIES', '5'))
+OUTBOUND_RETRY_BASE = float(os.getenv('OUTBOUND_RETRY_BASE', '0.5'))
+OUTBOUND_RETRY_CAP = float(os.getenv('OUTBOUND_RETRY_CAP', '30'))
+# retry_key を付けられる API（再送しても LINE 側で二重配信されない）
+RETRY_KEY_METHODS = ('push_message', 'multicast')
+
+class OutboundQueueFull(RuntimeError):
+    pass
+
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        # 429 を受けたらバケツを空にして、チャネル全体の送信を止める
+        with self._lock:
+            self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+def is_retryable_line_error(error):
+    if isinstance(error, load_linebot().exceptions.LineBotApiError):
+        return error.status_code == 429 or error.status_code >= 500
+    import requests
+    return isinstance(error, requests.exceptions.RequestException)
+
+def retry_after_seconds(error):
+    headers = getattr(error, 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After') or headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+class OutboundSender:
+    def __init__(self, concurrency, rates, maxsize=OUTBOUND_QUEUE_SIZE, max_retries=OUTBOUND_MAX_RETRIES):
+        self.concurrency = dict(concurrency)
+        self.maxsize = maxsize
+        self.max_retries = max_retries
+        self._queues = {channel: queue.PriorityQueue() for channel in self.concurrency}
+        self._delayed = []
+        self._delayed_ready = threading.Condition()
+        self._sequence = itertools.count()
+        self._rates = dict(rates)
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._depth = {priority: 0 for priority in OUTBOUND_PRIORITIES}
+        self._metrics = {}
+        self._priority_metrics = {priority: {
+            'submitted': 0, 'sent': 0, 'failed': 0, 'retried': 0, 'rejected': 0,
+            'wait_recent': deque(maxlen=1000), 'latency_recent': deque(maxlen=1000)
+        } for priority in OUTBOUND_PRIORITIES}
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for channel, workers in self.concurrency.items():
+                for index in range(workers):
+                    thread = threading.Thread(target=self._run, args=(channel,), name=f'line-send-{channel}-{index}',
+                                              daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+            thread = threading.Thread(target=self._run_delayed, name='line-send-retry', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    # 生産者向けのバックプレッシャー: この優先度の送信を今受け付けられるか
+    def accepts(self, priority):
+        with self._lock:
+            return self._accepts(priority)
+
+    def _accepts(self, priority):
+        # 緊急連絡は常に受け付け、それ以外は段階的に絞る（確認メッセージから先に断る）
+        depth = sum(self._depth.values())
+        if priority == 'emergency':
+            return True
+        if priority == 'customer':
+            return depth < self.maxsize
+        return depth < self.maxsize * 0.8
+
+    def queued(self):
+        with self._lock:
+            return dict(self._depth)
+
+    def pressure(self):
+        with self._lock:
+            return sum(self._depth.values()) / self.maxsize
+
+    def submit(self, channel, method, *args, template_key='text', priority='confirmation', **kwargs):
+        if priority not in OUTBOUND_PRIORITIES:
+            raise ValueError(f'Unknown priority: {priority}')
+        if channel not in self._queues:
+            raise ValueError(f'Unknown channel: {channel}')
+        self.start()
+        if method in RETRY_KEY_METHODS:
+            kwargs.setdefault('retry_key', str(uuid.uuid4()))
+        job = {
+            'channel': channel, 'tenant': current_tenant.get(), 'method': method, 'args': args, 'kwargs': kwargs,
+            'template_key': template_key, 'priority': priority, 'attempts': 0,
+            'enqueued': time.monotonic(), 'future': Future()
+        }
+        with self._lock:
+            metric = self._priority_metrics[priority]
+            if not self._accepts(priority):
+                metric['rejected'] += 1
+                raise OutboundQueueFull(f'Outbound queue full ({priority})')
+            metric['submitted'] += 1
+            self._depth[priority] += 1
+        self._enqueue(job)
+        return job['future']
+
+    def send(self, channel, method, *args, template_key='text', priority='confirmation', **kwargs):
+        return self.submit(channel, method, *args, template_key=template_key, priority=priority, **kwargs).result()
+
+    def _enqueue(self, job):
+        job['queued'] = time.monotonic()
+        self._queues[job['channel']].put((OUTBOUND_PRIORITIES.index(job['priority']), next(self._sequence), job))
+
+    def _run(self, channel):
+        jobs = self._queues[channel]
+        while True:
+            _, _, job = jobs.get()
+            profiled = profiler.active and profiler.begin(f'line-send:{channel}')
+            try:
+                self._process(job)
+            except Exception as error:
+                # クライアント生成やバケツで落ちても、ワーカーを止めずに Future を失敗で返す
+                print(f"LINE 送信ワーカーエラー ({channel}): {error}")
+                if not job['future'].done():
+                    self._finish(job, error=error)
+            finally:
+                if profiled:
+                    profiler.end()
+                jobs.task_done()
+
+    def _bucket(self, job):
+        # 送信レートの上限は LINE のチャネル単位なので、テナントごとに別のバケツを使う
+        key = (job['tenant'].id, job['channel'])
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.setdefault(key, TokenBucket(self._rates[job['channel']]))
+        return bucket
+
+    def _process(self, job):
+        channel = job['channel']
+        client = line_client(channel, job['tenant'])
+        if client is None:
+            self._finish(job, error=RuntimeError(f'LINE channel {channel} not configured'))
+            return
+        
+        self._bucket(job).acquire()
+        started = time.monotonic()
+        job['attempts'] += 1
+        try:
+            result = getattr(client, job['method'])(*job['args'], **job['kwargs'])
+        except Exception as error:
+            LineBotApiError = load_linebot().exceptions.LineBotApiError
+            self._record(channel, job['template_key'], time.monotonic() - started, True)
+            line_api_seconds.observe(time.monotonic() - started, channel, job['method'])
+            line_api_errors_total.inc(channel, job['method'], getattr(error, 'status_code', type(error).__name__))
+            # retry_key 付きで既に受理済みなら成功として扱う
+            if isinstance(error, LineBotApiError) and error.status_code == 409 and error.accepted_request_id:
+                self._finish(job, result=None)
+            elif is_retryable_line_error(error) and job['attempts'] <= self.max_retries:
+                self._retry(job, error)
+            else:
+                self._finish(job, error=error)
+            return
+        self._record(channel, job['template_key'], time.monotonic() - started, False)
+        line_api_seconds.observe(time.monotonic() - started, channel, job['method'])
+        self._finish(job, result=result)
+
+    def _retry(self, job, error):
+        # 指数バックオフ＋フルジッター。Retry-After があればそれ以上待つ
+        delay = random.uniform(0, min(OUTBOUND_RETRY_CAP, OUTBOUND_RETRY_BASE * (2 ** (job['attempts'] - 1))))
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if getattr(error, 'status_code', None) == 429:
+            self._bucket(job).pause(retry_after or OUTBOUND_RETRY_BASE)
+        with self._lock:
+            self._priority_metrics[job['priority']]['retried'] += 1
+        with self._delayed_ready:
+            heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._sequence), job))
+            self._delayed_ready.notify()
+
+    def _run_delayed(self):
+        while True:
+            with self._delayed_ready:
+                while not self._delayed or self._delayed[0][0] > time.monotonic():
+                    timeout = self._delayed[0][0] - time.monotonic() if self._delayed else None
+                    self._delayed_ready.wait(timeout)
+                _, _, job = heapq.heappop(self._delayed)
+            self._enqueue(job)
+
+    def _finish(self, job, result=None, error=None):
+        now = time.monotonic()
+        with self._lock:
+            self._depth[job['priority']] -= 1
+            metric = self._priority_metrics[job['priority']]
+            metric['failed' if error is not None else 'sent'] += 1
+            metric['wait_recent'].append(now - job['queued'])
+            metric['latency_recent'].append(now - job['enqueued'])
+        if error is not None:
+            job['future'].set_exception(error)
+        else:
+            job['future'].set_result(result)
+
+    def _record(self, channel, template_key, elapsed, failed):
+        with self._lock:
+            metric = self._metrics.get((channel, template_key))
+            if metric is None:
+                metric = self._metrics[(channel, template_key)] = {
+                    'calls': 0, 'errors': 0, 'total_seconds': 0.0, 'max_seconds': 0.0, 'recent': deque(maxlen=500)
+                }
+            metric['calls'] += 1
+            metric['errors'] += failed
+            metric['total_seconds'] += elapsed
+            metric['max_seconds'] = max(metric['max_seconds'], elapsed)
+            metric['recent'].append(elapsed)
+
+    def stats(self):
+        with self._lock:
+            calls = {}
+            for (channel, template_key), metric in sorted(self._metrics.items()):
+                recent = sorted(metric['recent'])
+                calls.setdefault(channel, {})[template_key] = {
+                    'calls': metric['calls'],
+                    'errors': metric['errors'],
+                    'error_rate': round(metric['errors'] / metric['calls'], 4),
+                    'latency_ms_avg': round(metric['total_seconds'] / metric['calls'] * 1000, 2),
+                    'latency_ms_p95': round(recent[int(len(recent) * 0.95)] * 1000, 2),
+                    'latency_ms_max': round(metric['max_seconds'] * 1000, 2)
+                }
+            
+            # 優先度ごとのキュー待ち時間と、投入から完了までの時間（再送待ちを含む）
+            priorities = {}
+            for priority, metric in self._priority_metrics.items():
+                entry = {key: metric[key] for key in ('submitted', 'sent', 'failed', 'retried', 'rejected')}
+                entry['queued'] = self._depth[priority]
+                for label, samples in (('wait', metric['wait_recent']), ('latency', metric['latency_recent'])):
+                    samples = sorted(samples)
+                    for percentile in (50, 95, 99):
+                        value = samples[min(len(samples) - 1, int(len(samples) * percentile / 100))] if samples else 0.0
+                        entry[f'{label}_ms_p{percentile}'] = round(value * 1000, 2)
+                priorities[priority] = entry
+            
+            depth = sum(self._depth.values())
+            return {
+                'queue': {
+                    'depth': depth,
+                    'maxsize': self.maxsize,
+                    'pressure': round(depth / self.maxsize, 4),
+                    'accepting': {priority: self._accepts(priority) for priority in OUTBOUND_PRIORITIES}
+                },
+                'priorities': priorities,
+                'calls': calls
+            }
+
+line_sender = OutboundSender(LINE_CHANNEL_CONCURRENCY, LINE_CHANNEL_RATE)
+metrics.gauge('linebot_outbound_queue_depth', '送信待ちのメッセージ数',
+              lambda: {(priority,): depth for priority, depth in line_sender.queued().items()},
+              ('priority',))
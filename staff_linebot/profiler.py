@@ -0,0 +1,133 @@
+# staff_linebot/profiler.py
+
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+
+# サンプリングプロファイラ（管理者用 API /api/line-bot/admin/profiler から開始・停止）
+# 計測対象に選ばれた処理（HTTP リクエストはエンドポイント、キューのイベント、LINE 送信）を実行中のスレッドだけを、
+# 別スレッドから PROFILER_INTERVAL 秒ごとに sys._current_frames() で覗き、処理の種類ごとにスタックを数える。
+# 止めている間、計測点でかかるのは profiler.active の参照1回だけ
+PROFILER_INTERVAL = float(os.getenv('PROFILER_INTERVAL', '0.005'))
+PROFILER_MAX_DEPTH = 64
+# 処理の種類ごとに保持するスタックの種類数。超えた分は [truncated] にまとめる
+PROFILER_MAX_STACKS = 5000
+
+class SamplingProfiler:
+    def __init__(self, interval=PROFILER_INTERVAL):
+        self.interval = interval
+        self.active = False
+        self.rate = 0.0
+        self.until = None
+        self.started_at = None
+        self._targets = {}
+        self._stacks = {}
+        self._units = {}
+        self._frame_names = {}
+        self._lock = threading.Lock()
+        # start のたびに進める。サンプリングのスレッドは自分の世代が最新の間だけ動く
+        self._generation = 0
+
+    def start(self, rate=1.0, duration=None):
+        # rate: 計測する処理の割合。duration（秒）を指定するとその時間で自動的に止まる
+        with self._lock:
+            self.rate = rate
+            self.until = time.monotonic() + duration if duration else None
+            self.started_at = datetime.now().isoformat()
+            self._targets = {}
+            self.active = True
+            self._generation += 1
+            # 止めた直後の開始でも、前のスレッドの終了を待たずに新しいスレッドで計測する（前のものは次の周期で抜ける）
+            threading.Thread(target=self._run, args=(self._generation,), name='profiler', daemon=True).start()
+
+    def stop(self):
+        with self._lock:
+            self.active = False
+            self._generation += 1
+
+    def reset(self):
+        with self._lock:
+            self._stacks = {}
+            self._units = {}
+
+    def begin(self, label):
+        # 処理の開始時に呼ぶ（呼び出し側で active を確認してから）。計測対象に選んだら True
+        if random.random() >= self.rate:
+            return False
+        self._targets[threading.get_ident()] = label
+        with self._lock:
+            self._units[label] = self._units.get(label, 0) + 1
+        return True
+
+    def end(self):
+        self._targets.pop(threading.get_ident(), None)
+
+    def _run(self, generation):
+        while True:
+            time.sleep(self.interval)
+            if self._generation != generation:
+                return
+            if self.until is not None and time.monotonic() > self.until:
+                with self._lock:
+                    if self._generation == generation:
+                        self.active = False
+                return
+            targets = dict(self._targets)
+            if not targets:
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                if self._generation != generation:
+                    return
+                for ident, label in targets.items():
+                    frame = frames.get(ident)
+                    if frame is None:
+                        continue
+                    stack = self._collapse(frame)
+                    counts = self._stacks.setdefault(label, {})
+                    if stack not in counts and len(counts) >= PROFILER_MAX_STACKS:
+                        stack = '[truncated]'
+                    counts[stack] = counts.get(stack, 0) + 1
+
+    def _collapse(self, frame):
+        # 根元から末端へ ; でつないだ1行（collapsed stack 形式）
+        names = []
+        while frame is not None and len(names) < PROFILER_MAX_DEPTH:
+            code = frame.f_code
+            name = self._frame_names.get(code)
+            if name is None:
+                name = self._frame_names[code] = (f'{code.co_name} ({os.path.basename(code.co_filename)}:'
+                                                  f'{code.co_firstlineno})').replace(';', ':')
+            names.append(name)
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def collapsed(self, label=None):
+        # flamegraph.pl / speedscope にそのまま渡せる「スタック 回数」の行。label を省略すると処理の種類を根元に付ける
+        with self._lock:
+            lines = []
+            for stack_label, counts in sorted(self._stacks.items()):
+                if label is not None and stack_label != label:
+                    continue
+                prefix = '' if label is not None else stack_label.replace(';', ':') + ';'
+                lines.extend(f'{prefix}{stack} {count}' for stack, count in
+                             sorted(counts.items(), key=lambda item: -item[1]))
+            return '\n'.join(lines) + '\n' if lines else ''
+
+    def status(self):
+        with self._lock:
+            return {
+                'active': self.active,
+                'rate': self.rate,
+                'remaining_seconds': round(max(0.0, self.until - time.monotonic()), 1)
+                                     if self.active and self.until is not None else None,
+                'interval_seconds': self.interval,
+                'started_at': self.started_at,
+                'profiled': dict(self._units),
+                'samples': {label: sum(counts.values()) for label, counts in self._stacks.items()}
+            }
+
+profiler = SamplingProfiler()
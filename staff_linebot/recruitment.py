@@ -0,0 +1,335 @@
+# staff_linebot/recruitment.py
+
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from . import state
+from .messaging import multicast_bot_a_message
+from .staff import StaffRecord
+from .storage import LIST_MAX_PAGE_SIZE, LIST_PAGE_SIZE
+from .templating import process_template
+from .tenants import tenants, use_tenant
+from .timers import timer_wheel
+
+# 代替スタッフ募集スケジューラ
+# 候補者を役職の一致・最近の代替出勤回数・過去の回答履歴で順位付けし、上位から N 名ずつ送る。
+# 締め切りまでに受諾がなければ次の N 名へ。受諾が report_id に紐付いた時点で募集を止める。
+# 募集を進めるのは欠勤報告の recruitment_claim を持つワーカーだけ。再起動などで締め切りを過ぎても
+# 次の波へ進まない募集は、RECRUIT_RESUME_GRACE 秒待ってから別のワーカー（起動時の resume）が引き継ぐ
+RECRUIT_WAVE_SIZE = int(os.getenv('RECRUIT_WAVE_SIZE', '5'))
+RECRUIT_WAVE_TIMEOUT = float(os.getenv('RECRUIT_WAVE_TIMEOUT', '600'))
+RECRUIT_LOAD_WINDOW_DAYS = int(os.getenv('RECRUIT_LOAD_WINDOW_DAYS', '30'))
+RECRUIT_RESUME_GRACE = float(os.getenv('RECRUIT_RESUME_GRACE', '60'))
+
+# 順位付けの重み
+RECRUIT_SCORE_POSITION = 3.0
+RECRUIT_SCORE_ACCEPT_RATE = 2.0
+RECRUIT_SCORE_RECENT_LOAD = 1.0
+RECRUIT_SCORE_NO_RESPONSE = 0.5
+
+# 代替出勤依頼メッセージ作成（全員共通のため1回だけ作成）
+def render_substitute_request(absent_staff, absence_data):
+    variables = {
+        'absent_staff_name': absent_staff.name,
+        'absence_date': absence_data['date'],
+        'absence_time': absence_data['time'],
+        'absence_reason': absence_data['reason']
+    }
+    
+    return process_template('substitute_request', variables)
+
+class RecruitmentScheduler:
+    def __init__(self, wave_size=RECRUIT_WAVE_SIZE, wave_timeout=RECRUIT_WAVE_TIMEOUT):
+        self.wave_size = wave_size
+        self.wave_timeout = wave_timeout
+        self._lock = threading.RLock()
+        self._campaigns = {}
+        self._asked_by_user = {}
+        self._recent_accepts = {}
+        self._no_response = {}
+
+    def load_history(self, repository):
+        # 最近の代替出勤（負荷）を保存済みの回答から復元する
+        since = (datetime.now() - timedelta(days=RECRUIT_LOAD_WINDOW_DAYS)).isoformat()
+        with self._lock:
+            self._recent_accepts = {}
+            for substitute_request in repository.query_records('substitute_requests', limit=LIST_MAX_PAGE_SIZE,
+                                                               status='accepted', date_from=since[:10]):
+                self._recent_accepts.setdefault(substitute_request['staff_id'], []).append(substitute_request['timestamp'])
+
+    def score(self, candidate, same_position, history):
+        since = (datetime.now() - timedelta(days=RECRUIT_LOAD_WINDOW_DAYS)).isoformat()
+        counts = history.get(candidate.id, {})
+        accepted = counts.get('accepted', 0)
+        declined = counts.get('declined', 0)
+        accept_rate = (accepted + 1) / (accepted + declined + 2)
+        recent_load = sum(1 for timestamp in self._recent_accepts.get(candidate.id, ()) if timestamp >= since)
+        return (RECRUIT_SCORE_POSITION * (candidate.id in same_position)
+                + RECRUIT_SCORE_ACCEPT_RATE * accept_rate
+                - RECRUIT_SCORE_RECENT_LOAD * recent_load
+                - RECRUIT_SCORE_NO_RESPONSE * self._no_response.get(candidate.id, 0))
+
+    def rank(self, absent_staff):
+        history = state.stats.breakdown()['by_staff']
+        same_position = state.staff_directory.ids_by_position(absent_staff.position)
+        candidates = [state.staff_directory.get(staff_id)
+                      for staff_id in state.staff_directory.substitute_candidates(absent_staff.id)]
+        candidates = [candidate for candidate in candidates if candidate is not None]
+        return [candidate.id for candidate in
+                sorted(candidates, key=lambda candidate: (-self.score(candidate, same_position, history), candidate.id))]
+
+    def start(self, report_id, absent_staff, absence_data):
+        campaign = self._new_campaign(report_id, absent_staff, absence_data, self.rank(absent_staff))
+        with self._lock:
+            self._campaigns[report_id] = campaign
+        self._send_next_wave(report_id)
+        return campaign
+
+    def _new_campaign(self, report_id, absent_staff, absence_data, ranked):
+        return {
+            'report_id': report_id,
+            'absent_staff_id': absent_staff.id,
+            'message': render_substitute_request(absent_staff, absence_data),
+            'ranked': ranked,
+            'next_index': 0,
+            'wave': 0,
+            'current_wave': set(),
+            'asked': set(),
+            'declined': set(),
+            'status': 'recruiting',
+            'accepted_by': None,
+            'timer': None,
+            'deadline': None,
+            'sent': 0,
+            'failed': 0,
+            # 保存のたびに recruitment_claim が claimed_from のままであることを確かめる（他のワーカーに引き継がれたら止める）
+            'claim': uuid.uuid4().hex,
+            'claimed_from': None
+        }
+
+    def resume(self):
+        # 募集中のまま残った欠勤報告を見張り、担当ワーカーが締め切りを過ぎても進めなければ引き継ぐ（起動時）
+        resumed = []
+        for report in state.repository.query_records('absence_reports', limit=LIST_MAX_PAGE_SIZE, status='recruiting'):
+            self._watch(report)
+            resumed.append(report['id'])
+        return resumed
+
+    def _watch(self, report):
+        recruitment = report.get('recruitment') or {}
+        delay = max(0.0, (recruitment.get('deadline') or 0) - time.time()) + RECRUIT_RESUME_GRACE
+        seen = {'recruitment_claim': report.get('recruitment_claim'), 'recruitment': report.get('recruitment')}
+        timer_wheel.schedule(delay, self._take_over, report['id'], seen)
+
+    def _take_over(self, report_id, seen):
+        report = state.repository.get_absence_report(report_id)
+        if report is None or report['status'] != 'recruiting':
+            return
+        with self._lock:
+            if report_id in self._campaigns:
+                return
+        with use_tenant(tenants.resolve(report.get('tenant'))):
+            campaign = self._restore(report)
+            # 見張り始めてから担当ワーカーが一度も保存していなければ引き継ぐ。進んでいれば次の締め切りまで待つ
+            claimed = state.repository.update_absence_report(report_id, {'recruitment_claim': campaign['claim']},
+                                                             if_status=('recruiting',), if_match=seen)
+            if claimed is None:
+                report = state.repository.get_absence_report(report_id)
+                if report is not None and report['status'] == 'recruiting':
+                    self._watch(report)
+                return
+            campaign['claimed_from'] = campaign['claim']
+            with self._lock:
+                self._campaigns[report_id] = campaign
+                for staff_id in campaign['asked']:
+                    self._asked_by_user.setdefault(staff_id, []).append(report_id)
+            print(f"🔁 代替スタッフ募集を引き継ぎ: {report_id}（第{campaign['wave']}波まで送信済み）")
+            self._send_next_wave(report_id)
+
+    def _restore(self, report):
+        # 保存済みの recruitment から募集を組み立て直す。依頼済みの人はそのまま、残りの候補者は今の名簿で順位付けし直す
+        recruitment = report.get('recruitment') or {}
+        asked = list(recruitment.get('asked', ()))
+        absent_staff = (state.staff_directory.get(report['staff_id'])
+                        or StaffRecord(report['staff_id'], report.get('staff_name', '')))
+        ranked = asked + [staff_id for staff_id in self.rank(absent_staff) if staff_id not in asked]
+        campaign = self._new_campaign(report['id'], absent_staff, report['absence_data'], ranked)
+        campaign.update(next_index=len(asked), wave=recruitment.get('waves', 0), asked=set(asked),
+                        current_wave=set(recruitment.get('current_wave', ())),
+                        declined=set(recruitment.get('declined', ())),
+                        sent=recruitment.get('sent', 0), failed=recruitment.get('failed', 0))
+        return campaign
+
+    def _send_next_wave(self, report_id, expected_wave=None):
+        with self._lock:
+            campaign = self._campaigns.get(report_id)
+            if campaign is None or campaign['status'] != 'recruiting':
+                return
+            if expected_wave is not None and campaign['wave'] != expected_wave:
+                return
+            
+            # 別のワーカープロセスで既に代わりが決まっていれば止める
+            report = state.repository.get_absence_report(report_id)
+            if report is not None and report['status'] == 'filled':
+                campaign['status'] = 'filled'
+                campaign['timer'] = None
+                self._evict(campaign)
+                return
+            
+            # 前の波で回答しなかった人を記録
+            for staff_id in campaign['current_wave'] - campaign['declined']:
+                self._no_response[staff_id] = self._no_response.get(staff_id, 0) + 1
+            
+            wave = campaign['ranked'][campaign['next_index']:campaign['next_index'] + self.wave_size]
+            if not wave:
+                campaign['status'] = 'exhausted'
+                campaign['timer'] = None
+                self._save(campaign)
+                self._evict(campaign)
+                print(f"⚠️ 代替スタッフ募集終了（受諾なし）: {report_id}")
+                return
+            
+            campaign['next_index'] += len(wave)
+            campaign['wave'] += 1
+            campaign['current_wave'] = set(wave)
+            campaign['asked'].update(wave)
+            for staff_id in wave:
+                self._asked_by_user.setdefault(staff_id, []).append(report_id)
+            wave_number = campaign['wave']
+            campaign['deadline'] = time.time() + self.wave_timeout
+            campaign['timer'] = timer_wheel.schedule(self.wave_timeout, self._send_next_wave, report_id, wave_number)
+            # 返信がどのワーカーに届いても募集を特定できるよう、送信前に依頼先を保存する。
+            # 保存できなければ（確定済み・他のワーカーが引き継いだ）送らずに手放す
+            if not self._save(campaign):
+                self._evict(campaign)
+                return
+        
+        result = multicast_bot_a_message(wave, campaign['message'], template_key='substitute_request')
+        with self._lock:
+            campaign['sent'] += result['sent']
+            campaign['failed'] += result['failed']
+            if campaign['status'] == 'recruiting' and not self._save(campaign):
+                self._evict(campaign)
+        print(f"🔄 代替スタッフ募集 第{wave_number}波: {len(wave)}名に依頼送信 (送信成功 {result['sent']}名 / 失敗 {result['failed']}名)")
+
+    def _save(self, campaign):
+        # 保存できたかを返す
+        fields = {
+            'recruitment': {
+                'status': campaign['status'],
+                'waves': campaign['wave'],
+                'requested': len(campaign['asked']),
+                'candidates': len(campaign['ranked']),
+                'sent': campaign['sent'],
+                'failed': campaign['failed'],
+                'asked': sorted(campaign['asked']),
+                'current_wave': sorted(campaign['current_wave']),
+                'declined': sorted(campaign['declined']),
+                'deadline': campaign['deadline']
+            },
+            'recruitment_claim': campaign['claim']
+        }
+        # 欠勤報告の status は reported → recruiting → filled / unfilled。確定済みの報告は巻き戻さない
+        if_status = None
+        if campaign['status'] == 'recruiting':
+            fields['status'] = 'recruiting'
+            if_status = ('reported', 'recruiting')
+        elif campaign['status'] == 'exhausted':
+            fields['status'] = 'unfilled'
+            if_status = ('recruiting',)
+        report = state.repository.update_absence_report(campaign['report_id'], fields, if_status=if_status,
+                                                        if_match={'recruitment_claim': campaign['claimed_from']})
+        if report is None:
+            return False
+        campaign['claimed_from'] = campaign['claim']
+        if 'status' in fields:
+            state.live_feed.publish('absence_report', report)
+        return True
+
+    def _evict(self, campaign):
+        # 終わった（確定・候補者切れ・他のワーカーへ引き継ぎ）募集をメモリから外す。遅れて届いた返信は保存済みの依頼先から探す
+        if campaign['timer'] is not None:
+            timer_wheel.cancel(campaign['timer'])
+            campaign['timer'] = None
+        report_id = campaign['report_id']
+        if self._campaigns.get(report_id) is campaign:
+            del self._campaigns[report_id]
+        for staff_id in campaign['asked']:
+            report_ids = self._asked_by_user.get(staff_id)
+            if report_ids and report_id in report_ids:
+                report_ids.remove(report_id)
+                if not report_ids:
+                    del self._asked_by_user[staff_id]
+
+    def _find_report_id(self, user_id):
+        # このプロセスが進めている募集でなければ、保存済みの依頼先から探す（募集中・受諾なし終了・確定済みの順）
+        for status, limit in (('recruiting', LIST_MAX_PAGE_SIZE), ('unfilled', LIST_MAX_PAGE_SIZE),
+                              ('filled', LIST_PAGE_SIZE)):
+            for report in state.repository.query_records('absence_reports', limit=limit, status=status):
+                if user_id in report.get('recruitment', {}).get('asked', ()):
+                    return report['id']
+        return None
+
+    def _campaign_for(self, user_id):
+        # メモリにあるのは募集中のものだけ。複数あれば最新のもの
+        report_ids = self._asked_by_user.get(user_id)
+        return self._campaigns[report_ids[-1]] if report_ids else None
+
+    def accept(self, user_id):
+        # (report_id, 結果) を返す。結果は accepted / already_filled / no_request
+        with self._lock:
+            campaign = self._campaign_for(user_id)
+            report_id = campaign['report_id'] if campaign is not None else self._find_report_id(user_id)
+            if report_id is None:
+                return None, 'no_request'
+            
+            # 確定は欠勤報告の条件付き更新で行い、複数ワーカーに同時に届いた受諾のうち1件だけを通す。
+            # 候補者が尽きた後（unfilled）の遅れた受諾も受け付ける
+            staff_info = state.staff_directory.get(user_id)
+            claimed = state.repository.update_absence_report(report_id, {
+                'status': 'filled',
+                'substitute_staff_id': user_id,
+                'substitute_staff_name': staff_info.name if staff_info else None
+            }, if_status=('recruiting', 'unfilled'))
+            
+            if campaign is not None:
+                campaign['status'] = 'filled'
+                if claimed is not None:
+                    campaign['accepted_by'] = user_id
+                self._save(campaign)
+                self._evict(campaign)
+            if claimed is None:
+                return report_id, 'already_filled'
+            state.live_feed.publish('absence_report', claimed)
+            self._record_accept(user_id)
+            return report_id, 'accepted'
+
+    def _record_accept(self, user_id):
+        # 負荷の集計期間を過ぎた受諾は捨てる
+        since = (datetime.now() - timedelta(days=RECRUIT_LOAD_WINDOW_DAYS)).isoformat()
+        timestamps = [timestamp for timestamp in self._recent_accepts.get(user_id, ()) if timestamp >= since]
+        timestamps.append(datetime.now().isoformat())
+        self._recent_accepts[user_id] = timestamps
+
+    def decline(self, user_id):
+        with self._lock:
+            campaign = self._campaign_for(user_id)
+            if campaign is None:
+                return self._find_report_id(user_id)
+            campaign['declined'].add(user_id)
+            # 今の波の全員が断ったら締め切りを待たずに次の波へ
+            advance = campaign['current_wave'] <= campaign['declined']
+            if advance and campaign['timer'] is not None:
+                timer_wheel.cancel(campaign['timer'])
+                campaign['timer'] = None
+            elif not advance and not self._save(campaign):
+                self._evict(campaign)
+            report_id = campaign['report_id']
+        if advance:
+            self._send_next_wave(report_id)
+        return report_id
+
+recruitment_scheduler = RecruitmentScheduler()
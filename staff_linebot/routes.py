@@ -0,0 +1,401 @@
+# staff_linebot/routes.py
+
+import base64
+import hashlib
+import hmac
+import itertools
+import os
+import time
+from datetime import datetime, timezone
+
+from flask import Blueprint, Response, current_app, g, jsonify, make_response, request, stream_with_context
+
+from . import state
+from .customer_notify import CustomerNotificationBusy, customer_notifier, find_affected_appointments
+from .dashboard import dashboard_asset
+from .handlers import handle_absence_report
+from .intents import analyze_message
+from .json_codec import json_dumps, json_loads
+from .line_api import line_channel_configured, line_client_cache_stats
+from .messaging import Responder
+from .metrics import errors_total, metrics, webhook_seconds
+from .outbound import line_sender
+from .profiler import profiler
+from .staff import StaffRecord
+from .storage import LIST_MAX_PAGE_SIZE, LIST_PAGE_SIZE, RECORDS_VERSION_KEYS
+from .tenants import LINE_CHANNELS, tenants, use_tenant
+from .webhook import WEBHOOK_MAX_BYTES, bot_a_events, receive_bot_a_webhook, webhook_tenant
+
+# ルートは Blueprint に登録し、アプリ本体は app.create_app() で組み立てる
+linebot_bp = Blueprint('linebot', __name__)
+
+# メインページ（create_app() で描画・圧縮済み）
+@linebot_bp.route('/')
+def index():
+    return dashboard_asset(current_app).response(request)
+
+# LINE Bot A Webhook（署名検証からキュー投入までは webhook.receive_bot_a_webhook）
+@linebot_bp.route('/webhook/bot-a', methods=['POST'])
+def webhook_bot_a():
+    started = time.perf_counter()
+    try:
+        rejected = reject_webhook_request()
+        if rejected:
+            return rejected
+        body = request.get_data()
+        return receive_bot_a_webhook(webhook_tenant(body), body, request.headers['X-Line-Signature'])
+    finally:
+        webhook_seconds.observe(time.perf_counter() - started, 'bot_a')
+
+@linebot_bp.route('/webhook/<tenant_id>/bot-a', methods=['POST'])
+def webhook_tenant_bot_a(tenant_id):
+    started = time.perf_counter()
+    try:
+        tenant = tenants.get(tenant_id)
+        if tenant is None:
+            return 'Unknown tenant', 404
+        return reject_webhook_request() or receive_bot_a_webhook(tenant, request.get_data(),
+                                                                request.headers['X-Line-Signature'])
+    finally:
+        webhook_seconds.observe(time.perf_counter() - started, 'bot_a')
+
+def reject_webhook_request():
+    # 署名ヘッダーがない・大きすぎるリクエストは本文を読まずに断る
+    if 'X-Line-Signature' not in request.headers:
+        errors_total.inc('webhook_request')
+        return 'Missing signature', 400
+    if request.content_length is not None and request.content_length > WEBHOOK_MAX_BYTES:
+        errors_total.inc('webhook_request')
+        return 'Payload too large', 413
+    return None
+
+# 一覧・統計 API の条件付き GET
+# 記録の版番号（version:records）とクエリ文字列から ETag を、modified:records から Last-Modified を作る。
+# ETag が一致すれば記録の読み出しも JSON 化もせずに 304 を返す。
+# If-Modified-Since では 304 を返さない（modified:records は秒単位なので、同じ秒の書き込みを見逃す）
+def cached_records_response(scope, build):
+    # 版番号は記録より先に読む。読み出し中に書き込まれても「古い版番号に新しい内容」になるだけで、
+    # 古い内容に新しい版番号が付くことはない（書き込み側は記録の後に版番号を進める）
+    versions = state.repository.counters.read(RECORDS_VERSION_KEYS)
+    etag = f"{scope}-{versions.get('version:records', 0)}-{hashlib.sha1(request.query_string).hexdigest()[:12]}"
+    last_modified = datetime.fromtimestamp(versions.get('modified:records', 0), timezone.utc)
+    
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = make_response(build())
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# API エンドポイント
+@linebot_bp.route('/api/line-bot/stats')
+def get_stats():
+    # verify は記録全体から集計を作り直す重い処理なので管理トークン必須
+    if request.args.get('verify'):
+        rejected = reject_non_admin()
+        if rejected:
+            return rejected
+    
+    def build():
+        result = state.stats.summary()
+        if request.args.get('breakdown'):
+            result.update(state.stats.breakdown())
+        if request.args.get('verify'):
+            result['consistency'] = state.stats.verify(state.repository)
+        return jsonify(result)
+    return cached_records_response('stats', build)
+
+# 一覧 API 共通処理（カーソル方式のページング・絞り込み・NDJSON エクスポート）
+def encode_cursor(timestamp, record_id):
+    raw = json_dumps([timestamp, record_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        position = json_loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError('cursor が不正です')
+    if not (isinstance(position, list) and len(position) == 2 and all(isinstance(item, str) for item in position)):
+        raise ValueError('cursor が不正です')
+    return position
+
+def parse_list_filters(args):
+    filters = {
+        'staff_id': args.get('staff_id') or None,
+        'status': args.get('status') or None,
+        'date_from': args.get('from') or None,
+        'date_to': args.get('to') or None
+    }
+    for name in ('date_from', 'date_to'):
+        if filters[name]:
+            try:
+                datetime.strptime(filters[name], '%Y-%m-%d')
+            except ValueError:
+                raise ValueError(f"{name[5:]} は YYYY-MM-DD 形式で指定してください")
+    return filters
+
+def iter_record_payloads(kind, filters, before=None):
+    # 大量エクスポート用: 一定件数ずつ読み出して逐次返す
+    while True:
+        page = state.repository.query_record_payloads(kind, limit=LIST_MAX_PAGE_SIZE, before=before, **filters)
+        for _, _, payload in page:
+            yield payload
+        if len(page) < LIST_MAX_PAGE_SIZE:
+            return
+        before = tuple(page[-1][:2])
+
+def list_records_response(kind):
+    try:
+        filters = parse_list_filters(request.args)
+        before = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        limit = max(1, min(int(request.args.get('limit', LIST_PAGE_SIZE)), LIST_MAX_PAGE_SIZE))
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    
+    if request.args.get('format') == 'ndjson':
+        def generate():
+            for payload in iter_record_payloads(kind, filters, before):
+                yield payload + '\n'
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                        headers={'Content-Disposition': f'attachment; filename={kind}.ndjson'})
+    
+    # 記録は書き込み時に JSON にしたものをつなぐだけで、1件ずつエンコードし直さない
+    page = state.repository.query_record_payloads(kind, limit=limit + 1, before=before, **filters)
+    next_cursor = encode_cursor(*page[limit - 1][:2]) if len(page) > limit else None
+    items = ','.join(payload for _, _, payload in page[:limit])
+    return Response(f'{{"items":[{items}],"next_cursor":{json_dumps(next_cursor)}}}\n', mimetype='application/json')
+
+# ライブ配信（Server-Sent Events）。再接続時は Last-Event-ID ヘッダー（または last_event_id）以降の差分を返す
+@linebot_bp.route('/api/line-bot/events')
+def stream_live_events():
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({'error': 'Last-Event-ID が不正です'}), 400
+    if not state.live_feed.open():
+        return jsonify({'error': 'ライブ配信の接続数が上限に達しています'}), 503, {'Retry-After': '30'}
+    
+    response = Response(state.live_feed.stream(last_event_id), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(state.live_feed.close)
+    return response
+
+# 監査ログ（LINEBOT_STORAGE=eventlog のときのみ）。after より後のイベントを連番順に limit 件返す
+@linebot_bp.route('/api/line-bot/audit-log')
+def get_audit_log():
+    # スタッフ名簿・欠勤理由などをそのまま含むので管理トークン必須
+    rejected = reject_non_admin()
+    if rejected:
+        return rejected
+    event_log = getattr(state.repository, 'event_log', None)
+    if event_log is None:
+        return jsonify({'error': '監査ログは LINEBOT_STORAGE=eventlog:///... のときのみ利用できます'}), 404
+    try:
+        after = int(request.args.get('after', 0))
+        limit = max(1, min(int(request.args.get('limit', LIST_PAGE_SIZE)), LIST_MAX_PAGE_SIZE))
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    
+    event_log.sync()
+    items = list(itertools.islice(event_log.events(after), limit))
+    return jsonify({'items': items, 'next_after': items[-1]['seq'] if len(items) == limit else None})
+
+@linebot_bp.route('/api/line-bot/absence-reports')
+def get_absence_reports():
+    return cached_records_response('absence_reports', lambda: list_records_response('absence_reports'))
+
+@linebot_bp.route('/api/line-bot/substitute-requests')
+def get_substitute_requests():
+    return cached_records_response('substitute_requests', lambda: list_records_response('substitute_requests'))
+
+# 振替連絡の宛先として受け付ける予約（送信・配信記録で使う項目はすべて文字列で必須）
+APPOINTMENT_FIELDS = ('id', 'name', 'line_id', 'appointment_date', 'appointment_time')
+
+def parse_appointments(appointments):
+    if not isinstance(appointments, list):
+        raise ValueError('appointments は予約の配列で指定してください')
+    for appointment in appointments:
+        if not (isinstance(appointment, dict)
+                and all(isinstance(appointment.get(field), str) for field in APPOINTMENT_FIELDS)):
+            raise ValueError(f"appointments の各要素には {' / '.join(APPOINTMENT_FIELDS)} を文字列で指定してください")
+    return appointments
+
+# お客様への一括振替連絡（appointments 省略時は欠勤日の担当予約すべて）
+@linebot_bp.route('/api/line-bot/absence-reports/<report_id>/customer-notifications', methods=['POST'])
+def notify_customers(report_id):
+    # お客様の LINE ID を受け取り、お客様へ送信するので管理トークン必須
+    rejected = reject_non_admin()
+    if rejected:
+        return rejected
+    report = state.repository.get_absence_report(report_id)
+    if report is None:
+        return jsonify({'success': False, 'message': '欠勤報告が見つかりません'}), 404
+    
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'message': 'JSON オブジェクトを送ってください'}), 400
+    substitute_info = state.staff_directory.get(data.get('substitute_staff_id') or report.get('substitute_staff_id'))
+    if substitute_info is None:
+        return jsonify({'success': False, 'message': '代替スタッフが決まっていません'}), 400
+    
+    appointments = data.get('appointments')
+    if appointments is None:
+        appointments = find_affected_appointments(report['staff_id'], report['absence_data']['date'])
+    else:
+        try:
+            appointments = parse_appointments(appointments)
+        except ValueError as error:
+            return jsonify({'success': False, 'message': str(error)}), 400
+    try:
+        summary = customer_notifier.notify(report_id, appointments, substitute_info)
+    except CustomerNotificationBusy:
+        return jsonify({'success': False, 'message': '同じ欠勤報告の振替連絡を別の処理が開始しました'}), 409
+    return jsonify(dict(summary, success=True))
+
+@linebot_bp.route('/api/line-bot/absence-reports/<report_id>/customer-notifications')
+def get_customer_notifications(report_id):
+    # お客様の氏名を含むので管理トークン必須
+    rejected = reject_non_admin()
+    if rejected:
+        return rejected
+    report = state.repository.get_absence_report(report_id)
+    if report is None or not report.get('customer_notifications'):
+        return jsonify({'success': False, 'message': '配信記録がありません'}), 404
+    return jsonify(customer_notifier.summary(report['customer_notifications']))
+
+@linebot_bp.route('/api/line-bot/staff')
+def get_staff_list():
+    # 電話番号を含むので管理トークン必須
+    rejected = reject_non_admin()
+    if rejected:
+        return rejected
+    return jsonify([record.to_dict() for record in state.staff_directory.all()])
+
+@linebot_bp.route('/api/line-bot/staff', methods=['POST'])
+def save_staff():
+    rejected = reject_non_admin()
+    if rejected:
+        return rejected
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'message': 'JSON オブジェクトを送ってください'}), 400
+    if not data.get('id') or not data.get('name'):
+        return jsonify({'success': False, 'message': 'id と name は必須です'}), 400
+    if not isinstance(data.get('available', True), bool):
+        # "false" のような文字列は真とみなされてしまうので受け付けない
+        return jsonify({'success': False, 'message': 'available は true / false で指定してください'}), 400
+    state.staff_directory.upsert(StaffRecord.from_dict(data))
+    return jsonify({'success': True, 'message': 'スタッフ情報を保存しました'})
+
+@linebot_bp.route('/api/line-bot/queue-stats')
+def get_queue_stats():
+    return jsonify({'bot_a': bot_a_events.stats(), 'dedup': state.event_deduplicator.stats()})
+
+@linebot_bp.route('/api/line-bot/tenants')
+def get_tenants():
+    return jsonify({
+        'tenants': [{
+            'id': tenant.id,
+            'store': tenant.store,
+            'channels': {channel: line_channel_configured(channel, tenant) for channel in LINE_CHANNELS}
+        } for tenant in tenants],
+        'line_clients': line_client_cache_stats()
+    })
+
+@linebot_bp.route('/api/line-bot/outbound-stats')
+def get_outbound_stats():
+    return jsonify(dict(line_sender.stats(), responses=Responder.stats()))
+
+@linebot_bp.route('/metrics')
+def get_metrics():
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# 管理者用 API: Authorization: Bearer <LINEBOT_ADMIN_TOKEN>。LINEBOT_ADMIN_TOKEN が未設定なら無効（404）
+LINEBOT_ADMIN_TOKEN = os.getenv('LINEBOT_ADMIN_TOKEN')
+
+def reject_non_admin():
+    if not LINEBOT_ADMIN_TOKEN:
+        return jsonify({'error': 'Not Found'}), 404
+    expected = f'Bearer {LINEBOT_ADMIN_TOKEN}'.encode('utf-8')
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode('latin-1'), expected):
+        return jsonify({'error': '認証が必要です'}), 401, {'WWW-Authenticate': 'Bearer'}
+    return None
+
+# リクエストの計測（プロファイラを止めている間は active の参照だけ）
+@linebot_bp.before_request
+def profile_request_begin():
+    if profiler.active:
+        g.profiled = profiler.begin(f'http:{request.endpoint}')
+
+@linebot_bp.teardown_request
+def profile_request_end(error=None):
+    # 途中でプロファイラが止まっても、計測対象に選んだリクエストは必ず外す
+    if g.pop('profiled', False):
+        profiler.end()
+
+# プロファイラの開始: {"rate": 0.1}（リクエストの 10% を計測し続ける）/ {"duration": 60}（60秒間すべて計測）
+@linebot_bp.route('/api/line-bot/admin/profiler', methods=['POST'])
+def start_profiler():
+    rejected = reject_non_admin()
+    if rejected:
+        return rejected
+    data = request.get_json(silent=True) or {}
+    try:
+        rate = float(data.get('rate', 1.0))
+        duration = float(data['duration']) if data.get('duration') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'rate / duration は数値で指定してください'}), 400
+    if not 0 < rate <= 1 or (duration is not None and duration <= 0):
+        return jsonify({'error': 'rate は 0 より大きく 1 以下、duration は正の秒数です'}), 400
+    if data.get('reset'):
+        profiler.reset()
+    profiler.start(rate, duration)
+    return jsonify(profiler.status())
+
+@linebot_bp.route('/api/line-bot/admin/profiler', methods=['DELETE'])
+def stop_profiler():
+    rejected = reject_non_admin()
+    if rejected:
+        return rejected
+    profiler.stop()
+    return jsonify(profiler.status())
+
+@linebot_bp.route('/api/line-bot/admin/profiler')
+def get_profiler_status():
+    return reject_non_admin() or jsonify(profiler.status())
+
+# 集計したスタック（collapsed stack 形式）。label=http:linebot.webhook_bot_a などで処理の種類を絞り込む
+@linebot_bp.route('/api/line-bot/admin/profiler/stacks')
+def get_profiler_stacks():
+    rejected = reject_non_admin()
+    if rejected:
+        return rejected
+    return Response(profiler.collapsed(request.args.get('label')), content_type='text/plain; charset=utf-8')
+
+@linebot_bp.route('/api/line-bot/test/absence-report', methods=['POST'])
+def test_absence_report():
+    data = request.get_json()
+    staff_id = data.get('staff_id')
+    message = data.get('message')
+    
+    # テスト用の欠勤報告処理（tenant を指定するとそのテナントとして処理する）
+    analysis = analyze_message(message)
+    if analysis['type'] == 'absence_report':
+        with use_tenant(tenants.resolve(data.get('tenant'))):
+            handle_absence_report(staff_id, message, analysis['data'])
+        return jsonify({'success': True, 'message': 'テスト欠勤報告が処理されました'})
+    else:
+        return jsonify({'success': False, 'message': 'メッセージを解析できませんでした'})
+
+@linebot_bp.route('/api/line-bot/settings', methods=['POST'])
+def save_settings():
+    data = request.get_json()
+    # 設定保存処理（実際の実装ではデータベースに保存）
+    return jsonify({'success': True, 'message': '設定を保存しました'})
@@ -0,0 +1,18 @@
+# staff_linebot/sample_data.py
+
+# サンプルスタッフデータ
+sample_staff = {
+    'U1234567890': {'id': 'U1234567890', 'name': '田中 美咲', 'position': '美容師', 'phone': '090-1234-5678'},
+    'U2345678901': {'id': 'U2345678901', 'name': '佐藤 健太', 'position': '理容師', 'phone': '090-2345-6789'},
+    'U3456789012': {'id': 'U3456789012', 'name': '山田 花子', 'position': 'アシスタント', 'phone': '090-3456-7890'}
+}
+
+# サンプル予約データ（お客様の LINE ID は Bot B の友だち登録で取得）
+sample_appointments = [
+    {'id': 'A1001', 'staff_id': 'U1234567890', 'name': '鈴木 一郎', 'line_id': 'C1111111111',
+     'appointment_date': '2024-06-01', 'appointment_time': '11:00'},
+    {'id': 'A1002', 'staff_id': 'U1234567890', 'name': '高橋 由美', 'line_id': 'C2222222222',
+     'appointment_date': '2024-06-01', 'appointment_time': '14:30'},
+    {'id': 'A1003', 'staff_id': 'U2345678901', 'name': '伊藤 誠', 'line_id': 'C3333333333',
+     'appointment_date': '2024-06-01', 'appointment_time': '16:00'}
+]
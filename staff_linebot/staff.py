@@ -0,0 +1,130 @@
+# staff_linebot/staff.py
+
+import os
+import threading
+
+from . import state
+from .sample_data import sample_staff
+from .tenants import current_tenant
+
+# スタッフ名簿
+# 保存レイヤーから読み込み、役職・店舗・出勤可否の二次インデックスと代替出勤の候補者集合をメモリに持つ
+DEFAULT_STORE = os.getenv('DEFAULT_STORE', 'default')
+
+class StaffRecord:
+    __slots__ = ('id', 'name', 'position', 'phone', 'store', 'available')
+
+    def __init__(self, id, name, position='', phone='', store=DEFAULT_STORE, available=True):
+        self.id = id
+        self.name = name
+        self.position = position
+        self.phone = phone
+        self.store = store
+        self.available = available
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['id'], data['name'], data.get('position', ''), data.get('phone', ''),
+                   data.get('store') or DEFAULT_STORE, data.get('available', True))
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+class StaffDirectory:
+    def __init__(self, repository):
+        self.repository = repository
+        self._lock = threading.Lock()
+        self._records = {}
+        self._by_position = {}
+        self._by_store = {}
+        self._available = set()
+        self._candidates = {}
+        self.version = 0
+        self._shared_version = None
+
+    def load(self):
+        shared_version = self.repository.counters.read(['version:staff']).get('version:staff', 0)
+        records = [StaffRecord.from_dict(staff) for staff in self.repository.list_staff()]
+        with self._lock:
+            self._shared_version = shared_version
+            self._records = {}
+            self._by_position = {}
+            self._by_store = {}
+            self._available = set()
+            for record in records:
+                self._index(record)
+            self._invalidate()
+
+    def _index(self, record):
+        self._records[record.id] = record
+        self._by_position.setdefault(record.position, set()).add(record.id)
+        self._by_store.setdefault(record.store, set()).add(record.id)
+        if record.available:
+            self._available.add(record.id)
+
+    def _unindex(self, record):
+        self._records.pop(record.id, None)
+        self._by_position.get(record.position, set()).discard(record.id)
+        self._by_store.get(record.store, set()).discard(record.id)
+        self._available.discard(record.id)
+
+    def _invalidate(self):
+        self._candidates = {}
+        self.version += 1
+
+    def refresh(self):
+        # 他のワーカープロセスで名簿が更新されていれば読み直す
+        shared_version = self.repository.counters.read(['version:staff']).get('version:staff', 0)
+        if shared_version != self._shared_version:
+            self.load()
+
+    def __len__(self):
+        return len(self._records)
+
+    def get(self, staff_id):
+        return self._records.get(staff_id)
+
+    def all(self):
+        return list(self._records.values())
+
+    def upsert(self, record):
+        self.repository.save_staff(record.to_dict())
+        self.repository.counters.increment({'version:staff': 1})
+        with self._lock:
+            previous = self._records.get(record.id)
+            if previous is not None:
+                self._unindex(previous)
+            self._index(record)
+            self._invalidate()
+            if self._shared_version is not None:
+                self._shared_version += 1
+
+    def ids_by_position(self, position):
+        return frozenset(self._by_position.get(position, ()))
+
+    # 代替出勤の候補者: 同じ店舗の出勤可能なスタッフから欠勤者を除いた集合（名簿が変わるまでキャッシュ）
+    def substitute_candidates(self, absent_staff_id):
+        candidates = self._candidates.get(absent_staff_id)
+        if candidates is not None:
+            return candidates
+        with self._lock:
+            absent = self._records.get(absent_staff_id)
+            store = absent.store if absent else DEFAULT_STORE
+            candidates = frozenset(self._by_store.get(store, set()) & self._available) - {absent_staff_id}
+            self._candidates[absent_staff_id] = candidates
+            return candidates
+
+# スタッフが未登録ならサンプルデータを投入
+def seed_sample_staff(repository):
+    if not repository.list_staff():
+        for staff in sample_staff.values():
+            repository.save_staff(staff)
+        repository.flush()
+
+def tenant_staff(user_id):
+    # 処理中のテナントの店舗に所属するスタッフだけを返す（既定のテナントは店舗で絞り込まない）
+    record = state.staff_directory.get(user_id)
+    store = current_tenant.get().store
+    if record is None or (store is not None and record.store != store):
+        return None
+    return record
@@ -0,0 +1,10 @@
+# staff_linebot/state.py
+# 保存レイヤーと、それを読み込んで作るプロセスの状態。
+# import 時には作らず、app.init_state() で LINEBOT_STORAGE（create_app の config で上書き可）から組み立てる。
+# 他のモジュールからは state.repository のように属性として参照する（from import すると初期化前の None を掴む）
+
+repository = None
+staff_directory = None
+stats = None
+live_feed = None
+event_deduplicator = None
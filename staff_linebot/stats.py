@@ -0,0 +1,103 @@
+# staff_linebot/stats.py
+
+from .storage import LocalCounters, touch_records
+
+# 統計の集計
+# 記録のたびにカウンタを更新し、統計の読み込みを履歴件数に依存しない O(1) にする。
+# カウンタはリポジトリの共有カウンタに置くため、SQLite なら複数ワーカーで同じ値を読む
+# キー: total:<種類> / status:<回答> / day:<日付>:<項目> / staff:<スタッフID>:<項目>
+class StatsAggregator:
+    FIELDS = ('absence_reports', 'accepted', 'declined')
+    SUMMARY_KEYS = ('total:absence_reports', 'total:substitute_requests', 'status:accepted', 'status:declined')
+
+    def __init__(self, counters=None):
+        self.counters = counters if counters is not None else LocalCounters()
+
+    @staticmethod
+    def _bump(deltas, staff_id, timestamp, field, amount=1):
+        for key in (f'day:{timestamp[:10]}:{field}', f'staff:{staff_id}:{field}'):
+            deltas[key] = deltas.get(key, 0) + amount
+
+    @classmethod
+    def _absence_report_deltas(cls, deltas, report):
+        deltas['total:absence_reports'] = deltas.get('total:absence_reports', 0) + 1
+        cls._bump(deltas, report['staff_id'], report['timestamp'], 'absence_reports')
+
+    @classmethod
+    def _substitute_response_deltas(cls, deltas, previous, substitute_request):
+        # 同じ依頼への回答の上書きは、前の回答を取り消してから数える
+        if previous is None:
+            deltas['total:substitute_requests'] = deltas.get('total:substitute_requests', 0) + 1
+        else:
+            deltas[f"status:{previous['status']}"] = deltas.get(f"status:{previous['status']}", 0) - 1
+            cls._bump(deltas, previous['staff_id'], previous['timestamp'], previous['status'], -1)
+        status = substitute_request['status']
+        deltas[f'status:{status}'] = deltas.get(f'status:{status}', 0) + 1
+        cls._bump(deltas, substitute_request['staff_id'], substitute_request['timestamp'], status)
+
+    # 集計の反映でも記録の版番号を進める。版番号は反映の後に進め、統計 API の ETag が古い集計を指さないようにする
+    def record_absence_report(self, report):
+        deltas = {}
+        self._absence_report_deltas(deltas, report)
+        deltas['version:records'] = 1
+        self.counters.increment(deltas)
+
+    def record_substitute_response(self, previous, substitute_request):
+        deltas = {}
+        self._substitute_response_deltas(deltas, previous, substitute_request)
+        deltas['version:records'] = 1
+        self.counters.increment(deltas)
+
+    @classmethod
+    def count(cls, repository):
+        counts = {}
+        for report in repository.list_absence_reports():
+            cls._absence_report_deltas(counts, report)
+        for substitute_request in repository.list_substitute_requests():
+            cls._substitute_response_deltas(counts, None, substitute_request)
+        return counts
+
+    def rebuild(self, repository):
+        self.counters.replace(self.count(repository), ('total:', 'status:', 'day:', 'staff:'))
+        touch_records(self.counters)
+
+    def load(self, repository):
+        # 共有カウンタが既にあれば（他のワーカーや前回の起動で作成済み）そのまま使う
+        if not self.counters.read(self.SUMMARY_KEYS):
+            self.rebuild(repository)
+
+    def summary(self):
+        values = self.counters.read(self.SUMMARY_KEYS)
+        return {
+            'total_absence_reports': values.get('total:absence_reports', 0),
+            'total_substitute_requests': values.get('total:substitute_requests', 0),
+            'accepted_substitutes': values.get('status:accepted', 0),
+            'declined_substitutes': values.get('status:declined', 0)
+        }
+
+    def breakdown(self):
+        result = {}
+        for section, prefix in (('by_day', 'day:'), ('by_staff', 'staff:')):
+            grouped = {}
+            for key, value in self.counters.read_prefix(prefix).items():
+                name, field = key[len(prefix):].rsplit(':', 1)
+                grouped.setdefault(name, dict.fromkeys(self.FIELDS, 0))[field] = value
+            result[section] = dict(sorted(grouped.items())) if section == 'by_day' else grouped
+        return result
+
+    # 整合性チェック: 生データから作り直した集計と比較する
+    def verify(self, repository):
+        expected = StatsAggregator()
+        expected.rebuild(repository)
+        current = dict(self.summary(), **self.breakdown())
+        rebuilt = dict(expected.summary(), **expected.breakdown())
+        differences = {key: {'counter': current[key], 'records': rebuilt[key]}
+                       for key in rebuilt if _strip_zero(current[key]) != _strip_zero(rebuilt[key])}
+        return {'consistent': not differences, 'differences': differences}
+
+def _strip_zero(value):
+    # 取り消しで 0 になった内訳は、作り直した集計には現れないため比較から外す
+    if isinstance(value, dict):
+        stripped = {key: _strip_zero(item) for key, item in value.items()}
+        return {key: item for key, item in stripped.items() if item not in (0, {})}
+    return value
@@ -0,0 +1,543 @@
+# staff_linebot/storage.py
+
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import deque
+from datetime import datetime, timedelta
+
+from .json_codec import json_dumps, json_loads
+from .metrics import errors_total
+
+# データ保存レイヤー
+# LINEBOT_STORAGE=memory（既定。テスト用、プロセス内の dict に保持）
+# LINEBOT_STORAGE=sqlite:///path/to/linebot.db（WAL モード。複数ワーカーで同じデータを共有）
+# LINEBOT_STORAGE=eventlog:///path/to/dir（メモリに保持し、変更をイベントログに追記して再起動時に復元。1プロセス専用）
+LINEBOT_STORAGE = os.getenv('LINEBOT_STORAGE', 'memory')
+
+# 一覧の並び順は (timestamp, id) の降順。カーソルは最後に返したレコードの (timestamp, id)
+LIST_PAGE_SIZE = 50
+LIST_MAX_PAGE_SIZE = 500
+RECORD_KINDS = ('absence_reports', 'substitute_requests')
+
+def date_range_bounds(date_from, date_to):
+    # 日付（YYYY-MM-DD）を timestamp の比較範囲 [lower, upper) に変換する
+    lower = date_from or None
+    upper = (datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d') if date_to else None
+    return lower, upper
+
+# メモリ上の二次インデックス（全体・staff_id 別・status 別の昇順キー列）
+class RecordIndex:
+    FIELDS = ('staff_id', 'status')
+
+    def __init__(self):
+        self.keys = []
+        self.by_field = {field: {} for field in self.FIELDS}
+
+    def add(self, record):
+        key = (record['timestamp'], record['id'])
+        insort(self.keys, key)
+        for field in self.FIELDS:
+            insort(self.by_field[field].setdefault(record[field], []), key)
+
+    def add_all(self, records):
+        # まとめて追加するときは末尾に足してから1回だけ並べ替える（起動時の復元など）
+        for record in records:
+            key = (record['timestamp'], record['id'])
+            self.keys.append(key)
+            for field in self.FIELDS:
+                self.by_field[field].setdefault(record[field], []).append(key)
+        for keys in [self.keys] + [keys for by_value in self.by_field.values() for keys in by_value.values()]:
+            keys.sort()
+
+    def remove(self, record):
+        key = (record['timestamp'], record['id'])
+        for keys in [self.keys] + [self.by_field[field].get(record[field], []) for field in self.FIELDS]:
+            position = bisect_left(keys, key)
+            if position < len(keys) and keys[position] == key:
+                del keys[position]
+
+    def scan(self, records, staff_id=None, status=None, date_from=None, date_to=None, before=None):
+        # 条件のうち最も絞り込めるキー列を選び、範囲内を新しい順に走査する
+        candidates = [self.keys]
+        if staff_id is not None:
+            candidates.append(self.by_field['staff_id'].get(staff_id, []))
+        if status is not None:
+            candidates.append(self.by_field['status'].get(status, []))
+        keys = min(candidates, key=len)
+        
+        lower, upper = date_range_bounds(date_from, date_to)
+        low = bisect_left(keys, (lower,)) if lower else 0
+        high = len(keys)
+        if upper:
+            high = bisect_left(keys, (upper,), 0, high)
+        if before:
+            high = bisect_left(keys, tuple(before), 0, high)
+        
+        for position in range(high - 1, low - 1, -1):
+            record = records[keys[position][1]]
+            if staff_id is not None and record['staff_id'] != staff_id:
+                continue
+            if status is not None and record['status'] != status:
+                continue
+            yield record
+
+# 共有カウンタ（統計・名簿の版番号）。SQLite では全ワーカーで同じ値を読む
+class LocalCounters:
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def increment(self, deltas):
+        with self._lock:
+            for key, amount in deltas.items():
+                self._values[key] = self._values.get(key, 0) + amount
+
+    def raise_to(self, values):
+        # 現在値より大きいときだけ置き換える（最終更新時刻など）
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = max(self._values.get(key, value), value)
+
+    def read(self, keys):
+        with self._lock:
+            return {key: self._values[key] for key in keys if key in self._values}
+
+    def read_prefix(self, prefix):
+        with self._lock:
+            return {key: value for key, value in self._values.items() if key.startswith(prefix)}
+
+    def replace(self, values, prefixes):
+        # prefixes で始まるカウンタをすべて values に置き換える
+        with self._lock:
+            self._values = {key: value for key, value in self._values.items() if not key.startswith(prefixes)}
+            self._values.update(values)
+
+class SQLiteCounters:
+    UPSERT_COUNTER = ('INSERT INTO counters (key, value) VALUES (?, ?) '
+                      'ON CONFLICT(key) DO UPDATE SET value = value + excluded.value')
+    UPSERT_MAX_COUNTER = ('INSERT INTO counters (key, value) VALUES (?, ?) '
+                          'ON CONFLICT(key) DO UPDATE SET value = MAX(value, excluded.value)')
+
+    def __init__(self, repository):
+        self.repository = repository
+
+    def increment(self, deltas):
+        # 加算はバッファ経由でまとめて反映する（他ワーカーの加算とは SQL 側で合算される）
+        for key, amount in deltas.items():
+            self.repository._write(self.UPSERT_COUNTER, (key, amount))
+
+    def raise_to(self, values):
+        for key, value in values.items():
+            self.repository._write(self.UPSERT_MAX_COUNTER, (key, value))
+
+    def read(self, keys):
+        keys = list(keys)
+        placeholders = ', '.join('?' * len(keys))
+        return dict(self.repository._query(f'SELECT key, value FROM counters WHERE key IN ({placeholders})', keys))
+
+    def read_prefix(self, prefix):
+        # key の範囲検索で主キーのインデックスを使う
+        return dict(self.repository._query('SELECT key, value FROM counters WHERE key >= ? AND key < ?',
+                                           (prefix, prefix + '\uffff')))
+
+    def replace(self, values, prefixes):
+        self.repository.flush()
+        connection = self.repository._connection()
+        with connection:
+            for prefix in prefixes:
+                connection.execute('DELETE FROM counters WHERE key >= ? AND key < ?', (prefix, prefix + '\uffff'))
+            connection.executemany('INSERT INTO counters (key, value) VALUES (?, ?)', list(values.items()))
+
+# 変更履歴（ダッシュボードのライブ配信用）。連番の ID 順に読み出し、LIVE_FEED_RETENTION 件を超えた古いものは捨てる
+LIVE_FEED_RETENTION = int(os.getenv('LIVE_FEED_RETENTION', '1000'))
+
+class LocalChangeLog:
+    def __init__(self, retention=LIVE_FEED_RETENTION):
+        # 再起動後に古い Last-Event-ID で再接続されても取り違えないよう、ID は起動時刻（ミリ秒）から始める
+        self._next_id = int(time.time() * 1000)
+        self._changes = deque(maxlen=retention)
+        self._lock = threading.Lock()
+
+    def append(self, kind, payload):
+        with self._lock:
+            self._changes.append((self._next_id, kind, payload))
+            self._next_id += 1
+
+    def since(self, after_id, limit):
+        with self._lock:
+            return [change for change in self._changes if change[0] > after_id][:limit]
+
+    def bounds(self):
+        # (最古の ID, 最新の ID)。履歴が空なら最古は None
+        with self._lock:
+            oldest = self._changes[0][0] if self._changes else None
+            return oldest, self._next_id - 1
+
+class SQLiteChangeLog:
+    INSERT_CHANGE = 'INSERT INTO changes (kind, payload, created_at) VALUES (?, ?, ?)'
+    PRUNE_EVERY = 100
+
+    def __init__(self, repository, retention=LIVE_FEED_RETENTION):
+        self.repository = repository
+        self.retention = retention
+        self._appended = itertools.count(1)
+
+    def append(self, kind, payload):
+        # 書き込みバッファ経由。ID は反映時に SQLite が採番するため、全ワーカーで1本の連番になる
+        self.repository._write(self.INSERT_CHANGE, (kind, payload, time.time()))
+        if next(self._appended) % self.PRUNE_EVERY == 0:
+            self.repository._write('DELETE FROM changes WHERE id <= (SELECT MAX(id) FROM changes) - ?',
+                                   (self.retention,))
+
+    def since(self, after_id, limit):
+        return self.repository._query('SELECT id, kind, payload FROM changes WHERE id > ? ORDER BY id LIMIT ?',
+                                      (after_id, limit))
+
+    def bounds(self):
+        oldest, latest = self.repository._query('SELECT MIN(id), MAX(id) FROM changes')[0]
+        if latest is None:
+            # AUTOINCREMENT の採番は sqlite_sequence に残るため、全件削除後も ID は戻らない
+            rows = self.repository._query("SELECT seq FROM sqlite_sequence WHERE name = 'changes'")
+            latest = rows[0][0] if rows else 0
+        return oldest, latest
+
+# 記録の版番号: 欠勤報告・回答を書き込むたびに version:records を増やし、modified:records に時刻（秒）を残す。
+# 一覧・統計 API の ETag（304 の判定はこちらだけ）と、参考情報としての Last-Modified に使う
+RECORDS_VERSION_KEYS = ('version:records', 'modified:records')
+
+def touch_records(counters):
+    counters.increment({'version:records': 1})
+    counters.raise_to({'modified:records': int(time.time())})
+
+def seed_records_version(counters):
+    # 起動時に版番号を起動時刻（ミリ秒）まで進める。メモリの記録が消えた再起動や DB の作り直しの後に、
+    # 以前の ETag と同じ版番号を振らないため
+    counters.raise_to({'version:records': int(time.time() * 1000)})
+
+# update_absence_report の条件判定（両バックエンド共通）
+def report_matches(report, if_status=None, if_match=None):
+    if report is None or (if_status is not None and report['status'] not in if_status):
+        return False
+    return all(report.get(field) == value for field, value in (if_match or {}).items())
+
+class InMemoryRepository:
+    def __init__(self):
+        self.staff_data = {}
+        self.absence_reports = {}
+        self.substitute_requests = {}
+        self._indexes = {kind: RecordIndex() for kind in RECORD_KINDS}
+        # 一覧 API 用に、書き込み時に JSON へ変換したものを保持する
+        self._payloads = {kind: {} for kind in RECORD_KINDS}
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        self.counters = LocalCounters()
+        self.changes = LocalChangeLog()
+        seed_records_version(self.counters)
+
+    def _store(self, kind, record_id, record):
+        records = getattr(self, kind)
+        record = dict(record, id=record_id)
+        payload = json_dumps(record)
+        with self._lock:
+            previous = records.get(record_id)
+            if previous is not None:
+                self._indexes[kind].remove(previous)
+            records[record_id] = record
+            self._payloads[kind][record_id] = payload
+            self._indexes[kind].add(record)
+        touch_records(self.counters)
+
+    # スタッフ
+    def get_staff(self, staff_id):
+        return self.staff_data.get(staff_id)
+
+    def list_staff(self):
+        return list(self.staff_data.values())
+
+    def save_staff(self, staff):
+        self.staff_data[staff['id']] = staff
+
+    # 欠勤報告
+    def get_absence_report(self, report_id):
+        return self.absence_reports.get(report_id)
+
+    def save_absence_report(self, report_id, report):
+        self._store('absence_reports', report_id, report)
+
+    def update_absence_report(self, report_id, fields, if_status=None, if_match=None):
+        # if_status を指定すると、現在の status がその中にあるときだけ更新する（代替スタッフの確定など）。
+        # if_match は {項目: 期待値}。すべて一致するときだけ更新する（募集・お客様連絡の担当ワーカーの確保）
+        with self._update_lock:
+            report = self.absence_reports.get(report_id)
+            if not report_matches(report, if_status, if_match):
+                return None
+            self._store('absence_reports', report_id, dict(report, **fields))
+            return self.absence_reports[report_id]
+
+    def list_absence_reports(self):
+        return list(self.absence_reports.values())
+
+    # 代替出勤の回答
+    def save_substitute_request(self, request_id, substitute_request):
+        self._store('substitute_requests', request_id, substitute_request)
+
+    def get_substitute_request(self, request_id):
+        return self.substitute_requests.get(request_id)
+
+    def list_substitute_requests(self):
+        return list(self.substitute_requests.values())
+
+    # 一覧（ページング・絞り込み）
+    def query_records(self, kind, limit=LIST_PAGE_SIZE, before=None, **filters):
+        records = getattr(self, kind)
+        with self._lock:
+            return list(itertools.islice(self._indexes[kind].scan(records, before=before, **filters), limit))
+
+    def query_record_payloads(self, kind, limit=LIST_PAGE_SIZE, before=None, **filters):
+        # query_records と同じ並び・絞り込みで (timestamp, id, JSON) を返す
+        records, payloads = getattr(self, kind), self._payloads[kind]
+        with self._lock:
+            return [(record['timestamp'], record['id'], payloads[record['id']])
+                    for record in itertools.islice(self._indexes[kind].scan(records, before=before, **filters), limit)]
+
+    def flush(self):
+        pass
+
+class SQLiteRepository:
+    WRITE_BATCH_SIZE = int(os.getenv('SQLITE_WRITE_BATCH_SIZE', '100'))
+    FLUSH_INTERVAL = float(os.getenv('SQLITE_FLUSH_INTERVAL', '0.05'))
+
+    SCHEMA = [
+        'CREATE TABLE IF NOT EXISTS staff (id TEXT PRIMARY KEY, payload TEXT NOT NULL)',
+        '''CREATE TABLE IF NOT EXISTS absence_reports (
+            id TEXT PRIMARY KEY, staff_id TEXT NOT NULL, status TEXT NOT NULL,
+            timestamp TEXT NOT NULL, payload TEXT NOT NULL)''',
+        'CREATE INDEX IF NOT EXISTS idx_absence_reports_timestamp ON absence_reports (timestamp, id)',
+        'CREATE INDEX IF NOT EXISTS idx_absence_reports_staff ON absence_reports (staff_id, timestamp, id)',
+        'CREATE INDEX IF NOT EXISTS idx_absence_reports_status ON absence_reports (status, timestamp, id)',
+        '''CREATE TABLE IF NOT EXISTS substitute_requests (
+            id TEXT PRIMARY KEY, staff_id TEXT NOT NULL, status TEXT NOT NULL,
+            timestamp TEXT NOT NULL, payload TEXT NOT NULL)''',
+        'CREATE INDEX IF NOT EXISTS idx_substitute_requests_timestamp ON substitute_requests (timestamp, id)',
+        'CREATE INDEX IF NOT EXISTS idx_substitute_requests_staff ON substitute_requests (staff_id, timestamp, id)',
+        'CREATE INDEX IF NOT EXISTS idx_substitute_requests_status ON substitute_requests (status, timestamp, id)',
+        'CREATE TABLE IF NOT EXISTS processed_events (event_id TEXT PRIMARY KEY, received_at REAL NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS idx_processed_events_received ON processed_events (received_at)',
+        'CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL)',
+        '''CREATE TABLE IF NOT EXISTS changes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, payload TEXT NOT NULL,
+            created_at REAL NOT NULL)'''
+    ]
+
+    # SQL は定数文字列のみ使い、sqlite3 の接続ごとのステートメントキャッシュで再利用させる
+    UPSERT_STAFF = 'INSERT OR REPLACE INTO staff (id, payload) VALUES (?, ?)'
+    UPSERT_ABSENCE_REPORT = ('INSERT OR REPLACE INTO absence_reports (id, staff_id, status, timestamp, payload) '
+                             'VALUES (?, ?, ?, ?, ?)')
+    INSERT_PROCESSED_EVENT = 'INSERT OR IGNORE INTO processed_events (event_id, received_at) VALUES (?, ?)'
+    UPSERT_SUBSTITUTE_REQUEST = ('INSERT OR REPLACE INTO substitute_requests (id, staff_id, status, timestamp, payload) '
+                                 'VALUES (?, ?, ?, ?, ?)')
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        self._pending = []
+        self._flusher = None
+        self.counters = SQLiteCounters(self)
+        self.changes = SQLiteChangeLog(self)
+        connection = self._connection()
+        with connection:
+            for statement in self.SCHEMA:
+                connection.execute(statement)
+        seed_records_version(self.counters)
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False, cached_statements=256)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    # 書き込みはバッファに溜め、件数か経過時間でまとめて1トランザクションで反映する
+    def _write(self, statement, params):
+        with self._lock:
+            self._pending.append((statement, params))
+            full = len(self._pending) >= self.WRITE_BATCH_SIZE
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name='sqlite-flusher', daemon=True)
+                self._flusher.start()
+        if full:
+            self.flush()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.FLUSH_INTERVAL)
+            if self._pending:
+                try:
+                    self.flush()
+                except Exception as error:
+                    errors_total.inc('sqlite_write')
+                    print(f"SQLite 書き込みエラー: {error}")
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return
+            connection = self._connection()
+            with connection:
+                # 同じ SQL が続く区間ごとに executemany で流す（順序は保つ）
+                start = 0
+                for index in range(1, len(pending) + 1):
+                    if index == len(pending) or pending[index][0] != pending[start][0]:
+                        connection.executemany(pending[start][0], [params for _, params in pending[start:index]])
+                        start = index
+
+    def _query(self, statement, params=()):
+        # 自分の書き込みが読めるよう、読み込み前に未反映分を反映する
+        if self._pending:
+            self.flush()
+        return self._connection().execute(statement, params).fetchall()
+
+    # スタッフ
+    def get_staff(self, staff_id):
+        rows = self._query('SELECT payload FROM staff WHERE id = ?', (staff_id,))
+        return json_loads(rows[0][0]) if rows else None
+
+    def list_staff(self):
+        return [json_loads(payload) for payload, in self._query('SELECT payload FROM staff ORDER BY id')]
+
+    def save_staff(self, staff):
+        self._write(self.UPSERT_STAFF, (staff['id'], json_dumps(staff)))
+
+    # 欠勤報告
+    def get_absence_report(self, report_id):
+        rows = self._query('SELECT payload FROM absence_reports WHERE id = ?', (report_id,))
+        return json_loads(rows[0][0]) if rows else None
+
+    def save_absence_report(self, report_id, report):
+        report = dict(report, id=report_id)
+        self._write(self.UPSERT_ABSENCE_REPORT, (report_id, report['staff_id'], report['status'], report['timestamp'],
+                                                 json_dumps(report)))
+        touch_records(self.counters)
+
+    def update_absence_report(self, report_id, fields, if_status=None, if_match=None):
+        # 読み込みから書き込みまでを BEGIN IMMEDIATE で囲み、他のワーカープロセスの更新と直列化する
+        with self._update_lock:
+            self.flush()
+            connection = self._connection()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                rows = connection.execute('SELECT payload FROM absence_reports WHERE id = ?', (report_id,)).fetchall()
+                report = json_loads(rows[0][0]) if rows else None
+                if not report_matches(report, if_status, if_match):
+                    connection.rollback()
+                    return None
+                report.update(fields)
+                connection.execute(self.UPSERT_ABSENCE_REPORT,
+                                   (report_id, report['staff_id'], report['status'], report['timestamp'],
+                                    json_dumps(report)))
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+        touch_records(self.counters)
+        return report
+
+    def list_absence_reports(self):
+        return [json_loads(payload) for payload, in
+                self._query('SELECT payload FROM absence_reports ORDER BY timestamp, id')]
+
+    # 代替出勤の回答
+    def save_substitute_request(self, request_id, substitute_request):
+        substitute_request = dict(substitute_request, id=request_id)
+        self._write(self.UPSERT_SUBSTITUTE_REQUEST,
+                    (request_id, substitute_request['staff_id'], substitute_request['status'],
+                     substitute_request['timestamp'], json_dumps(substitute_request)))
+        touch_records(self.counters)
+
+    def get_substitute_request(self, request_id):
+        rows = self._query('SELECT payload FROM substitute_requests WHERE id = ?', (request_id,))
+        return json_loads(rows[0][0]) if rows else None
+
+    def list_substitute_requests(self):
+        return [json_loads(payload) for payload, in
+                self._query('SELECT payload FROM substitute_requests ORDER BY timestamp, id')]
+
+    # 一覧（ページング・絞り込み）
+    # 条件の組み合わせごとに SQL が固定されるため、ステートメントキャッシュが効く
+    def query_records(self, kind, limit=LIST_PAGE_SIZE, before=None, **filters):
+        statement, params = self._select_records(kind, 'payload', limit, before, **filters)
+        return [json_loads(payload) for payload, in self._query(statement, params)]
+
+    def query_record_payloads(self, kind, limit=LIST_PAGE_SIZE, before=None, **filters):
+        # payload 列は書き込み時の JSON なので、一覧 API はデコードせずにそのまま使う
+        return self._query(*self._select_records(kind, 'timestamp, id, payload', limit, before, **filters))
+
+    def _select_records(self, kind, columns, limit, before=None, staff_id=None, status=None,
+                        date_from=None, date_to=None):
+        if kind not in RECORD_KINDS:
+            raise ValueError(f'Unknown record kind: {kind}')
+        
+        clauses = []
+        params = []
+        if staff_id is not None:
+            clauses.append('staff_id = ?')
+            params.append(staff_id)
+        if status is not None:
+            clauses.append('status = ?')
+            params.append(status)
+        lower, upper = date_range_bounds(date_from, date_to)
+        if lower:
+            clauses.append('timestamp >= ?')
+            params.append(lower)
+        if upper:
+            clauses.append('timestamp < ?')
+            params.append(upper)
+        if before:
+            clauses.append('(timestamp, id) < (?, ?)')
+            params.extend(before)
+        
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ''
+        return f'SELECT {columns} FROM {kind} {where}ORDER BY timestamp DESC, id DESC LIMIT ?', params + [limit]
+
+    # 処理済み Webhook イベント（重複排除の永続化先。複数ワーカーで共有する）
+    def mark_event_processed(self, event_id):
+        self._write(self.INSERT_PROCESSED_EVENT, (event_id, time.time()))
+
+    def claim_event(self, event_id):
+        # 未登録なら登録して True。既に他のワーカーが処理していれば False
+        if self._pending:
+            self.flush()
+        connection = self._connection()
+        with connection:
+            return connection.execute(self.INSERT_PROCESSED_EVENT, (event_id, time.time())).rowcount == 1
+
+    def forget_event(self, event_id):
+        if self._pending:
+            self.flush()
+        connection = self._connection()
+        with connection:
+            connection.execute('DELETE FROM processed_events WHERE event_id = ?', (event_id,))
+
+    def prune_processed_events(self, before):
+        self._write('DELETE FROM processed_events WHERE received_at < ?', (before,))
+
+def create_repository(storage):
+    if storage.startswith('sqlite:///'):
+        return SQLiteRepository(storage[len('sqlite:///'):])
+    if storage.startswith('eventlog:///'):
+        from .eventlog import EventLogRepository
+        return EventLogRepository(storage[len('eventlog:///'):])
+    if storage == 'memory':
+        return InMemoryRepository()
+    raise ValueError(f'Unsupported LINEBOT_STORAGE: {storage}')
@@ -0,0 +1,85 @@
+# staff_linebot/templating.py
+
+import re
+import time
+
+from .metrics import template_seconds
+from .tenants import current_tenant, message_templates, tenants
+
+# メッセージテンプレート処理
+# テンプレートは固定文字列と差し込み変数の区切りリストに一度だけ変換し、編集されるまでキャッシュする
+TEMPLATE_PLACEHOLDER = re.compile(r'\{\{(\w+)\}\}')
+
+class TemplateError(ValueError):
+    pass
+
+class CompiledTemplate:
+    __slots__ = ('key', 'source', 'literals', 'slots', 'names', '_head', '_pairs')
+
+    def __init__(self, key, source):
+        parts = TEMPLATE_PLACEHOLDER.split(source)
+        self.key = key
+        self.source = source
+        self.literals = parts[0::2]
+        self.slots = parts[1::2]
+        self.names = frozenset(self.slots)
+        self._head = self.literals[0]
+        self._pairs = tuple(zip(self.slots, self.literals[1:]))
+
+    def render(self, variables):
+        # 全変数が揃い、かつ個数が一致すれば余分な変数もない
+        if len(variables) != len(self.names):
+            self._raise_mismatch(variables)
+        
+        pieces = [self._head]
+        append = pieces.append
+        try:
+            for name, literal in self._pairs:
+                append(str(variables[name]))
+                append(literal)
+        except KeyError:
+            self._raise_mismatch(variables)
+        return ''.join(pieces)
+
+    def _raise_mismatch(self, variables):
+        missing = sorted(self.names - variables.keys())
+        unknown = sorted(variables.keys() - self.names)
+        details = []
+        if missing:
+            details.append(f"未指定の変数: {', '.join(missing)}")
+        if unknown:
+            details.append(f"テンプレートにない変数: {', '.join(unknown)}")
+        raise TemplateError(f"テンプレート '{self.key}' の変数が一致しません ({' / '.join(details)})")
+
+# コンパイル済みテンプレートはテナントごとに持つ。描画時は dict の参照1回で、元のテンプレートは見に行かない
+def get_compiled_template(template_key):
+    tenant = current_tenant.get()
+    compiled = tenant.compiled_templates.get(template_key)
+    if compiled is None:
+        compiled = compile_tenant_template(tenant, template_key)
+    return compiled
+
+def compile_tenant_template(tenant, template_key):
+    source = tenant.templates.get(template_key)
+    if source is None:
+        raise TemplateError(f"テンプレート '{template_key}' が存在しません")
+    compiled = tenant.compiled_templates[template_key] = CompiledTemplate(template_key, source)
+    return compiled
+
+def update_template(template_key, source):
+    # 既定のテンプレートは上書きしていない全テナントが参照しているので、全テナントのキャッシュから捨てる。
+    # 変わるのはこのプロセスのテンプレートだけで保存もしないため、HTTP には出さない（テストと起動時の設定用）
+    message_templates[template_key] = source
+    for tenant in tenants:
+        tenant.invalidate_templates(template_key)
+
+# 1件の描画は数µs で計測のほうが高くつくため、ここでは計らない（一括描画とイベント処理時間で見る）
+def process_template(template_key, variables):
+    return get_compiled_template(template_key).render(variables)
+
+def render_template_batch(template_key, variables_list):
+    started = time.perf_counter()
+    render = get_compiled_template(template_key).render
+    messages = [render(variables) for variables in variables_list]
+    template_seconds.observe(time.perf_counter() - started, template_key)
+    return messages
@@ -0,0 +1,174 @@
+# staff_linebot/tenants.py
+
+import contextvars
+import json
+import os
+from collections import ChainMap
+from contextlib import contextmanager
+
+# LINE Bot設定
+LINE_BOT_A_ACCESS_TOKEN = os.getenv('LINE_BOT_A_ACCESS_TOKEN')
+LINE_BOT_A_CHANNEL_SECRET = os.getenv('LINE_BOT_A_CHANNEL_SECRET')
+LINE_BOT_B_ACCESS_TOKEN = os.getenv('LINE_BOT_B_ACCESS_TOKEN')
+LINE_BOT_B_CHANNEL_SECRET = os.getenv('LINE_BOT_B_CHANNEL_SECRET')
+
+# LINE_CHANNELS は既定のテナントのチャネル。他のテナントのチャネルは LINEBOT_TENANTS_FILE から読む
+LINE_CHANNELS = {
+    'bot_a': {'access_token': LINE_BOT_A_ACCESS_TOKEN, 'channel_secret': LINE_BOT_A_CHANNEL_SECRET},
+    'bot_b': {'access_token': LINE_BOT_B_ACCESS_TOKEN, 'channel_secret': LINE_BOT_B_CHANNEL_SECRET}
+}
+
+# メッセージテンプレート
+message_templates = {
+    'absence_notification': """【サポート窓口｜HAL】当日欠勤報告
+
+👤 スタッフ: {{staff_name}}
+📅 欠勤日: {{absence_date}}
+🕒 時間: {{absence_time}}
+💊 理由: {{absence_reason}}
+⏰ 報告時刻: {{report_time}}""",
+    
+    'emergency_notification': """【緊急】{{staff_name}}さん欠勤報告
+
+📋 詳細情報:
+- 欠勤日時: {{absence_date}} {{absence_time}}
+- 欠勤理由: {{absence_reason}}
+- 報告時刻: {{report_time}}
+- スタッフ電話: {{staff_phone}}
+
+⚡ 次の対応を実行中:
+✅ 代替スタッフ募集開始
+✅ 影響予約の確認
+✅ 顧客への連絡準備
+
+管理者による確認が必要です。
+管理画面: {{management_url}}""",
+    
+    'substitute_request': """【緊急】代替出勤のお願い
+
+👤 欠勤スタッフ: {{absent_staff_name}}
+📅 欠勤日: {{absence_date}}
+🕒 時間: {{absence_time}}
+💊 理由: {{absence_reason}}
+
+代わりに出勤していただけますか？
+
+✅ 出勤可能 → "代わりに出勤します"
+❌ 出勤不可 → "代わりに出勤できません"
+
+ご回答をお願いいたします。""",
+    
+    'customer_notification': """【重要】ご予約の振替について
+
+お客様: {{customer_name}}
+予約日時: {{appointment_date}} {{appointment_time}}
+担当スタッフ: {{absent_staff_name}}
+
+申し訳ございませんが、担当スタッフが急遽欠勤することになりました。
+
+代替スタッフ: {{substitute_staff_name}}が担当いたします。
+
+ご都合が悪い場合は、別日への振替も可能です。
+お手数ですが、ご連絡をお願いいたします。
+
+📞 お問い合わせ: {{salon_phone}}"""
+}
+
+salon_settings = {
+    'salon_name': 'HAL',
+    'salon_phone': '03-1234-5678',
+    'business_hours': '10:00-19:00',
+    'admin_line_id': '',
+    'substitute_allowance': 5000
+}
+
+# テナント（サロン）
+# 1プロセスで複数のサロンを受け持つ。テナントごとに LINE チャネル（Bot A / Bot B）、設定、テンプレート、
+# スタッフの店舗（StaffRecord.store）を持つ。既定のテナントは LINE_BOT_* の環境変数と salon_settings / message_templates。
+# LINEBOT_TENANTS_FILE（JSON）で追加のテナントを読み込む:
+#   {"shibuya": {"store": "shibuya",
+#                "bot_a": {"access_token": "...", "channel_secret": "...", "destination": "U..."},
+#                "bot_b": {"access_token": "..."},
+#                "settings": {"salon_name": "HAL 渋谷"}, "templates": {"customer_notification": "..."}}}
+# settings / templates は上書きする項目だけを書けばよい（残りは既定のテナントの値を ChainMap で参照する）
+LINEBOT_TENANTS_FILE = os.getenv('LINEBOT_TENANTS_FILE')
+DEFAULT_TENANT_ID = 'default'
+
+class Tenant:
+    def __init__(self, id, channels, store, settings, templates):
+        self.id = id
+        self.channels = channels
+        # store が None のテナント（既定）はスタッフを店舗で絞り込まない
+        self.store = store
+        self.settings = settings
+        self.templates = templates
+        # 描画時はここだけを引く。テンプレートを変えたら invalidate_templates() で捨てる
+        self.compiled_templates = {}
+
+    def invalidate_templates(self, template_key=None):
+        if template_key is None:
+            self.compiled_templates.clear()
+        else:
+            self.compiled_templates.pop(template_key, None)
+
+    @classmethod
+    def from_config(cls, tenant_id, config):
+        channels = {channel: dict(config.get(channel) or {}) for channel in LINE_CHANNELS}
+        return cls(tenant_id, channels, config.get('store') or tenant_id,
+                   ChainMap(dict(config.get('settings') or {}), salon_settings),
+                   ChainMap(dict(config.get('templates') or {}), message_templates))
+
+# テナント ID（/webhook/<tenant_id>/bot-a）と Webhook の destination（Bot のユーザー ID）からの引き当ては
+# どちらも dict の参照1回で、テナント数に依存しない
+class TenantRegistry:
+    def __init__(self, default):
+        self.default = default
+        self._tenants = {}
+        self._by_destination = {}
+        self.register(default)
+
+    def register(self, tenant):
+        # 読み込み直したテナントは、前の設定でコンパイルしたテンプレートを使わない
+        tenant.invalidate_templates()
+        self._tenants[tenant.id] = tenant
+        for channel in tenant.channels.values():
+            if channel.get('destination'):
+                self._by_destination[channel['destination']] = tenant
+
+    def load(self, path):
+        with open(path, encoding='utf-8') as tenants_file:
+            configs = json.load(tenants_file)
+        if DEFAULT_TENANT_ID in configs:
+            raise ValueError(f'{path}: テナント ID "{DEFAULT_TENANT_ID}" は環境変数の設定で予約されています')
+        for tenant_id, config in configs.items():
+            self.register(Tenant.from_config(tenant_id, config))
+
+    def get(self, tenant_id):
+        return self._tenants.get(tenant_id)
+
+    def for_destination(self, destination):
+        return self._by_destination.get(destination)
+
+    def resolve(self, tenant_id):
+        # 保存済みの記録の tenant から引く。未指定（テナント導入前の記録）や設定から消えたものは既定のテナント
+        return self._tenants.get(tenant_id) or self.default
+
+    def __len__(self):
+        return len(self._tenants)
+
+    def __iter__(self):
+        return iter(list(self._tenants.values()))
+
+tenants = TenantRegistry(Tenant(DEFAULT_TENANT_ID, LINE_CHANNELS, None, ChainMap(salon_settings),
+                                ChainMap(message_templates)))
+
+# 処理中のテナント。Webhook の受信時に設定し、イベントキュー・送信キュー・タイマーへは積んだ時点の値を引き継ぐ
+current_tenant = contextvars.ContextVar('current_tenant', default=tenants.default)
+
+@contextmanager
+def use_tenant(tenant):
+    token = current_tenant.set(tenant)
+    try:
+        yield tenant
+    finally:
+        current_tenant.reset(token)
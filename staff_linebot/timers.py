@@ -0,0 +1,69 @@
+# staff_linebot/timers.py
+
+import contextvars
+import itertools
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# タイマーホイール
+# 多数の募集の締め切りを1本のスレッドで管理する（tick 秒刻み、slots 個のバケツを循環）
+class TimerWheel:
+    def __init__(self, tick=1.0, slots=512):
+        self.tick = tick
+        self.slots = slots
+        self._buckets = [{} for _ in range(slots)]
+        self._timer_slots = {}
+        self._cursor = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._callbacks = ThreadPoolExecutor(max_workers=2, thread_name_prefix='timer-callback')
+
+    def schedule(self, delay, callback, *args):
+        # ticks 回目の tick で発火させる。ちょうど一周（slots の倍数）のとき、余分に一周待たないよう 1 を引いてから割る
+        ticks = max(1, math.ceil(delay / self.tick))
+        rounds, offset = divmod(ticks - 1, self.slots)
+        offset += 1
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='timer-wheel', daemon=True)
+                self._thread.start()
+            timer_id = next(self._ids)
+            slot = (self._cursor + offset) % self.slots
+            self._buckets[slot][timer_id] = [rounds, callback, args, contextvars.copy_context()]
+            self._timer_slots[timer_id] = slot
+            return timer_id
+
+    def cancel(self, timer_id):
+        with self._lock:
+            slot = self._timer_slots.pop(timer_id, None)
+            if slot is not None:
+                self._buckets[slot].pop(timer_id, None)
+
+    def _run(self):
+        next_tick = time.monotonic() + self.tick
+        while True:
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+            next_tick += self.tick
+            # コールバックは LINE 送信を伴うため、ホイールを止めないよう別スレッドで実行する
+            for _, callback, args, context in self._advance():
+                self._callbacks.submit(context.run, callback, *args)
+
+    def _advance(self):
+        # カーソルを1つ進め、期限が来たタイマーを返す
+        due = []
+        with self._lock:
+            self._cursor = (self._cursor + 1) % self.slots
+            bucket = self._buckets[self._cursor]
+            for timer_id, entry in list(bucket.items()):
+                if entry[0] == 0:
+                    del bucket[timer_id]
+                    self._timer_slots.pop(timer_id, None)
+                    due.append(entry)
+                else:
+                    entry[0] -= 1
+        return due
+
+timer_wheel = TimerWheel()
@@ -0,0 +1,116 @@
+# staff_linebot/webhook.py
+
+import os
+import re
+
+from . import state
+from .event_queue import EventQueue
+from .handlers import handle_bot_a_message
+from .json_codec import json_loads
+from .line_api import webhook_verifier
+from .metrics import errors_total, metrics, webhook_events_total
+from .outbound import line_sender
+from .tenants import tenants, use_tenant
+
+# Webhook イベント
+# 本文は1回だけ JSON 解析し、処理するイベント（テキストメッセージ）だけを SDK のモデルを作らずに取り出す
+class WebhookEvent:
+    __slots__ = ('event_id', 'user_id', 'text', 'reply_token', 'timestamp', 'is_redelivery')
+
+    def __init__(self, event_id, user_id, text, reply_token, timestamp, is_redelivery=False):
+        self.event_id = event_id
+        self.user_id = user_id
+        self.text = text
+        self.reply_token = reply_token
+        self.timestamp = timestamp
+        self.is_redelivery = is_redelivery
+
+def parse_webhook_events(body):
+    # 本文の形が不正なら ValueError
+    payload = json_loads(body)
+    events = payload.get('events') if isinstance(payload, dict) else None
+    if not isinstance(events, list):
+        raise ValueError('events がありません')
+    
+    parsed = []
+    for event in events:
+        if not isinstance(event, dict):
+            raise ValueError('イベントの形式が不正です')
+        event_type = event.get('type')
+        message = event.get('message')
+        if event_type == 'message' and isinstance(message, dict):
+            event_type = f"message/{message.get('type')}"
+        webhook_events_total.inc(str(event_type))
+        # follow / postback / スタンプなどは扱わないため、ここで捨てる
+        source = event.get('source') or {}
+        if not isinstance(source, dict):
+            raise ValueError('source の形式が不正です')
+        user_id = source.get('userId')
+        if event_type != 'message/text' or not user_id:
+            continue
+        # 後段はユーザー ID を辞書のキーに、本文を文字列として扱うので、ここで型を確かめる
+        text = message.get('text', '')
+        if not isinstance(user_id, str) or not isinstance(text, str):
+            raise ValueError('テキストメッセージの形式が不正です')
+        parsed.append(WebhookEvent(event.get('webhookEventId'), user_id, text,
+                                   event.get('replyToken'), event.get('timestamp'),
+                                   bool((event.get('deliveryContext') or {}).get('isRedelivery'))))
+    return parsed
+
+# LINE Bot A イベント振り分け（キューに積むのはテキストメッセージだけ）
+def dispatch_bot_a_event(event):
+    handle_bot_a_message(event)
+
+bot_a_events = EventQueue('bot-a', dispatch_bot_a_event)
+metrics.gauge('linebot_event_queue_depth', '処理待ちの Webhook イベント数',
+              lambda: {(bot_a_events.name,): bot_a_events.maxsize - bot_a_events.free_slots()}, ('queue',))
+
+# LINE Bot A Webhook処理
+# /webhook/<tenant_id>/bot-a はパスでテナントを決める。/webhook/bot-a は本文の destination（Bot のユーザー ID）で決め、
+# 登録されていなければ既定のテナント
+WEBHOOK_DESTINATION = re.compile(rb'"destination"\s*:\s*"([^"]+)"')
+WEBHOOK_DESTINATION_SCAN = 256
+# LINE の Webhook はこれより大きくならない。超えるものは本文を読む前に断る
+WEBHOOK_MAX_BYTES = int(os.getenv('WEBHOOK_MAX_BYTES', str(1024 * 1024)))
+
+def webhook_tenant(body):
+    # LINE は destination を本文の先頭に置くため、先頭だけを見て本文全体の JSON 解析を避ける
+    match = WEBHOOK_DESTINATION.search(body, 0, WEBHOOK_DESTINATION_SCAN)
+    if match is None:
+        try:
+            destination = json_loads(body).get('destination')
+        except (ValueError, AttributeError):
+            destination = None
+    else:
+        destination = match.group(1).decode('utf-8', 'replace')
+    return tenants.for_destination(destination) or tenants.default
+
+def receive_bot_a_webhook(tenant, body, signature):
+    verifier = webhook_verifier('bot_a', tenant)
+    if verifier is None:
+        return 'LINE Bot A not configured', 400
+    
+    # 署名は受信したバイト列のまま検証し、通ったものだけを解析する
+    if not verifier.verify(body, signature):
+        errors_total.inc('webhook_signature')
+        return 'Invalid signature', 400
+    try:
+        events = parse_webhook_events(body)
+    except ValueError:
+        errors_total.inc('webhook_request')
+        return 'Invalid body', 400
+    
+    # キューが溢れる場合は 503 を返し、LINE 側の再送に任せる
+    if bot_a_events.free_slots() < len(events) or not line_sender.accepts('confirmation'):
+        return 'Busy', 503
+    
+    # イベントはこのテナントのコンテキストごとキューに積む
+    with use_tenant(tenant):
+        for event in events:
+            if state.event_deduplicator.is_duplicate(event.event_id, event.is_redelivery):
+                continue
+            if not bot_a_events.submit(event):
+                state.event_deduplicator.forget(event.event_id)
+                return 'Busy', 503
+    
+    return 'OK'
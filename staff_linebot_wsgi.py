@@ -0,0 +1,9 @@
+# staff_linebot_wsgi.py
+# LINE Bot 統合機能（staff_linebot パッケージ）の WSGI エントリポイント
+#
+# gunicorn からはこのモジュールを指定する（ワーカーごとに読み込まれ、create_app() で状態を組み立てる）:
+#   gunicorn staff_linebot_wsgi:app        （設定は同じディレクトリの gunicorn.conf.py）
+
+from staff_linebot.app import create_app
+
+app = create_app()
@@ -0,0 +1,27 @@
+# tests/conftest.py
+
+import pytest
+
+from staff_linebot import state
+from staff_linebot.live_feed import LiveFeed
+from staff_linebot.staff import StaffDirectory, seed_sample_staff
+from staff_linebot.stats import StatsAggregator
+from staff_linebot.storage import InMemoryRepository
+
+
+@pytest.fixture
+def repository(monkeypatch):
+    # init_state() の代わりに、メモリ上の保存レイヤーとサンプルスタッフで state を組み立てる
+    repository = InMemoryRepository()
+    seed_sample_staff(repository)
+    staff_directory = StaffDirectory(repository)
+    staff_directory.load()
+    monkeypatch.setattr(state, 'repository', repository)
+    monkeypatch.setattr(state, 'staff_directory', staff_directory)
+    monkeypatch.setattr(state, 'stats', StatsAggregator(repository.counters))
+    monkeypatch.setattr(state, 'live_feed', LiveFeed(repository.changes))
+    return repository
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'timing: 実行環境の速さに左右される計測（-m "not timing" で除外できる）')
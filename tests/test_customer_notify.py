@@ -0,0 +1,165 @@
+# tests/test_customer_notify.py
+# お客様への振替連絡（API の管理トークン・予約の検証、送信中に落ちた配信の再開と引き継ぎ）
+
+from concurrent.futures import Future
+
+import pytest
+from flask import Flask
+
+from staff_linebot import customer_notify, routes
+from staff_linebot.customer_notify import customer_notifier
+
+ADMIN = {'Authorization': 'Bearer admin-token'}
+APPOINTMENT = {'id': 'A1', 'name': '鈴木 一郎', 'line_id': 'C1', 'appointment_date': '2024-06-01',
+               'appointment_time': '11:00'}
+
+
+@pytest.fixture
+def client(repository, monkeypatch):
+    monkeypatch.setattr(routes, 'LINEBOT_ADMIN_TOKEN', 'admin-token')
+    repository.save_absence_report('R1', {
+        'staff_id': 'U1234567890', 'staff_name': '田中 美咲', 'timestamp': '2024-05-31T20:00:00',
+        'absence_data': {'date': '2024-06-01', 'time': '終日', 'reason': '体調不良'},
+        'status': 'filled', 'substitute_staff_id': 'U2345678901'
+    })
+    app = Flask(__name__)
+    app.register_blueprint(routes.linebot_bp)
+    return app.test_client()
+
+
+@pytest.fixture
+def notified(monkeypatch):
+    notified = []
+    def notify(report_id, appointments, substitute_info):
+        notified.append(appointments)
+        return {'status': 'completed', 'sent': len(appointments)}
+    monkeypatch.setattr(customer_notifier, 'notify', notify)
+    return notified
+
+
+def post(client, json, headers=ADMIN):
+    return client.post('/api/line-bot/absence-reports/R1/customer-notifications', json=json, headers=headers)
+
+
+def test_routes_require_the_admin_token(client, notified):
+    url = '/api/line-bot/absence-reports/R1/customer-notifications'
+
+    assert client.post(url, json={'appointments': [APPOINTMENT]}).status_code == 401
+    assert client.get(url).status_code == 401
+    assert client.get(url, headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert notified == []
+
+
+def test_routes_are_disabled_without_an_admin_token(client, notified, monkeypatch):
+    monkeypatch.setattr(routes, 'LINEBOT_ADMIN_TOKEN', None)
+
+    assert post(client, {'appointments': [APPOINTMENT]}).status_code == 404
+    assert notified == []
+
+
+def test_valid_appointments_are_notified(client, notified):
+    response = post(client, {'appointments': [APPOINTMENT]})
+
+    assert response.status_code == 200
+    assert notified == [[APPOINTMENT]]
+
+
+def test_appointments_default_to_the_absent_staff_bookings(client, notified):
+    assert post(client, {}).status_code == 200
+    assert [appointment['id'] for appointment in notified[0]] == ['A1001', 'A1002']
+
+
+@pytest.mark.parametrize('body', [
+    ['A1'],
+    {'appointments': 'A1'},
+    {'appointments': {'A1': APPOINTMENT}},
+    {'appointments': ['A1']},
+    {'appointments': [dict(APPOINTMENT, line_id=None)]},
+    {'appointments': [dict(APPOINTMENT, id=1)]},
+    {'appointments': [{key: value for key, value in APPOINTMENT.items() if key != 'appointment_time'}]},
+])
+def test_malformed_bodies_are_rejected(client, notified, body):
+    response = post(client, body)
+
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+    assert notified == []
+
+
+class FakeSender:
+    def __init__(self, on_submit=None):
+        self.sent = []
+        self.on_submit = on_submit
+
+    def submit(self, channel, method, line_id, message, template_key='text', priority='confirmation', retry_key=None):
+        self.sent.append(line_id)
+        if self.on_submit:
+            self.on_submit()
+        future = Future()
+        future.set_result(None)
+        return future
+
+
+@pytest.fixture
+def sender(monkeypatch):
+    def install(**kwargs):
+        fake = FakeSender(**kwargs)
+        monkeypatch.setattr(customer_notify, 'line_sender', fake)
+        monkeypatch.setattr(customer_notify, 'line_channel_configured', lambda channel: True)
+        monkeypatch.setattr(customer_notify, 'text_message', lambda text: text)
+        return fake
+    return install
+
+
+def save_interrupted_delivery(repository):
+    # 1件目を送ったところで担当ワーカーが落ちた
+    customers = {}
+    for index, status in enumerate(('sent', 'pending', 'pending'), 1):
+        customers[f'A{index}'] = {'appointment': dict(APPOINTMENT, id=f'A{index}', line_id=f'C{index}'),
+                                  'status': status, 'attempts': int(status == 'sent'), 'error': None, 'sent_at': None}
+    repository.save_absence_report('R1', {
+        'staff_id': 'U1234567890', 'staff_name': '田中 美咲', 'timestamp': '2024-05-31T20:00:00',
+        'absence_data': {'date': '2024-06-01', 'time': '終日', 'reason': '体調不良'}, 'status': 'filled',
+        'customer_notifications': {'status': 'sending', 'substitute_staff_id': 'U2345678901',
+                                   'substitute_staff_name': '佐藤 健太', 'started_at': '2024-05-31T21:00:00',
+                                   'customers': customers},
+        'customer_notifications_claim': 'stopped-worker'
+    })
+
+
+def test_resume_sends_only_the_unsent_customers(repository, sender):
+    save_interrupted_delivery(repository)
+    fake = sender()
+
+    assert customer_notifier.resume() == ['R1']
+    assert fake.sent == ['C2', 'C3']
+    report = repository.get_absence_report('R1')
+    assert report['customer_notifications_claim'] != 'stopped-worker'
+    assert report['customer_notifications']['status'] == 'completed'
+    assert {customer['status'] for customer in report['customer_notifications']['customers'].values()} == {'sent'}
+
+
+def test_resume_skips_finished_deliveries(repository, sender):
+    save_interrupted_delivery(repository)
+    report = repository.get_absence_report('R1')
+    repository.update_absence_report('R1', {'customer_notifications': dict(report['customer_notifications'],
+                                                                            status='partial')})
+    fake = sender()
+
+    assert customer_notifier.resume() == []
+    assert fake.sent == []
+
+
+def test_losing_the_claim_stops_saving(repository, sender):
+    save_interrupted_delivery(repository)
+    # 送信中に別のワーカーが同じ配信を引き継ぐ
+    fake = sender(on_submit=lambda: repository.update_absence_report('R1', {'customer_notifications_claim': 'other-worker'}))
+
+    customer_notifier.resume()
+
+    assert fake.sent == ['C2', 'C3']
+    report = repository.get_absence_report('R1')
+    assert report['customer_notifications_claim'] == 'other-worker'
+    # 手放した処理の送信結果は、保存された配信記録に混ざらない
+    assert report['customer_notifications']['status'] == 'sending'
+    assert customer_notifier.summary(report['customer_notifications'])['pending'] == 2
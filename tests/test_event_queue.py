@@ -0,0 +1,103 @@
+# tests/test_event_queue.py
+# 再送イベントの重複排除（TTL・件数上限・キューに積めなかったイベントの取り消し）
+
+import pytest
+
+from staff_linebot import event_queue, state, webhook
+from staff_linebot.event_queue import EventDeduplicator
+from staff_linebot.json_codec import json_dumps
+from staff_linebot.storage import SQLiteRepository
+from staff_linebot.tenants import tenants
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(event_queue.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_duplicate_within_ttl(clock):
+    deduplicator = EventDeduplicator(ttl=60, max_entries=10)
+
+    assert deduplicator.is_duplicate('e1') is False
+    clock[0] += 59
+    assert deduplicator.is_duplicate('e1') is True
+    assert deduplicator.stats()['hits'] == 1
+
+
+def test_expired_entries_are_evicted(clock):
+    deduplicator = EventDeduplicator(ttl=60, max_entries=10)
+    deduplicator.is_duplicate('e1')
+    deduplicator.is_duplicate('e2')
+
+    clock[0] += 61
+    assert deduplicator.is_duplicate('e1') is False
+    # e1 を記録し直したときに、期限切れの e2 は先頭から捨てられる
+    assert deduplicator.stats()['entries'] == 1
+    assert deduplicator.evictions == 1
+
+
+def test_least_recently_seen_entry_is_evicted_at_capacity(clock):
+    deduplicator = EventDeduplicator(ttl=60, max_entries=2)
+    deduplicator.is_duplicate('e1')
+    deduplicator.is_duplicate('e2')
+    # e1 を参照すると最後尾に移り、上限を超えたときに e2 が先に捨てられる
+    assert deduplicator.is_duplicate('e1') is True
+    deduplicator.is_duplicate('e3')
+
+    assert deduplicator.is_duplicate('e1') is True
+    assert deduplicator.is_duplicate('e2') is False
+
+
+def test_events_without_id_are_never_duplicates():
+    deduplicator = EventDeduplicator()
+
+    assert deduplicator.is_duplicate(None) is False
+    assert deduplicator.is_duplicate(None) is False
+    assert deduplicator.stats()['entries'] == 0
+
+
+def test_redelivery_is_claimed_through_the_shared_store(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / 'linebot.db'))
+    first_worker = EventDeduplicator(backing=repository)
+    second_worker = EventDeduplicator(backing=repository)
+
+    assert first_worker.is_duplicate('e1') is False
+    repository.flush()
+    # 別のワーカーに届いた再送は、共有ストアで処理済みと分かる
+    assert second_worker.is_duplicate('e1', is_redelivery=True) is True
+
+    first_worker.forget('e1')
+    assert EventDeduplicator(backing=repository).is_duplicate('e1', is_redelivery=True) is False
+
+
+class RejectingQueue:
+    maxsize = 10
+
+    def free_slots(self):
+        return self.maxsize
+
+    def submit(self, item):
+        return False
+
+
+class AcceptingVerifier:
+    def verify(self, body, signature):
+        return True
+
+
+def test_failed_enqueue_forgets_the_event_id(monkeypatch):
+    deduplicator = EventDeduplicator()
+    monkeypatch.setattr(state, 'event_deduplicator', deduplicator)
+    monkeypatch.setattr(webhook, 'bot_a_events', RejectingQueue())
+    monkeypatch.setattr(webhook, 'webhook_verifier', lambda channel, tenant: AcceptingVerifier())
+    body = json_dumps({'destination': 'Ubot', 'events': [{
+        'type': 'message', 'webhookEventId': 'e1', 'replyToken': 'r1', 'timestamp': 0,
+        'source': {'type': 'user', 'userId': 'U1'}, 'message': {'type': 'text', 'text': '休みます'},
+        'deliveryContext': {'isRedelivery': False}
+    }]}).encode()
+
+    assert webhook.receive_bot_a_webhook(tenants.default, body, 'signature') == ('Busy', 503)
+    # LINE の再送を重複として捨てないよう、記録は取り消されている
+    assert deduplicator.is_duplicate('e1', is_redelivery=True) is False
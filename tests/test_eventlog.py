@@ -0,0 +1,112 @@
+# tests/test_eventlog.py
+# イベントログの復元（書き込み途中で止まった行・スナップショット前の停止・再起動時のセグメント・fields イベント）
+
+import os
+
+from staff_linebot.eventlog import EventLog, EventLogRepository
+
+
+def absence_report(status='reported'):
+    return {
+        'staff_id': 'U1',
+        'staff_name': '田中',
+        'absence_data': {'date': '2024-01-20', 'time': '10:00', 'reason': '風邪'},
+        'timestamp': '2024-01-19T10:00:00',
+        'status': status
+    }
+
+
+def open_repository(directory):
+    return EventLogRepository(str(directory))
+
+
+def close(repository):
+    repository.event_log.close()
+
+
+def segments(directory):
+    return sorted(name for name in os.listdir(directory) if name.startswith(EventLog.SEGMENT_PREFIX))
+
+
+def snapshots(directory):
+    return sorted(name for name in os.listdir(directory) if name.startswith(EventLog.SNAPSHOT_PREFIX))
+
+
+def test_torn_tail_line_is_skipped(tmp_path):
+    repository = open_repository(tmp_path)
+    repository.save_absence_report('r1', absence_report())
+    repository.save_absence_report('r2', absence_report())
+    close(repository)
+    # 書き込み途中で止まった行（改行なし・壊れた JSON）
+    with open(tmp_path / segments(tmp_path)[-1], 'ab') as segment_file:
+        segment_file.write(b'{"seq": 3, "type": "absence_rep')
+
+    repository = open_repository(tmp_path)
+    assert sorted(repository.absence_reports) == ['r1', 'r2']
+    repository.save_absence_report('r3', absence_report())
+    close(repository)
+
+    # 壊れた行の後に追記したイベントも次の起動で読める
+    repository = open_repository(tmp_path)
+    assert sorted(repository.absence_reports) == ['r1', 'r2', 'r3']
+    assert [event['seq'] for event in repository.event_log.events()] == [1, 2, 3]
+    close(repository)
+
+
+def test_snapshot_rotation_without_snapshot_file_replays_segments(tmp_path):
+    repository = open_repository(tmp_path)
+    repository.save_absence_report('r1', absence_report())
+    repository.event_log.snapshot()
+    repository.save_absence_report('r2', absence_report())
+    close(repository)
+    assert len(segments(tmp_path)) == 2
+
+    # セグメントを切り替えた後、スナップショットを書く前に止まった
+    for name in snapshots(tmp_path):
+        os.remove(tmp_path / name)
+
+    repository = open_repository(tmp_path)
+    assert sorted(repository.absence_reports) == ['r1', 'r2']
+    close(repository)
+
+
+def test_restart_truncates_segment_left_with_only_a_torn_line(tmp_path):
+    repository = open_repository(tmp_path)
+    repository.save_absence_report('r1', absence_report())
+    close(repository)
+    # 次に使うセグメントに、書き込み途中の行だけが残っている
+    torn = tmp_path / f'{EventLog.SEGMENT_PREFIX}{2:016d}{EventLog.SEGMENT_SUFFIX}'
+    torn.write_bytes(b'{"seq": 2, "type": "absence_rep')
+
+    repository = open_repository(tmp_path)
+    assert sorted(repository.absence_reports) == ['r1']
+    assert torn.read_bytes() == b''
+    repository.save_absence_report('r2', absence_report())
+    close(repository)
+
+    repository = open_repository(tmp_path)
+    assert sorted(repository.absence_reports) == ['r1', 'r2']
+    assert [event['seq'] for event in repository.event_log.events()] == [1, 2]
+    close(repository)
+
+
+def test_fields_events_are_replayed_onto_the_record(tmp_path):
+    repository = open_repository(tmp_path)
+    repository.save_absence_report('r1', absence_report())
+    repository.update_absence_report('r1', {'status': 'recruiting', 'recruitment': {'waves': 1}})
+    repository.update_absence_report('r1', {'status': 'filled', 'substitute_staff_id': 'U2'},
+                                     if_status=('recruiting',))
+    # 条件に合わない更新は記録されない
+    assert repository.update_absence_report('r1', {'status': 'unfilled'}, if_status=('recruiting',)) is None
+    close(repository)
+
+    repository = open_repository(tmp_path)
+    report = repository.get_absence_report('r1')
+    assert report['status'] == 'filled'
+    assert report['substitute_staff_id'] == 'U2'
+    assert report['recruitment'] == {'waves': 1}
+    assert report['staff_name'] == '田中'
+    assert [event['type'] for event in repository.event_log.events()] == [
+        'absence_reported', 'substitute_requested', 'substitute_filled']
+    assert [report['id'] for report in repository.query_records('absence_reports', status='filled')] == ['r1']
+    close(repository)
@@ -0,0 +1,31 @@
+# tests/test_import_budget.py
+# 起動時間の予算チェック（scripts/linebot-import-budget.py）をテストから呼ぶ
+
+import importlib.util
+import os
+
+import pytest
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts',
+                           'linebot-import-budget.py')
+
+
+@pytest.fixture(scope='module')
+def budget():
+    spec = importlib.util.spec_from_file_location('linebot_import_budget', SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_deferred_modules_are_not_imported_at_startup(budget):
+    _, _, modules = budget.measure()
+
+    assert not set(budget.DEFERRED_MODULES) & modules
+
+
+@pytest.mark.timing
+def test_import_time_is_within_budget(budget):
+    failures = budget.check(float(os.getenv('LINEBOT_IMPORT_BUDGET_MS', '250')), runs=3)
+
+    assert failures == []
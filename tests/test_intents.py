@@ -0,0 +1,65 @@
+# tests/test_intents.py
+# メッセージ解析（拒否を受諾より優先・欠勤理由と日付の位置）
+
+from datetime import date
+
+import pytest
+
+from staff_linebot.intents import ABSENCE_REASONS, INTENT_KEYWORDS, IntentClassifier
+
+
+@pytest.fixture
+def classifier():
+    return IntentClassifier(INTENT_KEYWORDS, ABSENCE_REASONS)
+
+
+@pytest.mark.parametrize('message', ['代わりに出勤できません', '代わりは無理です、すみません', '代わりに行けません'])
+def test_decline_wins_over_accept_keywords(classifier, message):
+    # 「出勤」「行け」は受諾の語でもあるが、拒否の語があれば拒否として扱う
+    assert classifier.classify(message)['type'] == 'substitute_decline'
+
+
+@pytest.mark.parametrize('message', ['代わりに出勤します', '代わりに行けます', '代わり大丈夫です'])
+def test_accept(classifier, message):
+    assert classifier.classify(message)['type'] == 'substitute_accept'
+
+
+def test_answers_without_substitute_keyword_are_unknown(classifier):
+    assert classifier.classify('出勤できません')['type'] == 'unknown'
+
+
+def test_absence_report_spans_point_at_reason_and_date(classifier):
+    message = '3月15日は風邪で休みます'
+    analysis = classifier.classify(message)
+
+    assert analysis['type'] == 'absence_report'
+    assert analysis['data']['reason'] == '風邪'
+    assert analysis['data']['date'] == f'{date.today().year}-03-15'
+    reason_start, reason_end = analysis['spans']['reason']
+    date_start, date_end = analysis['spans']['date']
+    assert message[reason_start:reason_end] == '風邪'
+    assert message[date_start:date_end] == '3月15日'
+
+
+def test_absence_report_without_reason_or_date_has_no_spans(classifier):
+    analysis = classifier.classify('今日は休みます')
+
+    assert analysis['data']['reason'] == '体調不良'
+    assert analysis['data']['date'] == date.today().isoformat()
+    assert analysis['spans'] == {'reason': None, 'date': None}
+
+
+def test_unknown_category_is_rejected():
+    with pytest.raises(ValueError):
+        IntentClassifier({'greeting': ['こんにちは']}, ABSENCE_REASONS)
+
+
+def test_ascii_keywords_match_case_insensitively():
+    classifier = IntentClassifier({'absence': ['Sick'], 'substitute': ['cover'], 'accept': ['OK'],
+                                   'decline': ['NG']}, [('Fever', '発熱')])
+    analysis = classifier.classify('SICK with fever today')
+
+    assert analysis['type'] == 'absence_report'
+    assert analysis['data']['reason'] == '発熱'
+    assert classifier.classify('Cover ok')['type'] == 'substitute_accept'
+    assert classifier.classify('cover? ng')['type'] == 'substitute_decline'
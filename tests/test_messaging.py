@@ -0,0 +1,79 @@
+# tests/test_messaging.py
+# 一斉送信の分割再送（宛先不正のバッチは1名まで切り分け、他の失敗は送信レイヤーの再送に任せる）
+
+from concurrent.futures import Future
+
+import pytest
+from linebot.exceptions import LineBotApiError
+from linebot.models.error import Error
+
+from staff_linebot import messaging
+
+
+class FakeSender:
+    def __init__(self, bad_ids=(), transient_failures=0):
+        self.bad_ids = set(bad_ids)
+        self.transient_failures = transient_failures
+        self.calls = []
+
+    def submit(self, channel, method, batch, message, template_key='text', priority='confirmation'):
+        self.calls.append(list(batch))
+        future = Future()
+        if self.bad_ids & set(batch):
+            future.set_exception(LineBotApiError(400, {}, error=Error(message='The property, \'to\', is invalid')))
+        elif self.transient_failures:
+            self.transient_failures -= 1
+            future.set_exception(LineBotApiError(500, {}, error=Error(message='Internal server error')))
+        else:
+            future.set_result(None)
+        return future
+
+
+@pytest.fixture
+def sender(monkeypatch):
+    def install(**kwargs):
+        fake = FakeSender(**kwargs)
+        monkeypatch.setattr(messaging, 'line_sender', fake)
+        monkeypatch.setattr(messaging, 'line_channel_configured', lambda channel: True)
+        monkeypatch.setattr(messaging, 'text_message', lambda text: text)
+        return fake
+    return install
+
+
+def test_one_bad_id_in_a_full_batch_fails_only_that_id(sender):
+    user_ids = [f'U{i:032d}' for i in range(messaging.MULTICAST_BATCH_SIZE)]
+    bad_id = user_ids[137]
+    fake = sender(bad_ids=[bad_id])
+
+    result = messaging.multicast_bot_a_message(user_ids, '代わりに出勤できますか')
+
+    assert result['failed'] == 1
+    assert result['sent'] == len(user_ids) - 1
+    assert result['recipients'][bad_id]['status'] == 'failed'
+    assert result['recipients'][bad_id]['error'].startswith('400')
+    # 1名になるまで分割する（500名なら 1 + 9 段）
+    assert [bad_id] in fake.calls
+    assert max(recipient['attempts'] for recipient in result['recipients'].values()) <= 10
+
+
+def test_several_bad_ids_are_isolated(sender):
+    user_ids = [f'U{i}' for i in range(64)]
+    sender(bad_ids=[user_ids[0], user_ids[40]])
+
+    result = messaging.multicast_bot_a_message(user_ids, 'msg')
+
+    assert sorted(user_id for user_id, recipient in result['recipients'].items()
+                  if recipient['status'] == 'failed') == [user_ids[0], user_ids[40]]
+    assert result['sent'] == 62
+
+
+def test_transient_errors_are_not_resent_here(sender):
+    user_ids = [f'U{i}' for i in range(10)]
+    fake = sender(transient_failures=1)
+
+    result = messaging.multicast_bot_a_message(user_ids, 'msg')
+
+    # 送信レイヤーが再送し尽くした後の失敗なので、分割も再送もしない
+    assert result['failed'] == 10
+    assert result['recipients'][user_ids[0]]['error'].startswith('500')
+    assert fake.calls == [user_ids]
@@ -0,0 +1,139 @@
+# tests/test_outbound.py
+# 送信レイヤーの再送（429 と Retry-After）と、優先度ごとのバックプレッシャー
+
+import time
+
+import pytest
+from linebot.exceptions import LineBotApiError
+from linebot.models.error import Error
+
+from staff_linebot import outbound
+from staff_linebot.outbound import OutboundQueueFull, OutboundSender
+
+
+class FakeClient:
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def multicast(self, to, message, retry_key=None):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+def line_error(status_code, headers=None, accepted_request_id=None):
+    return LineBotApiError(status_code, headers or {}, accepted_request_id=accepted_request_id,
+                           error=Error(message='error'))
+
+
+@pytest.fixture
+def sender(monkeypatch):
+    sender = OutboundSender({'bot_a': 1}, {'bot_a': 100}, maxsize=10, max_retries=2)
+    # ワーカーを起動せず、キューから取り出して _process を手で呼ぶ
+    monkeypatch.setattr(sender, 'start', lambda: None)
+    return sender
+
+
+@pytest.fixture
+def client(monkeypatch):
+    def install(*errors):
+        fake = FakeClient(errors)
+        monkeypatch.setattr(outbound, 'line_client', lambda channel, tenant=None: fake)
+        return fake
+    return install
+
+
+def process_next(sender):
+    _, _, job = sender._queues['bot_a'].get_nowait()
+    sender._process(job)
+    return job
+
+
+def test_429_waits_for_retry_after_and_pauses_the_channel(sender, client):
+    client(line_error(429, {'Retry-After': '3'}))
+    future = sender.submit('bot_a', 'multicast', ['U1'], 'msg')
+    job = process_next(sender)
+
+    assert not future.done()
+    [(due, _, delayed)] = sender._delayed
+    assert delayed is job
+    assert due - time.monotonic() == pytest.approx(3, abs=0.5)
+    # バケツを空にして、Retry-After の間はチャネル全体の送信を止める
+    assert sender._bucket(job)._tokens <= -3 * 100 + 1
+    assert sender.stats()['priorities']['confirmation']['retried'] == 1
+
+
+def test_retry_after_is_read_case_insensitively():
+    assert outbound.retry_after_seconds(line_error(429, {'retry-after': '7'})) == 7
+    assert outbound.retry_after_seconds(line_error(429, {'Retry-After': 'soon'})) is None
+    assert outbound.retry_after_seconds(RuntimeError('boom')) is None
+
+
+def test_retried_job_succeeds(sender, client):
+    fake = client(line_error(500))
+    future = sender.submit('bot_a', 'multicast', ['U1'], 'msg')
+    job = process_next(sender)
+    sender._delayed.clear()
+    sender._enqueue(job)
+    process_next(sender)
+
+    assert future.result(timeout=0) == 'ok'
+    assert fake.calls == 2
+    assert sender.queued()['confirmation'] == 0
+
+
+def test_retries_stop_after_max_retries(sender, client):
+    client(*[line_error(503) for _ in range(3)])
+    future = sender.submit('bot_a', 'multicast', ['U1'], 'msg')
+    for _ in range(3):
+        job = process_next(sender)
+        sender._delayed.clear()
+        if not future.done():
+            sender._enqueue(job)
+
+    assert future.exception(timeout=0).status_code == 503
+    assert job['attempts'] == 3
+    assert sender.stats()['priorities']['confirmation']['failed'] == 1
+
+
+def test_client_errors_are_not_retried(sender, client):
+    client(line_error(400))
+    future = sender.submit('bot_a', 'multicast', ['U1'], 'msg')
+    process_next(sender)
+
+    assert future.exception(timeout=0).status_code == 400
+    assert sender._delayed == []
+
+
+def test_conflict_with_accepted_request_id_counts_as_sent(sender, client):
+    # retry_key 付きの再送が、前回の送信で既に受理されていた
+    client(line_error(409, accepted_request_id='req-1'))
+    future = sender.submit('bot_a', 'multicast', ['U1'], 'msg')
+    process_next(sender)
+
+    assert future.result(timeout=0) is None
+
+
+@pytest.mark.parametrize('depth, accepting', [
+    (7, {'emergency': True, 'customer': True, 'confirmation': True}),
+    (8, {'emergency': True, 'customer': True, 'confirmation': False}),
+    (10, {'emergency': True, 'customer': False, 'confirmation': False}),
+])
+def test_backpressure_sheds_confirmations_first(sender, depth, accepting):
+    sender._depth['emergency'] = depth
+
+    assert {priority: sender.accepts(priority) for priority in outbound.OUTBOUND_PRIORITIES} == accepting
+    assert sender.stats()['queue']['accepting'] == accepting
+
+
+def test_submit_rejects_when_the_priority_is_shed(sender):
+    sender._depth['emergency'] = 8
+
+    with pytest.raises(OutboundQueueFull):
+        sender.submit('bot_a', 'multicast', ['U1'], 'msg', priority='confirmation')
+    assert sender.submit('bot_a', 'multicast', ['U1'], 'msg', priority='customer') is not None
+    metrics = sender.stats()['priorities']
+    assert metrics['confirmation']['rejected'] == 1
+    assert metrics['customer']['submitted'] == 1
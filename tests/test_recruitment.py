@@ -0,0 +1,135 @@
+# tests/test_recruitment.py
+# 募集中のまま残った欠勤報告の引き継ぎ（起動時の resume と締め切り後の _take_over）
+
+import time
+
+import pytest
+
+from staff_linebot import recruitment, state
+from staff_linebot.recruitment import RecruitmentScheduler
+from staff_linebot.staff import StaffRecord
+
+ABSENT_ID = 'U1234567890'
+ASKED_ID = 'U2345678901'
+NEXT_ID = 'U3456789012'
+
+
+class FakeWheel:
+    def __init__(self):
+        self.timers = {}
+        self._next_id = 0
+
+    def schedule(self, delay, callback, *args):
+        self._next_id += 1
+        self.timers[self._next_id] = (delay, callback, args)
+        return self._next_id
+
+    def cancel(self, timer_id):
+        self.timers.pop(timer_id, None)
+
+    def fire(self, timer_id):
+        _, callback, args = self.timers.pop(timer_id)
+        callback(*args)
+
+
+@pytest.fixture
+def wheel(monkeypatch):
+    wheel = FakeWheel()
+    monkeypatch.setattr(recruitment, 'timer_wheel', wheel)
+    return wheel
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    sent = []
+    def multicast(user_ids, message, template_key='text'):
+        sent.append(list(user_ids))
+        return {'sent': len(user_ids), 'failed': 0}
+    monkeypatch.setattr(recruitment, 'multicast_bot_a_message', multicast)
+    return sent
+
+
+def save_stale_report(repository, report_id='R1'):
+    # 第1波を送った担当ワーカーが、締め切りを過ぎたまま止まっている
+    repository.save_absence_report(report_id, {
+        'staff_id': ABSENT_ID,
+        'staff_name': '田中 美咲',
+        'absence_data': {'date': '2024-06-01', 'time': '終日', 'reason': '体調不良'},
+        'timestamp': '2024-05-31T20:00:00',
+        'status': 'recruiting',
+        'recruitment': {'status': 'recruiting', 'waves': 1, 'asked': [ASKED_ID], 'current_wave': [ASKED_ID],
+                        'declined': [], 'sent': 1, 'failed': 0, 'deadline': time.time() - 1},
+        'recruitment_claim': 'stopped-worker'
+    })
+
+
+def test_resume_watches_recruiting_reports(repository, wheel, sent):
+    save_stale_report(repository)
+    scheduler = RecruitmentScheduler(wave_size=1)
+
+    assert scheduler.resume() == ['R1']
+    [(delay, callback, args)] = wheel.timers.values()
+    assert callback == scheduler._take_over
+    assert delay == pytest.approx(recruitment.RECRUIT_RESUME_GRACE, abs=1)
+    assert sent == []
+
+
+def test_take_over_continues_with_the_next_wave(repository, wheel, sent):
+    save_stale_report(repository)
+    scheduler = RecruitmentScheduler(wave_size=1)
+    scheduler.resume()
+    wheel.fire(next(iter(wheel.timers)))
+
+    # 依頼済みの人には送り直さず、残りの候補者から次の波を送る
+    assert sent == [[NEXT_ID]]
+    report = repository.get_absence_report('R1')
+    assert report['recruitment_claim'] != 'stopped-worker'
+    assert report['recruitment']['asked'] == [ASKED_ID, NEXT_ID]
+    assert report['recruitment']['waves'] == 2
+    assert scheduler._campaigns['R1']['wave'] == 2
+
+
+def test_take_over_waits_while_the_owner_makes_progress(repository, wheel, sent):
+    save_stale_report(repository)
+    scheduler = RecruitmentScheduler(wave_size=1)
+    scheduler.resume()
+    [timer_id] = wheel.timers
+    # 見張り始めた後に担当ワーカーが保存している
+    report = repository.get_absence_report('R1')
+    repository.update_absence_report('R1', {'recruitment': dict(report['recruitment'], declined=[ASKED_ID])})
+    wheel.fire(timer_id)
+
+    assert sent == []
+    assert repository.get_absence_report('R1')['recruitment_claim'] == 'stopped-worker'
+    assert 'R1' not in scheduler._campaigns
+    # 次の締め切りまで見張り直す
+    assert len(wheel.timers) == 1
+
+
+def test_take_over_skips_filled_reports(repository, wheel, sent):
+    save_stale_report(repository)
+    scheduler = RecruitmentScheduler(wave_size=1)
+    scheduler.resume()
+    repository.update_absence_report('R1', {'status': 'filled', 'substitute_staff_id': ASKED_ID})
+    wheel.fire(next(iter(wheel.timers)))
+
+    assert sent == []
+    assert 'R1' not in scheduler._campaigns
+    assert wheel.timers == {}
+
+
+def test_campaign_stops_when_another_worker_takes_it_over(repository, wheel, sent):
+    state.staff_directory.upsert(StaffRecord('U4567890123', '鈴木 次郎', '美容師'))
+    save_stale_report(repository)
+    scheduler = RecruitmentScheduler(wave_size=1)
+    scheduler.resume()
+    wheel.fire(next(iter(wheel.timers)))
+    [(_, callback, args)] = wheel.timers.values()
+    # 別のワーカーが引き継いだ後で、このワーカーの締め切りが来る
+    repository.update_absence_report('R1', {'recruitment_claim': 'other-worker'})
+    callback(*args)
+
+    # 第3波は保存できないので送らずに手放す
+    assert len(sent) == 1
+    assert 'R1' not in scheduler._campaigns
+    assert repository.get_absence_report('R1')['recruitment_claim'] == 'other-worker'
@@ -0,0 +1,61 @@
+# tests/test_storage.py
+# SQLite の条件付き更新（if_status / if_match）
+
+import pytest
+
+from staff_linebot.storage import InMemoryRepository, SQLiteRepository
+
+
+def absence_report(status='reported'):
+    return {
+        'staff_id': 'U1',
+        'staff_name': '田中',
+        'absence_data': {'date': '2024-01-20', 'time': '10:00', 'reason': '風邪'},
+        'timestamp': '2024-01-19T10:00:00',
+        'status': status
+    }
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def repository(request, tmp_path):
+    if request.param == 'sqlite':
+        return SQLiteRepository(str(tmp_path / 'linebot.db'))
+    return InMemoryRepository()
+
+
+def test_update_absence_report_if_status(repository):
+    repository.save_absence_report('r1', absence_report('recruiting'))
+
+    updated = repository.update_absence_report('r1', {'status': 'filled', 'substitute_staff_id': 'U2'},
+                                               if_status=('recruiting', 'unfilled'))
+    assert updated['status'] == 'filled'
+    assert updated['substitute_staff_id'] == 'U2'
+
+    # 2件目の受諾は通らず、先に確定した内容が残る
+    assert repository.update_absence_report('r1', {'status': 'filled', 'substitute_staff_id': 'U3'},
+                                            if_status=('recruiting', 'unfilled')) is None
+    report = repository.get_absence_report('r1')
+    assert report['substitute_staff_id'] == 'U2'
+    assert report['staff_name'] == '田中'
+
+
+def test_update_absence_report_missing_report(repository):
+    assert repository.update_absence_report('missing', {'status': 'filled'}) is None
+    assert repository.update_absence_report('missing', {'status': 'filled'}, if_status=('recruiting',)) is None
+
+
+def test_update_absence_report_if_match(repository):
+    repository.save_absence_report('r1', absence_report('recruiting'))
+
+    # 項目がまだないときは None と一致する
+    assert repository.update_absence_report('r1', {'recruitment_claim': 'a'},
+                                            if_match={'recruitment_claim': None}) is not None
+    assert repository.update_absence_report('r1', {'recruitment_claim': 'b'},
+                                            if_match={'recruitment_claim': None}) is None
+    assert repository.update_absence_report('r1', {'recruitment': {'waves': 1}},
+                                            if_status=('recruiting',), if_match={'recruitment_claim': 'a'}) is not None
+    assert repository.update_absence_report('r1', {'recruitment_claim': 'b'}, if_status=('filled',),
+                                            if_match={'recruitment_claim': 'a'}) is None
+    report = repository.get_absence_report('r1')
+    assert report['recruitment_claim'] == 'a'
+    assert report['recruitment'] == {'waves': 1}
@@ -0,0 +1,27 @@
+# tests/test_templating.py
+# テンプレートの差し替えとコンパイル済みキャッシュ
+
+import pytest
+
+from staff_linebot.templating import TemplateError, process_template, update_template
+from staff_linebot.tenants import message_templates
+
+
+@pytest.fixture
+def template():
+    message_templates['test_greeting'] = 'こんにちは {{name}} さん'
+    yield 'test_greeting'
+    message_templates.pop('test_greeting', None)
+
+
+def test_update_template_replaces_the_compiled_template(template):
+    assert process_template(template, {'name': '田中'}) == 'こんにちは 田中 さん'
+    update_template(template, 'おはようございます {{name}} さん')
+    assert process_template(template, {'name': '田中'}) == 'おはようございます 田中 さん'
+
+
+def test_render_rejects_missing_and_unknown_variables(template):
+    with pytest.raises(TemplateError):
+        process_template(template, {})
+    with pytest.raises(TemplateError):
+        process_template(template, {'name': '田中', 'extra': 1})
@@ -0,0 +1,47 @@
+# tests/test_timers.py
+# タイマーホイールの発火タイミング（ちょうど一周・複数周・取り消し）
+
+import threading
+
+import pytest
+
+from staff_linebot.timers import TimerWheel
+
+
+@pytest.fixture
+def wheel():
+    wheel = TimerWheel(tick=1.0, slots=4)
+    # スレッドを起動させず、_advance で1 tick ずつ手で進める
+    wheel._thread = threading.current_thread()
+    return wheel
+
+
+def fired_at(wheel, marker, max_ticks=20):
+    # 何 tick 目に発火したか
+    for tick in range(1, max_ticks + 1):
+        for _, callback, args, _ in wheel._advance():
+            if args == (marker,):
+                return tick
+    return None
+
+
+@pytest.mark.parametrize('delay, expected', [(0, 1), (1.0, 1), (2.5, 3), (3.0, 3), (4.0, 4), (5.0, 5), (8.0, 8), (9.0, 9)])
+def test_timer_fires_on_its_tick(wheel, delay, expected):
+    wheel.schedule(delay, print, 'marker')
+
+    assert fired_at(wheel, 'marker') == expected
+
+
+def test_timer_fires_after_the_cursor_has_moved(wheel):
+    for _ in range(3):
+        wheel._advance()
+    wheel.schedule(4.0, print, 'marker')
+
+    assert fired_at(wheel, 'marker') == 4
+
+
+def test_cancelled_timer_does_not_fire(wheel):
+    timer_id = wheel.schedule(2.0, print, 'marker')
+    wheel.cancel(timer_id)
+
+    assert all(not wheel._advance() for _ in range(8))
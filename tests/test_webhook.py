@@ -0,0 +1,69 @@
+# tests/test_webhook.py
+# Webhook 本文の解析（扱うのはテキストメッセージだけ、形が不正なら ValueError → 400）
+
+import pytest
+
+from staff_linebot import webhook
+from staff_linebot.json_codec import json_dumps
+from staff_linebot.tenants import tenants
+
+
+def text_event(**overrides):
+    event = {
+        'type': 'message', 'webhookEventId': 'e1', 'replyToken': 'r1', 'timestamp': 1717200000000,
+        'source': {'type': 'user', 'userId': 'U1'}, 'message': {'type': 'text', 'id': 'm1', 'text': '休みます'},
+        'deliveryContext': {'isRedelivery': True}
+    }
+    event.update(overrides)
+    return event
+
+
+def body(*events):
+    return json_dumps({'destination': 'Ubot', 'events': list(events)}).encode()
+
+
+def test_text_messages_are_parsed():
+    [event] = webhook.parse_webhook_events(body(text_event()))
+
+    assert (event.event_id, event.user_id, event.text, event.reply_token, event.timestamp, event.is_redelivery) == \
+        ('e1', 'U1', '休みます', 'r1', 1717200000000, True)
+
+
+def test_other_events_are_dropped():
+    events = webhook.parse_webhook_events(body(
+        {'type': 'follow', 'source': {'type': 'user', 'userId': 'U1'}},
+        text_event(message={'type': 'sticker', 'id': 'm2'}),
+        text_event(source={'type': 'group', 'groupId': 'G1'}),
+        text_event(source=None),
+        text_event(webhookEventId='e2')
+    ))
+
+    assert [event.event_id for event in events] == ['e2']
+
+
+@pytest.mark.parametrize('payload', [
+    b'not json',
+    b'[]',
+    b'{"events": {}}',
+    body('event'),
+    body(text_event(source='U1')),
+    body(text_event(source=['U1'])),
+    body(text_event(source={'type': 'user', 'userId': ['U1']})),
+    body(text_event(message={'type': 'text', 'text': None})),
+    body(text_event(message={'type': 'text', 'text': {'body': '休みます'}})),
+])
+def test_malformed_bodies_raise_value_error(payload):
+    with pytest.raises(ValueError):
+        webhook.parse_webhook_events(payload)
+
+
+class AcceptingVerifier:
+    def verify(self, body, signature):
+        return True
+
+
+def test_malformed_body_is_answered_with_400(monkeypatch):
+    monkeypatch.setattr(webhook, 'webhook_verifier', lambda channel, tenant: AcceptingVerifier())
+
+    assert webhook.receive_bot_a_webhook(tenants.default, body(text_event(source='U1')), 'signature') == \
+        ('Invalid body', 400)